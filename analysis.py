@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Фоновый анализ новых треков: пики формы волны, громкость и отпечаток
+(см. waveform.py, loudness.py, fingerprint.py)
+
+Задачи хранятся в таблице analysis_jobs и создаются вместе с треком, поэтому
+анализ не зависит от перекодирования: идет и при TRANSCODE_ENABLED=false,
+а его ошибки не валят задачу перекодирования (и наоборот). Шаги независимы:
+упавший шаг не мешает сохранить результаты остальных, повтор задачи
+досчитывает только недостающее.
+
+Обработать очередь без запуска бота:  python analysis.py
+"""
+
+import logging
+import shutil
+import threading
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+from database import DatabaseManager
+from waveform import generate_peaks
+from loudness import analyze_file, process_pool, shutdown_process_pool
+from fingerprint import compute_fingerprint, register_fingerprint
+import config
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 5
+
+def analyze_track(file_path: str, needs_loudness: bool, needs_fingerprint: bool) -> tuple:
+    """({шаг: результат}, {шаг: текст ошибки}); выполняется в пуле процессов loudness.process_pool"""
+    steps = [('peaks', generate_peaks)]
+    if needs_loudness:
+        steps.append(('loudness', analyze_file))
+    if needs_fingerprint:
+        steps.append(('fingerprint', compute_fingerprint))
+
+    results = {}
+    errors = {}
+    for name, step in steps:
+        try:
+            results[name] = step(file_path)
+        except Exception as e:
+            errors[name] = str(e) or type(e).__name__
+    return results, errors
+
+class AnalysisWorker:
+    def __init__(self, max_workers: int = None, poll_interval: float = POLL_INTERVAL):
+        self.max_workers = max_workers or config.ANALYSIS_WORKERS
+        self.poll_interval = poll_interval
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self) -> bool:
+        """Запуск обработки очереди в фоновом потоке"""
+        if not shutil.which(config.FFMPEG_PATH):
+            logger.warning(f"ffmpeg не найден ({config.FFMPEG_PATH}), анализ треков отключен")
+            return False
+
+        db = DatabaseManager()
+        try:
+            resumed = db.reset_running_analysis_jobs()
+        finally:
+            db.close()
+        if resumed:
+            logger.info(f"Возобновлено прерванных задач анализа: {resumed}")
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            shutdown_process_pool()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                processed = self.process_batch()
+            except Exception as e:
+                logger.error(f"Ошибка очереди анализа: {e}")
+                processed = 0
+            # Пока очередь не пуста, следующую пачку берем сразу
+            if not processed:
+                self.stop_event.wait(self.poll_interval)
+
+    def process_batch(self) -> int:
+        """Забирает по задаче на каждый процесс пула и сохраняет результаты по мере готовности"""
+        db = DatabaseManager()
+        try:
+            jobs = [(job.id, job.track_id, job.track.user_id, job.track.file_path,
+                     job.track.loudness is None, job.track.fingerprint is None)
+                    for job in db.claim_analysis_jobs(self.max_workers)]
+        finally:
+            db.close()
+
+        # Анализ - чистые вычисления на numpy, поэтому процессы, а не потоки (тот же пул, что у loudness.py)
+        pool = process_pool(self.max_workers)
+        futures = {}
+        for job in jobs:
+            _, _, _, file_path, needs_loudness, needs_fingerprint = job
+            futures[pool.submit(analyze_track, file_path, needs_loudness, needs_fingerprint)] = job
+        for future in as_completed(futures):
+            self.save(futures[future], future)
+        return len(jobs)
+
+    def save(self, job: tuple, future):
+        job_id, track_id, user_id, file_path, _, _ = job
+        try:
+            results, errors = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # Процесс пула упал - следующая пачка получит новый пул
+                shutdown_process_pool()
+            results, errors = {}, {'analysis': str(e) or type(e).__name__}
+
+        db = DatabaseManager()
+        try:
+            if results.get('loudness'):
+                db.set_tracks_loudness([(track_id, results['loudness'])])
+            if results.get('fingerprint'):
+                db.set_track_fingerprint(track_id, results['fingerprint'])
+                register_fingerprint(db, user_id, track_id, results['fingerprint'])
+
+            if errors:
+                error = '; '.join(f"{step}: {message}" for step, message in errors.items())
+                logger.error(f"Ошибка анализа {file_path}: {error}")
+                db.fail_analysis_job(job_id, error)
+            else:
+                db.complete_analysis_job(job_id, file_path)
+                logger.info(f"Трек проанализирован: {file_path}")
+        finally:
+            db.close()
+
+if __name__ == '__main__':
+    from models import create_tables
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    create_tables()
+
+    worker = AnalysisWorker()
+    if worker.start():
+        try:
+            worker.thread.join()
+        except KeyboardInterrupt:
+            worker.stop()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Сборка и раздача статики с хешами в именах файлов
+
+Сборка:  python assets.py
+Создает static/dist/ с файлами вида css/style.<hash>.css, их сжатыми
+вариантами (.gz и, если установлен пакет brotli, .br) и manifest.json.
+Если манифест есть, url_for('static', ...) отдает хешированные имена,
+а сами файлы раздаются с Cache-Control: immutable.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import mimetypes
+from flask import request, send_file, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# sw.js отдается с фиксированного адреса /sw.js, его не переименовываем
+EXCLUDED_FILES = {'js/sw.js'}
+
+# Расширения, которые имеет смысл сжимать
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.html', '.txt'}
+
+# Варианты сжатия в порядке предпочтения
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def fingerprint(data: bytes) -> str:
+    """Короткий хеш содержимого файла"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def hashed_name(filename: str, digest: str) -> str:
+    """css/style.css -> css/style.<hash>.css"""
+    base, ext = os.path.splitext(filename)
+    return f"{base}.{digest}{ext}"
+
+def iter_source_files(static_folder: str):
+    """Исходные файлы статики (без папки сборки)"""
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder)
+        if rel_root == DIST_DIR or rel_root.startswith(DIST_DIR + os.sep):
+            dirs[:] = []
+            continue
+        for name in files:
+            filename = os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, '/')
+            if filename not in EXCLUDED_FILES:
+                yield filename
+
+def write_compressed(path: str, data: bytes):
+    """Пишет сжатые варианты файла, если они меньше оригинала"""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+def build(static_folder: str) -> dict:
+    """Собирает static/dist и возвращает манифест"""
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+
+    for filename in sorted(iter_source_files(static_folder)):
+        with open(os.path.join(static_folder, filename), 'rb') as f:
+            data = f.read()
+
+        target = hashed_name(filename, fingerprint(data))
+        target_path = os.path.join(dist_folder, target)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+        with open(target_path, 'wb') as f:
+            f.write(data)
+        if os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS:
+            write_compressed(target_path, data)
+
+        manifest[filename] = f"{DIST_DIR}/{target}"
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+def load_manifest(static_folder: str) -> dict:
+    """Читает манифест сборки, если он есть"""
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def init_app(app):
+    """Подключает хешированные имена и раздачу сжатых вариантов"""
+    manifest = load_manifest(app.static_folder)
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    default_static = app.view_functions['static']
+
+    def static(filename):
+        if not filename.startswith(DIST_DIR + '/'):
+            return default_static(filename=filename)
+        return send_fingerprinted(app.static_folder, filename)
+
+    app.view_functions['static'] = static
+
+def send_fingerprinted(static_folder: str, filename: str):
+    """Отдает файл из dist/ в лучшей кодировке, которую принимает клиент"""
+    path = os.path.realpath(os.path.join(static_folder, filename))
+    dist_folder = os.path.realpath(os.path.join(static_folder, DIST_DIR))
+    if not path.startswith(dist_folder + os.sep) or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, name
+            break
+
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    response.vary.add('Accept-Encoding')
+    return response
+
+if __name__ == '__main__':
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    manifest = build(static_folder)
+    for source, target in manifest.items():
+        print(f"{source} -> {target}")
+    if brotli is None:
+        print("brotli не установлен: собраны только .gz варианты")
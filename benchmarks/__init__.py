@@ -0,0 +1,5 @@
+"""
+Бенчмарки производительности
+
+Запуск из корня проекта, например:  python -m benchmarks.waveform_throughput
+"""
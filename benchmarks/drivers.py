@@ -0,0 +1,130 @@
+"""
+Драйверы нагрузки для benchmarks.suite
+
+WebDriver шлет запросы к Flask-приложению через test client (в процессе)
+или по HTTP к запущенному серверу (--url) с keep-alive соединением на
+поток. BotDriver вызывает обработчики MusicBot с поддельными Update и
+CallbackQuery: ответы бота (reply_text, edit_message_text, reply_audio)
+ничего не отправляют, так что измеряется только работа самого бота.
+"""
+
+import asyncio
+import http.client
+import shutil
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+class WebDriver:
+    def __init__(self, url: str = None):
+        self.url = urlsplit(url) if url else None
+        self.local = threading.local()
+        if not self.url:
+            from web_app import app
+            self.app = app
+
+    def client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            if self.url:
+                connection_class = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+                client = connection_class(self.url.hostname, self.url.port, timeout=30)
+            else:
+                client = self.app.test_client()
+            self.local.client = client
+        return client
+
+    def get(self, path: str, headers: dict = None) -> int:
+        """GET path; возвращает статус (тело читается целиком, как это сделал бы браузер)"""
+        client = self.client()
+        if not self.url:
+            response = client.get(path, headers=headers or {})
+            response.get_data()
+            response.close()
+            return response.status_code
+
+        try:
+            client.request('GET', path, headers=headers or {})
+            response = client.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            # Сервер закрыл keep-alive соединение - следующее будет новым
+            client.close()
+            self.local.client = None
+            raise
+
+class FakeMessage:
+    def __init__(self, audio=None, text=None):
+        self.audio = audio
+        self.text = text
+
+    async def reply_text(self, *args, **kwargs):
+        return self
+
+    async def reply_audio(self, *args, **kwargs):
+        audio = kwargs.get('audio')
+        if hasattr(audio, 'read'):
+            # Настоящий бот загрузил бы файл - читаем его так же
+            while audio.read(64 * 1024):
+                pass
+        return self
+
+class FakeCallbackQuery:
+    def __init__(self, data: str, message: FakeMessage):
+        self.data = data
+        self.message = message
+
+    async def answer(self, *args, **kwargs):
+        return True
+
+    async def edit_message_text(self, *args, **kwargs):
+        return self.message
+
+class FakeFile:
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+
+    async def download_to_drive(self, path: str):
+        shutil.copyfile(self.source_path, path)
+
+class FakeBot:
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+
+    async def get_file(self, file_id: str):
+        return FakeFile(self.source_path)
+
+def fake_user(telegram_id: int):
+    return SimpleNamespace(id=telegram_id, username=f'bench{telegram_id}', first_name='Бенчмарк', last_name=None)
+
+class BotDriver:
+    """Обработчики MusicBot в собственном event loop"""
+
+    def __init__(self, audio_source: str):
+        from telegram_bot import MusicBot
+        self.bot = MusicBot()
+        self.context = SimpleNamespace(bot=FakeBot(audio_source))
+        self.loop = asyncio.new_event_loop()
+        self.uploads = 0
+
+    def close(self):
+        self.loop.close()
+
+    def start(self, telegram_id: int):
+        update = SimpleNamespace(effective_user=fake_user(telegram_id), message=FakeMessage(), callback_query=None)
+        self.loop.run_until_complete(self.bot.start(update, self.context))
+
+    def press(self, telegram_id: int, data: str):
+        query = FakeCallbackQuery(data, FakeMessage())
+        update = SimpleNamespace(effective_user=fake_user(telegram_id), message=None, callback_query=query)
+        self.loop.run_until_complete(self.bot.button_handler(update, self.context))
+
+    def send_audio(self, telegram_id: int):
+        self.uploads += 1
+        audio = SimpleNamespace(file_id=f'bench-upload-{telegram_id}-{self.uploads}', file_name='bench.wav',
+                                title=f'Загрузка {self.uploads}', performer='Бенчмарк', duration=1)
+        update = SimpleNamespace(effective_user=fake_user(telegram_id), message=FakeMessage(audio=audio), callback_query=None)
+        self.loop.run_until_complete(self.bot.handle_audio(update, self.context))
+        # Временные данные трека не нужны - кнопку выбора альбома никто не нажмет
+        self.bot.temp_audio_data.pop(telegram_id, None)
@@ -0,0 +1,84 @@
+"""
+Время построения отпечатка и задержка поиска дубликатов
+
+Отпечаток считается по синтетическому PCM (без ffmpeg). Индекс заполняется
+случайными отпечатками и зашумленными копиями части из них (имитация
+перекодирования); поиск через LSH сравнивается с полным перебором. Полнота -
+доля найденных среди копий, отличающихся от оригинала не больше чем на
+DUPLICATE_MAX_BER (проверять на --ber 0.2, у самого порога).
+
+    python -m benchmarks.fingerprint_lookup [--tracks 100000] [--queries 1000] [--ber 0.08]
+"""
+
+import argparse
+import time
+import numpy as np
+from fingerprint import (FingerprintBuilder, FingerprintIndex, DUPLICATE_MAX_BER, FINGERPRINT_BITS,
+                         FINGERPRINT_BYTES, MAX_SECONDS, SAMPLE_RATE)
+
+def percentile_ms(samples, q):
+    return np.percentile(np.array(samples) * 1000, q)
+
+def bench_fingerprint(runs: int = 5) -> float:
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(MAX_SECONDS * SAMPLE_RATE) * 3000).astype(np.int16)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        builder = FingerprintBuilder()
+        builder.feed(samples)
+        builder.finish()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def flip_bits(fingerprint: np.ndarray, ber: float, rng) -> bytes:
+    bits = np.unpackbits(fingerprint)
+    bits ^= (rng.random(bits.size) < ber).astype(np.uint8)
+    return np.packbits(bits).tobytes()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--ber', type=float, default=0.08, help='доля бит, меняющихся при перекодировании')
+    args = parser.parse_args()
+
+    print(f"Отпечаток {MAX_SECONDS} с аудио: {bench_fingerprint() * 1000:.1f} мс (без декодирования)")
+
+    rng = np.random.default_rng(1)
+    fingerprints = rng.integers(0, 256, (args.tracks, FINGERPRINT_BYTES), dtype=np.uint8)
+
+    started = time.perf_counter()
+    index = FingerprintIndex()
+    index.add_many((track_id, fingerprints[track_id].tobytes()) for track_id in range(args.tracks))
+    index.rebuild()
+    print(f"Индекс на {args.tracks} треков построен за {time.perf_counter() - started:.2f} с")
+
+    targets = rng.integers(0, args.tracks, args.queries)
+    queries = [flip_bits(fingerprints[target], args.ber, rng) for target in targets]
+
+    lsh_timings = []
+    found = 0
+    expected = 0
+    for target, query in zip(targets, queries):
+        started = time.perf_counter()
+        matches = index.query(query)
+        lsh_timings.append(time.perf_counter() - started)
+        ber = np.unpackbits(fingerprints[target] ^ np.frombuffer(query, dtype=np.uint8)).sum() / FINGERPRINT_BITS
+        if ber <= DUPLICATE_MAX_BER:
+            expected += 1
+            found += any(track_id == target for track_id, _ in matches)
+
+    scan_timings = []
+    for query in queries[:50]:
+        started = time.perf_counter()
+        distances = np.unpackbits(fingerprints ^ np.frombuffer(query, dtype=np.uint8), axis=1).sum(axis=1)
+        int(np.argmin(distances / FINGERPRINT_BITS))
+        scan_timings.append(time.perf_counter() - started)
+
+    print(f"LSH-поиск: p50 {percentile_ms(lsh_timings, 50):.3f} мс, p99 {percentile_ms(lsh_timings, 99):.3f} мс, "
+          f"найдено {found}/{expected} (полнота {found / max(expected, 1):.1%})")
+    print(f"Полный перебор: p50 {percentile_ms(scan_timings, 50):.1f} мс")
+
+if __name__ == '__main__':
+    main()
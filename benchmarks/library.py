@@ -0,0 +1,180 @@
+"""
+Генератор синтетической библиотеки для бенчмарков
+
+Создает пользователей, альбомы, плейлисты (с позициями) и треки с
+крошечными WAV-файлами (четверть секунды тона, ~2 КБ), а также историю
+прослушиваний. Строки пишутся пачками через insert().executemany, поэтому
+библиотека на сотни тысяч треков создается за секунды. Генерация
+детерминирована (--seed), повторный запуск дает ту же библиотеку.
+
+Пишет в базу и папку из DATABASE_URL / UPLOAD_FOLDER - только в отдельную базу:
+    DATABASE_URL=sqlite:////tmp/bench.db UPLOAD_FOLDER=/tmp/bench/audio \\
+        python -m benchmarks.library --users 10 --tracks 1000
+"""
+
+import argparse
+import math
+import os
+import random
+import time
+import wave
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+
+# Параметры крошечных WAV: 8 кГц, 8 бит, моно
+DUMMY_SAMPLE_RATE = 8000
+DUMMY_SECONDS = 0.25
+
+# Первый telegram_id синтетических пользователей (помещается в 32-битный Integer)
+FIRST_TELEGRAM_ID = 1_900_000_000
+
+INSERT_BATCH_SIZE = 5000
+
+@dataclass
+class Scale:
+    users: int
+    albums: int  # на пользователя
+    playlists: int  # на пользователя
+    tracks: int  # на пользователя
+    playlist_tracks: int  # треков в каждом плейлисте
+    plays: int  # прослушиваний на пользователя
+
+SCALES = {
+    'small': Scale(users=3, albums=3, playlists=3, tracks=200, playlist_tracks=50, plays=500),
+    'medium': Scale(users=10, albums=10, playlists=10, tracks=1000, playlist_tracks=200, plays=5000),
+    'large': Scale(users=20, albums=20, playlists=20, tracks=5000, playlist_tracks=500, plays=20000),
+}
+
+@dataclass
+class SyntheticUser:
+    id: int
+    telegram_id: int
+    album_ids: list = field(default_factory=list)
+    playlist_ids: list = field(default_factory=list)
+    track_ids: list = field(default_factory=list)
+
+def write_dummy_wav(path: str, frequency: float):
+    frames = int(DUMMY_SAMPLE_RATE * DUMMY_SECONDS)
+    samples = bytes(128 + int(100 * math.sin(2 * math.pi * frequency * i / DUMMY_SAMPLE_RATE)) for i in range(frames))
+    with wave.open(path, 'wb') as output:
+        output.setnchannels(1)
+        output.setsampwidth(1)
+        output.setframerate(DUMMY_SAMPLE_RATE)
+        output.writeframes(samples)
+
+def insert_batches(session, model, rows: list):
+    from sqlalchemy import insert
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        session.execute(insert(model), rows[start:start + INSERT_BATCH_SIZE])
+
+def generate_library(scale: Scale, seed: int = 0, with_files: bool = True) -> list:
+    """Создает библиотеку в текущей БД; возвращает [SyntheticUser]"""
+    from models import User, Album, Playlist, PlaylistItem, Track, POSITION_GAP, create_tables
+    from database import DatabaseManager
+    import config
+
+    create_tables()
+    rng = random.Random(seed)
+    audio_folder = os.path.join(config.UPLOAD_FOLDER, 'synthetic')
+    os.makedirs(audio_folder, exist_ok=True)
+
+    db = DatabaseManager()
+    session = db.db
+    users = []
+    try:
+        for number in range(scale.users):
+            telegram_id = FIRST_TELEGRAM_ID + seed * 100000 + number
+            existing = session.query(User).filter(User.telegram_id == telegram_id).first()
+            if existing:
+                # Библиотека уже сгенерирована этим seed - используем ее
+                users.append(load_user(session, existing))
+                continue
+
+            user = db.get_or_create_user(telegram_id=telegram_id, username=f'bench{number}', first_name='Бенчмарк')
+            synthetic = SyntheticUser(id=user.id, telegram_id=telegram_id)
+
+            insert_batches(session, Album, [
+                {'name': f'Альбом {i + 1}', 'user_id': user.id, 'created_at': datetime.utcnow()}
+                for i in range(scale.albums)
+            ])
+            insert_batches(session, Playlist, [
+                {'name': f'Плейлист {i + 1}', 'user_id': user.id, 'created_at': datetime.utcnow()}
+                for i in range(scale.playlists)
+            ])
+            synthetic.album_ids = [row.id for row in session.query(Album.id).filter(Album.user_id == user.id).order_by(Album.id)]
+            synthetic.playlist_ids = [row.id for row in session.query(Playlist.id).filter(Playlist.user_id == user.id).order_by(Playlist.id)]
+
+            tracks = []
+            for i in range(scale.tracks):
+                file_path = os.path.join(audio_folder, f'{telegram_id}_{i}.wav')
+                if with_files and not os.path.exists(file_path):
+                    write_dummy_wav(file_path, 220 + (i % 50) * 10)
+                tracks.append({
+                    'title': f'Трек {i + 1}',
+                    'artist': f'Исполнитель {rng.randrange(1, 50)}',
+                    'file_path': file_path,
+                    # У половины треков есть file_id - бот отправляет их без чтения файла
+                    'file_id': f'synthetic-{telegram_id}-{i}' if i % 2 == 0 else None,
+                    'duration': rng.randrange(90, 420),
+                    'album_id': rng.choice(synthetic.album_ids) if synthetic.album_ids and rng.random() < 0.8 else None,
+                    'user_id': user.id,
+                    'created_at': datetime.utcnow()
+                })
+            insert_batches(session, Track, tracks)
+            synthetic.track_ids = [row.id for row in session.query(Track.id).filter(Track.user_id == user.id).order_by(Track.id)]
+
+            items = []
+            for playlist_id in synthetic.playlist_ids:
+                chosen = rng.sample(synthetic.track_ids, min(scale.playlist_tracks, len(synthetic.track_ids)))
+                items.extend({'playlist_id': playlist_id, 'track_id': track_id, 'position': (position + 1) * POSITION_GAP,
+                              'added_at': datetime.utcnow()}
+                             for position, track_id in enumerate(chosen))
+            insert_batches(session, PlaylistItem, items)
+            session.commit()
+
+            # История за последние 30 дней - для "топа" и "недавних"
+            now = datetime.utcnow()
+            plays = [(user.id, rng.choice(synthetic.track_ids), rng.choice(('web', 'bot')),
+                      now - timedelta(seconds=rng.randrange(30 * 24 * 3600)))
+                     for _ in range(scale.plays)] if synthetic.track_ids else []
+            for start in range(0, len(plays), INSERT_BATCH_SIZE):
+                db.record_play_events(plays[start:start + INSERT_BATCH_SIZE])
+
+            users.append(synthetic)
+        return users
+    finally:
+        db.close()
+
+def load_user(session, user) -> SyntheticUser:
+    from models import Album, Playlist, Track
+    return SyntheticUser(
+        id=user.id,
+        telegram_id=user.telegram_id,
+        album_ids=[row.id for row in session.query(Album.id).filter(Album.user_id == user.id).order_by(Album.id)],
+        playlist_ids=[row.id for row in session.query(Playlist.id).filter(Playlist.user_id == user.id).order_by(Playlist.id)],
+        track_ids=[row.id for row in session.query(Track.id).filter(Track.user_id == user.id).order_by(Track.id)]
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--tracks', type=int, help='треков на пользователя')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-files', action='store_true', help='не создавать WAV-файлы')
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    if args.users:
+        scale = replace(scale, users=args.users)
+    if args.tracks:
+        scale = replace(scale, tracks=args.tracks)
+
+    started = time.perf_counter()
+    users = generate_library(scale, args.seed, with_files=not args.no_files)
+    tracks = sum(len(user.track_ids) for user in users)
+    print(f"Пользователей: {len(users)}, треков: {tracks} за {time.perf_counter() - started:.1f} с")
+    print("telegram_id: " + ', '.join(str(user.telegram_id) for user in users))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Пропускная способность анализа громкости в пуле процессов
+
+Синтетические треки генерируются прямо в рабочих процессах (без ffmpeg),
+так что измеряется только NumPy-часть: K-взвешивание, стробирование и
+true peak. Результат - треков в секунду и оценка времени на бэклог.
+
+    python -m benchmarks.loudness_throughput [--tracks 32] [--seconds 180] [--workers N] [--backlog 10000]
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from loudness import LoudnessMeter, SAMPLE_RATE
+from pcm import CHUNK_BYTES
+
+def analyze_synthetic(seed: int, seconds: float) -> float:
+    """Шумовой "трек" стерео, подаваемый кусками как из ffmpeg"""
+    rng = np.random.default_rng(seed)
+    frames_per_chunk = CHUNK_BYTES // 4
+    chunk = (rng.standard_normal((frames_per_chunk, 2)) * 3000).astype(np.int16)
+    chunks = int(seconds * SAMPLE_RATE) // frames_per_chunk
+
+    meter = LoudnessMeter(2)
+    for _ in range(chunks):
+        meter.feed(chunk)
+    return meter.result()['loudness']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=180, help='длительность одного трека')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--backlog', type=int, default=10000, help='размер бэклога для оценки')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    analyze_synthetic(0, args.seconds)
+    single = time.perf_counter() - started
+    print(f"1 трек ({args.seconds:.0f} с аудио) в одном процессе: {single:.2f} с, x{args.seconds / single:.0f} реального времени")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(analyze_synthetic, range(args.tracks), [args.seconds] * args.tracks))
+    elapsed = time.perf_counter() - started
+
+    rate = args.tracks / elapsed
+    print(f"{args.tracks} треков в {args.workers} процессах: {elapsed:.2f} с - {rate:.2f} треков/с")
+    print(f"Оценка для бэклога в {args.backlog} треков: {args.backlog / rate / 60:.1f} мин (без учета декодирования)")
+
+if __name__ == '__main__':
+    main()
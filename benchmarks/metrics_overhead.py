@@ -0,0 +1,158 @@
+"""
+Накладные расходы метрик на горячих путях
+
+Сравнивает одно и то же без инструментирования и с ним (метрики плюс
+журнал медленных запросов profiler.py с выключенным профилированием): обновление
+гистограммы/счетчика (в том числе из нескольких потоков), запрос к
+минимальному Flask-приложению, SQL-запрос к SQLite в памяти (голый
+SELECT 1 и типичный ORM-запрос) и вызов обработчика бота через timed_handler.
+
+    python -m benchmarks.metrics_overhead [--iterations 20000]
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from models import Base, User, Track
+import metrics
+from callbacks import encode_callback, callback_action_name
+import profiler
+
+# Замеры повторяются по очереди для обоих вариантов, берется лучший -
+# иначе прогрев и шум машины больше самой разницы
+ROUNDS = 5
+
+def per_call_us(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def compare(plain, instrumented, iterations: int) -> tuple:
+    """Лучшее время вызова (мкс) без инструментирования и с ним"""
+    plain_best = instrumented_best = float('inf')
+    for _ in range(ROUNDS):
+        plain_best = min(plain_best, per_call_us(plain, iterations))
+        instrumented_best = min(instrumented_best, per_call_us(instrumented, iterations))
+    return plain_best, instrumented_best
+
+def bench_primitives(iterations: int, threads: int) -> dict:
+    counter = metrics.Counter('bench_counter_total', 'бенчмарк', ('route',))
+    histogram = metrics.Histogram('bench_latency_seconds', 'бенчмарк', ('route',))
+    metrics.REGISTRY.remove(counter)
+    metrics.REGISTRY.remove(histogram)
+
+    labels = ('/api/track/<int:track_id>/audio',)
+    results = {
+        'Counter.inc': per_call_us(lambda: counter.inc(labels), iterations),
+        'Histogram.observe': per_call_us(lambda: histogram.observe(0.042, labels), iterations),
+    }
+
+    per_thread = iterations // threads
+
+    def observe():
+        for _ in range(per_thread):
+            histogram.observe(0.042, labels)
+
+    workers = [threading.Thread(target=observe) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results[f'Histogram.observe, {threads} потока'] = (time.perf_counter() - started) / (per_thread * threads) * 1e6
+    return results
+
+def make_app(instrumented: bool) -> Flask:
+    app = Flask(__name__)
+    if instrumented:
+        metrics.init_app(app)
+        profiler.init_app(app)
+
+    @app.route('/ping/<int:item_id>')
+    def ping(item_id):
+        return {'id': item_id}
+
+    return app
+
+def bench_flask(iterations: int) -> tuple:
+    plain = make_app(False).test_client()
+    instrumented = make_app(True).test_client()
+    return compare(lambda: plain.get('/ping/1'), lambda: instrumented.get('/ping/1'), iterations)
+
+def bench_sql(iterations: int) -> tuple:
+    plain_engine = create_engine('sqlite://')
+    instrumented_engine = create_engine('sqlite://')
+    metrics.instrument_engine(instrumented_engine)
+    profiler.instrument_engine(instrumented_engine)
+    statement = text('SELECT 1')
+    with plain_engine.connect() as plain, instrumented_engine.connect() as instrumented:
+        return compare(lambda: plain.execute(statement).scalar(),
+                       lambda: instrumented.execute(statement).scalar(), iterations)
+
+def bench_orm(iterations: int) -> tuple:
+    """Типичный запрос приложения: трек по id через ORM (как get_track_by_id)"""
+    sessions = []
+    for instrumented in (False, True):
+        engine = create_engine('sqlite://')
+        if instrumented:
+            metrics.instrument_engine(engine)
+            profiler.instrument_engine(engine)
+        Base.metadata.create_all(engine)
+        session = Session(engine)
+        session.add(User(id=1, telegram_id=1))
+        session.add(Track(id=1, user_id=1, title='Трек', artist='Бенчмарк', file_path='/nonexistent.mp3'))
+        session.commit()
+        sessions.append(session)
+
+    def query(session):
+        track = session.query(Track).filter(Track.id == 1).first()
+        session.expire_all()
+        return track
+
+    plain, instrumented = sessions
+    return compare(lambda: query(plain), lambda: query(instrumented), iterations)
+
+def bench_bot_handler(iterations: int) -> tuple:
+    class Handler:
+        async def plain(self, update, context):
+            return None
+
+        @metrics.timed_handler(lambda update: f"button:{callback_action_name(update)}")
+        async def timed(self, update, context):
+            return None
+
+    handler = Handler()
+    loop = asyncio.new_event_loop()
+    try:
+        # update здесь - строка callback_data, метка считается так же, как у настоящей кнопки
+        data = encode_callback('plmove', 12, 34)
+        return compare(lambda: loop.run_until_complete(handler.plain(data, None)),
+                       lambda: loop.run_until_complete(handler.timed(data, None)), iterations)
+    finally:
+        loop.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    for name, value in bench_primitives(args.iterations * 10, args.threads).items():
+        print(f"{name}: {value:.2f} мкс")
+
+    for name, (plain, instrumented) in (
+        ('Flask-запрос (test client)', bench_flask(args.iterations // 4)),
+        ('SQL SELECT 1 (SQLite в памяти)', bench_sql(args.iterations)),
+        ('ORM: трек по id', bench_orm(args.iterations // 4)),
+        ('Обработчик бота', bench_bot_handler(args.iterations)),
+    ):
+        overhead = instrumented - plain
+        print(f"{name}: {plain:.2f} -> {instrumented:.2f} мкс (+{overhead:.2f} мкс, {overhead / plain:+.1%})")
+
+if __name__ == '__main__':
+    main()
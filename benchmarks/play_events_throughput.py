@@ -0,0 +1,85 @@
+"""
+Пропускная способность записи событий прослушивания
+
+События добавляются в PlayEventBuffer из нескольких потоков и пишутся
+пачками во временную SQLite базу; для сравнения - запись по одному событию
+на транзакцию (как было бы без буфера).
+
+    DATABASE_URL=sqlite:////tmp/plays.db python -m benchmarks.play_events_throughput [--events 50000]
+"""
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+from models import create_tables
+from database import DatabaseManager
+from play_events import PlayEventBuffer
+
+def create_library(tracks: int) -> tuple:
+    db = DatabaseManager()
+    try:
+        user = db.get_or_create_user(telegram_id=random.randrange(1, 10 ** 9))
+        track_ids = [db.add_track(user.id, f'Трек {i}', 'Бенчмарк', f'/nonexistent/{i}.mp3').id
+                     for i in range(tracks)]
+        return user.id, track_ids
+    finally:
+        db.close()
+
+def bench_buffered(user_id: int, track_ids: list, events: int, threads: int) -> float:
+    buffer = PlayEventBuffer()
+    per_thread = events // threads
+
+    def produce():
+        for _ in range(per_thread):
+            buffer.record(user_id, random.choice(track_ids), 'web')
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=produce) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    buffer.stop()  # дописывает остаток
+    return per_thread * threads / (time.perf_counter() - started)
+
+def bench_unbuffered(user_id: int, track_ids: list, events: int) -> float:
+    db = DatabaseManager()
+    try:
+        started = time.perf_counter()
+        for _ in range(events):
+            db.record_play_events([(user_id, random.choice(track_ids), 'web', datetime.utcnow())])
+        return events / (time.perf_counter() - started)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--tracks', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    create_tables()
+    user_id, track_ids = create_library(args.tracks)
+
+    buffered = bench_buffered(user_id, track_ids, args.events, args.threads)
+    unbuffered = bench_unbuffered(user_id, track_ids, min(args.events, 2000))
+    print(f"Буфер, пачки по executemany: {buffered:,.0f} событий/с ({args.threads} потока)")
+    print(f"По одной транзакции на событие: {unbuffered:,.0f} событий/с")
+
+    db = DatabaseManager()
+    try:
+        started = time.perf_counter()
+        db.get_most_played_tracks(user_id, limit=20)
+        top_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        db.get_recently_played_tracks(user_id, limit=20)
+        recent_ms = (time.perf_counter() - started) * 1000
+    finally:
+        db.close()
+    print(f"Топ треков: {top_ms:.1f} мс, недавние: {recent_ms:.1f} мс")
+
+if __name__ == '__main__':
+    main()
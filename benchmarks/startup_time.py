@@ -0,0 +1,149 @@
+"""
+Время холодного старта
+
+Каждый замер - в новом процессе интерпретатора: время импорта модулей
+(config, models, web_app, telegram_bot, run), время до готовности
+веб-приложения (импорт + startup.initialize() + 200 на /readyz) на новой и
+на уже созданной БД, а также проверка, что импорт не создает ни файла БД,
+ни папки загрузок, и какие тяжелые пакеты (numpy, PIL, mutagen, telegram)
+подтягивает импорт каждого модуля: веб-приложению и run.py они при импорте
+не нужны. По -X importtime выводятся пакеты, на импорт которых уходит
+больше всего времени.
+
+    python -m benchmarks.startup_time [--runs 5] [--top 10] [--budget-ms 1000]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+MODULES = ('config', 'models', 'database', 'web_app', 'telegram_bot', 'run')
+
+# Пакеты анализа аудио и бота; модули из LIGHT_MODULES не должны загружать их при импорте
+HEAVY_PACKAGES = ('numpy', 'PIL', 'mutagen', 'telegram')
+LIGHT_MODULES = ('config', 'models', 'database', 'web_app', 'run')
+
+IMPORT_SNIPPET = '''
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+'''
+
+READY_SNIPPET = '''
+import time
+started = time.perf_counter()
+from web_app import app
+import startup
+startup.initialize()
+status = app.test_client().get('/readyz').status_code
+assert status == 200, status
+print(time.perf_counter() - started)
+'''
+
+SIDE_EFFECTS_SNIPPET = '''
+import web_app, telegram_bot, run
+'''
+
+HEAVY_SNIPPET = '''
+import sys
+import {module}
+print(' '.join(name for name in {packages!r} if name in sys.modules))
+'''
+
+def project_root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def make_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'startup.db')}"
+    env['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    env['PYTHONPATH'] = project_root() + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+def run_python(code: str, env: dict, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, '-c', code], env=env, cwd=project_root(),
+                          capture_output=True, text=True, check=True)
+
+def measure(code: str, runs: int, workdir: str, fresh_database: bool = False) -> tuple:
+    """(медиана внутри процесса, медиана всего процесса с запуском интерпретатора), секунды"""
+    inner, total = [], []
+    for _ in range(runs):
+        if fresh_database:
+            shutil.rmtree(workdir, ignore_errors=True)
+            os.makedirs(workdir)
+        started = time.perf_counter()
+        result = run_python(code, make_env(workdir))
+        total.append(time.perf_counter() - started)
+        inner.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(inner), statistics.median(total)
+
+def slowest_packages(module: str, workdir: str, top: int) -> list:
+    """Собственное время импорта, сложенное по пакетам верхнего уровня"""
+    result = run_python(f'import {module}', make_env(workdir), '-X', 'importtime')
+    totals = Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        totals[name.split('.')[0]] += int(self_us)
+    return totals.most_common(top)
+
+def heavy_imports(module: str, workdir: str) -> list:
+    result = run_python(HEAVY_SNIPPET.format(module=module, packages=HEAVY_PACKAGES), make_env(workdir))
+    return result.stdout.split()
+
+def import_side_effects(workdir: str) -> list:
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    env = make_env(workdir)
+    run_python(SIDE_EFFECTS_SNIPPET, env)
+    return sorted(os.listdir(workdir))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=1000,
+                        help='код выхода 1, если готовность на существующей БД дольше')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='musicbot-startup-')
+    try:
+        print("Импорт (внутри процесса / весь процесс, тяжелые пакеты):")
+        heavy_in_light = []
+        for module in MODULES:
+            inner, total = measure(IMPORT_SNIPPET.format(module=module), args.runs, workdir)
+            heavy = heavy_imports(module, workdir)
+            if module in LIGHT_MODULES and heavy:
+                heavy_in_light.append(module)
+            print(f"  {module:<14} {inner * 1000:7.0f} мс / {total * 1000:7.0f} мс   {', '.join(heavy) or '-'}")
+
+        fresh_inner, fresh_total = measure(READY_SNIPPET, args.runs, workdir, fresh_database=True)
+        warm_inner, warm_total = measure(READY_SNIPPET, args.runs, workdir)
+        print("Готовность веб-приложения (/readyz = 200):")
+        print(f"  новая БД       {fresh_inner * 1000:7.0f} мс / {fresh_total * 1000:7.0f} мс")
+        print(f"  готовая БД     {warm_inner * 1000:7.0f} мс / {warm_total * 1000:7.0f} мс")
+
+        created = import_side_effects(workdir)
+        print("Побочные эффекты импорта: " + (', '.join(created) if created else 'нет'))
+
+        print("Самые долгие пакеты при импорте run (собственное время):")
+        for package, self_us in slowest_packages('run', workdir, args.top):
+            print(f"  {package:<20} {self_us / 1000:7.1f} мс")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if heavy_in_light:
+        print("Тяжелые пакеты при импорте: " + ', '.join(heavy_in_light))
+    if warm_total * 1000 > args.budget_ms or created or heavy_in_light:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
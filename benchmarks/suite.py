@@ -0,0 +1,277 @@
+"""
+Сквозной бенчмарк веб-приложения и бота на синтетической библиотеке
+
+Создает библиотеку (benchmarks.library) в отдельной рабочей папке, затем
+гоняет сценарии: маршруты Flask (через test client или по HTTP к уже
+запущенному серверу, --url) и обработчики MusicBot с поддельными Update.
+Для каждого сценария - p50/p95/p99 задержки и пропускная способность.
+
+Результат можно сохранить как базовый (--save-baseline) и сравнивать с ним
+следующие прогоны: сценарий считается регрессией, если p95 вырос или
+пропускная способность упала больше чем на --tolerance. С
+--fail-on-regression регрессия дает код выхода 1 (для CI). Базовый файл
+зависит от машины, поэтому в репозиторий не кладется.
+
+    python -m benchmarks.suite --scale small --save-baseline
+    python -m benchmarks.suite --scale small --fail-on-regression
+    python -m benchmarks.suite --only web --url http://127.0.0.1:5000 --concurrency 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), 'musicbot-bench')
+DEFAULT_BASELINE = 'benchmark-baseline.json'
+
+# Диапазон для запроса аудио - как первый запрос плеера при перемотке
+AUDIO_RANGE = 'bytes=0-1023'
+
+@dataclass
+class Scenario:
+    name: str
+    kind: str  # web | bot
+    # rng -> функция без аргументов, выполняющая один запрос (True - успех)
+    make_call: object
+
+def web_scenarios(driver, users: list) -> list:
+    def get(path: str, expected: int = 200, headers: dict = None):
+        return lambda: driver.get(path, headers) == expected
+
+    def user_path(template: str):
+        return lambda rng: get(template.format(tid=rng.choice(users).telegram_id))
+
+    def album_tracks(rng):
+        user = rng.choice(users)
+        return get(f'/api/album/{rng.choice(user.album_ids)}/tracks')
+
+    def playlist_tracks(rng):
+        user = rng.choice(users)
+        return get(f'/api/playlist/{rng.choice(user.playlist_ids)}/tracks')
+
+    def audio_range(rng):
+        user = rng.choice(users)
+        return get(f'/api/track/{rng.choice(user.track_ids)}/audio?quality=original', 206, {'Range': AUDIO_RANGE})
+
+    return [
+        Scenario('web: дашборд', 'web', user_path('/web/{tid}')),
+        Scenario('web: треки пользователя', 'web', user_path('/api/user/{tid}/tracks')),
+        Scenario('web: альбомы', 'web', user_path('/api/user/{tid}/albums')),
+        Scenario('web: плейлисты', 'web', user_path('/api/user/{tid}/playlists')),
+        Scenario('web: треки альбома', 'web', album_tracks),
+        Scenario('web: треки плейлиста', 'web', playlist_tracks),
+        Scenario('web: статистика', 'web', user_path('/api/user/{tid}/stats')),
+        Scenario('web: топ треков', 'web', user_path('/api/user/{tid}/top-tracks')),
+        Scenario('web: аудио (Range)', 'web', audio_range),
+    ]
+
+def bot_scenarios(driver, users: list) -> list:
+    from callbacks import encode_callback
+
+    def call(func, *args):
+        def run():
+            func(*args)
+            return True
+        return run
+
+    def press(action: str):
+        return lambda rng: call(driver.press, rng.choice(users).telegram_id, encode_callback(action))
+
+    def press_item(action: str, attribute: str):
+        def make(rng):
+            user = rng.choice(users)
+            return call(driver.press, user.telegram_id, encode_callback(action, rng.choice(getattr(user, attribute))))
+        return make
+
+    return [
+        Scenario('bot: /start', 'bot', lambda rng: call(driver.start, rng.choice(users).telegram_id)),
+        Scenario('bot: мои альбомы', 'bot', press('view_albums')),
+        Scenario('bot: мои плейлисты', 'bot', press('view_playlists')),
+        Scenario('bot: альбом', 'bot', press_item('album', 'album_ids')),
+        Scenario('bot: плейлист', 'bot', press_item('playlist', 'playlist_ids')),
+        Scenario('bot: отправка трека', 'bot', press_item('track', 'track_ids')),
+        Scenario('bot: загрузка аудио', 'bot', lambda rng: call(driver.send_audio, rng.choice(users).telegram_id)),
+    ]
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_scenario(scenario: Scenario, requests: int, warmup: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    calls = [scenario.make_call(rng) for _ in range(warmup + requests)]
+    for call in calls[:warmup]:
+        call()
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(call):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = call()
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    measured = calls[warmup:]
+    started = time.perf_counter()
+    # Бот живет в одном event loop, как и настоящий - его вызовы последовательны
+    if concurrency > 1 and scenario.kind == 'web':
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, measured))
+    else:
+        for call in measured:
+            timed(call)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0
+    }
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> dict:
+    """Сценарий -> список описаний регрессий (пустой - без регрессий)"""
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        problems = []
+        if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            problems.append(f"p95 {previous['p95_ms']} -> {result['p95_ms']} мс")
+        if result['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            problems.append(f"пропускная способность {previous['throughput_rps']} -> {result['throughput_rps']} запр/с")
+        if result['errors'] > previous.get('errors', 0):
+            problems.append(f"ошибки {previous.get('errors', 0)} -> {result['errors']}")
+        regressions[name] = problems
+    return regressions
+
+def print_results(results: dict, baseline: dict, regressions: dict):
+    print(f"{'сценарий':<28} {'p50':>8} {'p95':>8} {'p99':>8} {'запр/с':>9} {'ошибки':>7}  базовый p95")
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name) if baseline else None
+        if previous:
+            change = result['p95_ms'] / previous['p95_ms'] - 1 if previous['p95_ms'] else 0.0
+            marker = '  РЕГРЕССИЯ' if regressions.get(name) else ''
+            reference = f"{previous['p95_ms']:.2f} ({change:+.0%}){marker}"
+        else:
+            reference = '-'
+        print(f"{name:<28} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['throughput_rps']:>9.1f} {result['errors']:>7}  {reference}")
+    for name, problems in regressions.items():
+        for problem in problems:
+            print(f"Регрессия [{name}]: {problem}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='small', help='small, medium или large (см. benchmarks.library)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='запросов на сценарий')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1, help='потоков для веб-сценариев')
+    parser.add_argument('--only', choices=('web', 'bot'))
+    parser.add_argument('--url', help='бить по HTTP в запущенный сервер (его БД должна содержать ту же библиотеку)')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='папка для БД и файлов, если DATABASE_URL не задан')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение (0.2 = 20%%)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--output', help='сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    # Рабочую БД и папку надо задать до импорта config и models
+    os.makedirs(args.workdir, exist_ok=True)
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(args.workdir, 'bench.db')}")
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(args.workdir, 'uploads'))
+    # Профилирование исказило бы замеры
+    os.environ['PROFILING_ENABLED'] = 'false'
+
+    from benchmarks.library import SCALES, generate_library, write_dummy_wav
+    from benchmarks.drivers import WebDriver, BotDriver
+
+    if args.scale not in SCALES:
+        parser.error(f"неизвестный масштаб {args.scale}: {', '.join(SCALES)}")
+
+    started = time.perf_counter()
+    users = generate_library(SCALES[args.scale], args.seed)
+    print(f"Библиотека '{args.scale}': {len(users)} пользователей, "
+          f"{sum(len(user.track_ids) for user in users)} треков ({time.perf_counter() - started:.1f} с)")
+
+    # Журналы приложения (и предупреждения о ffmpeg) не должны попадать в замеры
+    logging.disable(logging.WARNING)
+
+    scenarios = []
+    bot_driver = None
+    if args.only != 'bot':
+        scenarios.extend(web_scenarios(WebDriver(args.url), users))
+    if args.only != 'web':
+        audio_source = os.path.join(args.workdir, 'upload-source.wav')
+        write_dummy_wav(audio_source, 440)
+        bot_driver = BotDriver(audio_source)
+        scenarios.extend(bot_scenarios(bot_driver, users))
+
+    results = {}
+    try:
+        for number, scenario in enumerate(scenarios):
+            results[scenario.name] = run_scenario(scenario, args.requests, args.warmup, args.concurrency,
+                                                  args.seed + number)
+    finally:
+        if bot_driver:
+            bot_driver.close()
+        logging.disable(logging.NOTSET)
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        previous_params = baseline.get('params', {})
+        for name, value in (('scale', args.scale), ('concurrency', args.concurrency), ('url', args.url)):
+            if previous_params.get(name) != value:
+                print(f"Базовый прогон {args.baseline} сделан с {name}={previous_params.get(name)} "
+                      f"(сейчас {value}) - сравнение неточное")
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance) if baseline else {}
+    regressions = {name: problems for name, problems in regressions.items() if problems}
+    print_results(results, baseline, regressions)
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(),
+        'params': {'scale': args.scale, 'seed': args.seed, 'requests': args.requests,
+                   'concurrency': args.concurrency, 'url': args.url},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform()},
+        'results': results
+    }
+    for path in ([args.baseline] if args.save_baseline else []) + ([args.output] if args.output else []):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {path}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
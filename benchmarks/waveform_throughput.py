@@ -0,0 +1,64 @@
+"""
+Пропускная способность расчета пиков формы волны
+
+Без аргументов измеряет только NumPy-часть на синтетическом PCM;
+с путем к аудио файлу - полный цикл вместе с декодированием ffmpeg.
+
+    python -m benchmarks.waveform_throughput [--minutes 60] [файл]
+"""
+
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from waveform import PeakAccumulator, SAMPLE_RATE, compute_peaks
+from pcm import CHUNK_BYTES
+
+def bench_accumulator(minutes: float) -> dict:
+    """Синтетический PCM подается кусками того же размера, что и из ffmpeg"""
+    rng = np.random.default_rng(0)
+    chunk = rng.integers(-32768, 32767, CHUNK_BYTES // 2, dtype=np.int16)
+    total_samples = int(minutes * 60 * SAMPLE_RATE)
+    chunks = total_samples // chunk.size
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    accumulator = PeakAccumulator()
+    for _ in range(chunks):
+        accumulator.feed(chunk)
+    accumulator.finish()
+    elapsed = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    audio_seconds = chunks * chunk.size / SAMPLE_RATE
+    return {
+        'audio_seconds': audio_seconds,
+        'elapsed': elapsed,
+        'mb_per_second': chunks * CHUNK_BYTES / elapsed / 1e6,
+        'realtime_factor': audio_seconds / elapsed,
+        'peak_memory_kb': peak_memory / 1024,
+    }
+
+def bench_file(file_path: str) -> dict:
+    started = time.perf_counter()
+    compute_peaks(file_path)
+    return {'elapsed': time.perf_counter() - started}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file', nargs='?', help='аудио файл для полного цикла с ffmpeg')
+    parser.add_argument('--minutes', type=float, default=60, help='длительность синтетического трека')
+    args = parser.parse_args()
+
+    result = bench_accumulator(args.minutes)
+    print(f"Синтетика: {result['audio_seconds'] / 60:.0f} мин аудио за {result['elapsed'] * 1000:.1f} мс")
+    print(f"  {result['mb_per_second']:.0f} МБ/с PCM, x{result['realtime_factor']:.0f} реального времени")
+    print(f"  пик памяти: {result['peak_memory_kb']:.0f} КБ")
+
+    if args.file:
+        result = bench_file(args.file)
+        print(f"{args.file}: {result['elapsed']:.2f} с с декодированием")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Кодирование callback_data кнопок бота
+
+Формат версии 1: "1" + код действия + параметры через точку в base36,
+например "1pm.c.2s" - поднять трек 100 в плейлисте 12. Так данные
+укладываются в лимит Telegram (64 байта) с запасом, а разбор - один
+split и поиск в словаре вместо цепочки startswith. Кнопки в уже
+отправленных сообщениях остаются в старом формате ("plmove_12_100"),
+поэтому он тоже разбирается.
+"""
+
+from typing import Optional
+from database import DatabaseManager
+from library_cache import LRUCache
+
+CALLBACK_VERSION = '1'
+ARGUMENT_SEPARATOR = '.'
+MAX_CALLBACK_DATA = 64
+
+# Действие -> (код, число параметров)
+ACTIONS = {
+    'view_albums': ('A', 0),
+    'view_playlists': ('P', 0),
+    'choose_album': ('ca', 0),
+    'choose_playlist': ('cp', 0),
+    'create_album': ('na', 0),
+    'create_playlist': ('np', 0),
+    'album': ('a', 1),
+    'playlist': ('p', 1),
+    'track': ('t', 1),
+    'add_to_album': ('ta', 1),
+    'add_to_playlist': ('tp', 1),
+    'pick_playlist': ('pk', 1),
+    'pladd': ('pa', 2),
+    'plmove': ('pm', 2),
+    'plremove': ('pr', 2),
+}
+CODES = {code: (action, arity) for action, (code, arity) in ACTIONS.items()}
+
+# Старый формат: "<действие>" или "<действие>_<id>[_<id>]"
+LEGACY_ACTIONS = sorted(ACTIONS, key=len, reverse=True)
+
+BASE36_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+def to_base36(number: int) -> str:
+    if number < 0:
+        raise ValueError(f"Отрицательный параметр кнопки: {number}")
+    digits = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        digits = BASE36_DIGITS[remainder] + digits
+        if not number:
+            return digits
+
+def encode_callback(action: str, *args: int) -> str:
+    code, arity = ACTIONS[action]
+    if len(args) != arity:
+        raise ValueError(f"Действию {action} нужно параметров: {arity}")
+    data = CALLBACK_VERSION + code + ''.join(ARGUMENT_SEPARATOR + to_base36(arg) for arg in args)
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_DATA} байт: {data}")
+    return data
+
+def decode_callback(data: str) -> Optional[tuple]:
+    """(действие, параметры) или None для неизвестных данных"""
+    if not data:
+        return None
+    try:
+        if data.startswith(CALLBACK_VERSION):
+            code, *args = data[len(CALLBACK_VERSION):].split(ARGUMENT_SEPARATOR)
+            action, arity = CODES[code]
+            args = tuple(int(arg, 36) for arg in args)
+        else:
+            action = next(name for name in LEGACY_ACTIONS if data == name or data.startswith(name + '_'))
+            arity = ACTIONS[action][1]
+            args = tuple(int(arg) for arg in data[len(action) + 1:].split('_')) if arity else ()
+    except (KeyError, ValueError, StopIteration):
+        return None
+    return (action, args) if len(args) == arity else None
+
+def callback_action_name(data: str) -> str:
+    """Имя действия для метрик (ограниченный набор значений)"""
+    decoded = decode_callback(data)
+    return decoded[0] if decoded else 'other'
+
+def resolve_user_id(user_ids: LRUCache, telegram_id: int, get_db) -> int:
+    """id пользователя в БД по telegram_id; get_db() вызывается только при промахе кеша"""
+    user_id = user_ids.get(telegram_id)
+    if user_id is None:
+        user_id = get_db().get_or_create_user(telegram_id=telegram_id).id
+        user_ids.set(telegram_id, user_id)
+    return user_id
+
+class CallbackRequest:
+    """Нажатие кнопки: параметры, пользователь и соединение с БД, открываемое только при необходимости"""
+
+    def __init__(self, telegram_id: int, action: str, args: tuple, user_ids: LRUCache):
+        self.telegram_id = telegram_id
+        self.action = action
+        self.args = args
+        self.user_ids = user_ids
+        self._db = None
+
+    @property
+    def db(self) -> DatabaseManager:
+        if self._db is None:
+            self._db = DatabaseManager()
+        return self._db
+
+    @property
+    def user_id(self) -> int:
+        return resolve_user_id(self.user_ids, self.telegram_id, lambda: self.db)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
@@ -17,5 +17,54 @@ FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
 FLASK_HOST = os.getenv('FLASK_HOST', '127.0.0.1')
 FLASK_PORT = int(os.getenv('FLASK_PORT', 5000))
 
-# Создаем папку для загрузок если её нет
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
\ No newline at end of file
+# Сколько секунд браузер может кешировать аудио файлы
+AUDIO_CACHE_MAX_AGE = int(os.getenv('AUDIO_CACHE_MAX_AGE', 30 * 24 * 3600))
+
+# Фоновое перекодирование в облегченные версии (нужен ffmpeg)
+TRANSCODE_ENABLED = os.getenv('TRANSCODE_ENABLED', 'true').lower() == 'true'
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', 2))
+TRANSCODE_MAX_ATTEMPTS = int(os.getenv('TRANSCODE_MAX_ATTEMPTS', 3))
+
+# Фоновый анализ новых треков: пики, громкость, отпечаток (нужен ffmpeg, не зависит от перекодирования)
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 2))
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_MAX_ATTEMPTS', 3))
+
+# Целевая громкость для нормализации (ReplayGain 2.0: -18 LUFS)
+LOUDNESS_TARGET_LUFS = float(os.getenv('LOUDNESS_TARGET_LUFS', -18))
+
+# Как часто фоновый поток удаляет файлы удаленных треков (секунды)
+FILE_REAPER_INTERVAL = float(os.getenv('FILE_REAPER_INTERVAL', 10))
+
+# Буфер событий прослушивания: запись пачкой по размеру или по таймеру (секунды)
+PLAY_EVENTS_BATCH_SIZE = int(os.getenv('PLAY_EVENTS_BATCH_SIZE', 500))
+PLAY_EVENTS_FLUSH_INTERVAL = float(os.getenv('PLAY_EVENTS_FLUSH_INTERVAL', 2))
+
+# Обложки треков и кеш миниатюр
+COVER_FOLDER = os.getenv('COVER_FOLDER', os.path.join(os.path.dirname(UPLOAD_FOLDER) or '.', 'covers'))
+COVER_CACHE_MAX_BYTES = int(os.getenv('COVER_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+COVER_CACHE_MAX_AGE = int(os.getenv('COVER_CACHE_MAX_AGE', 7 * 24 * 3600))
+
+# Загрузка файлов из веб-дашборда по частям
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+UPLOAD_EXPIRY_HOURS = float(os.getenv('UPLOAD_EXPIRY_HOURS', 24))
+
+# Метрики Prometheus на /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Профилирование: для всех запросов или по заголовку X-Profile-Token: <ADMIN_TOKEN>
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5))
+# SQL-запросы дольше стольких миллисекунд пишутся в журнал slow_queries (0 - выключено)
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+
+# Кеши бота: telegram_id -> id пользователя и готовые клавиатуры альбомов и плейлистов
+BOT_USER_CACHE_SIZE = int(os.getenv('BOT_USER_CACHE_SIZE', 10000))
+BOT_KEYBOARD_CACHE_SIZE = int(os.getenv('BOT_KEYBOARD_CACHE_SIZE', 2000))
+
+# Папки создаются при запуске (startup.initialize), а не при импорте
+def ensure_directories():
+    """Создаем папку для загрузок если её нет"""
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
\ No newline at end of file
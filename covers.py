@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Обложки треков: извлечение из тегов и кеш миниатюр
+
+При загрузке трека встроенная картинка извлекается один раз и сохраняется
+под именем sha256 ее содержимого, поэтому обложка альбома, встроенная в
+каждый трек, хранится на диске в одном экземпляре.
+
+Миниатюры фиксированных размеров (COVER_SIZES) создаются при первом
+запросе в отдельном пуле потоков; одновременные запросы одной и той же
+миниатюры ждут одну задачу. Кеш миниатюр ограничен COVER_CACHE_MAX_BYTES
+и вытесняет давно не запрошенные файлы (LRU по времени изменения файла).
+
+Извлечь обложки уже загруженных треков:  python covers.py
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+logger = logging.getLogger(__name__)
+
+# Размеры миниатюр (сторона квадрата, px)
+COVER_SIZES = (64, 128, 256, 512)
+
+# Картинки больше этого размера в тегах игнорируем
+MAX_COVER_BYTES = 10 * 1024 * 1024
+
+# Тип картинки "передняя обложка" (ID3 APIC / FLAC picture)
+FRONT_COVER_TYPE = 3
+
+# Сколько запрос ждет генерации миниатюры, секунды
+THUMBNAIL_TIMEOUT = 10
+
+def originals_folder() -> str:
+    return os.path.join(config.COVER_FOLDER, 'originals')
+
+def thumbnails_folder() -> str:
+    return os.path.join(config.COVER_FOLDER, 'thumbnails')
+
+def cover_path(cover_hash: str) -> str:
+    """Путь к исходной картинке обложки"""
+    return os.path.join(originals_folder(), cover_hash)
+
+def cover_hash_from_path(path: str) -> str:
+    """Хеш обложки по пути из cover_path() (None для других файлов)"""
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(originals_folder()):
+        return os.path.basename(path)
+    return None
+
+def thumbnail_path(cover_hash: str, size: int) -> str:
+    return os.path.join(thumbnails_folder(), f"{cover_hash}_{size}.jpg")
+
+def extract_cover(file_path: str) -> bytes:
+    """Встроенная картинка (предпочтительно передняя обложка) или None"""
+    # mutagen и PIL импортируются при первой обработке картинки, а не вместе с database.py и web_app.py
+    from mutagen import File as MutagenFile
+    from mutagen.flac import Picture
+
+    audio = MutagenFile(file_path)
+    if audio is None:
+        return None
+
+    pictures = [(picture.type, picture.data) for picture in getattr(audio, 'pictures', None) or []]  # FLAC
+    tags = audio.tags
+    if tags is not None:
+        if hasattr(tags, 'getall'):  # ID3
+            pictures += [(frame.type, frame.data) for frame in tags.getall('APIC')]
+        elif hasattr(tags, 'get'):
+            pictures += [(FRONT_COVER_TYPE, bytes(cover)) for cover in tags.get('covr') or []]  # MP4
+            for value in tags.get('metadata_block_picture') or []:  # Ogg Vorbis / Opus
+                picture = Picture(base64.b64decode(value))
+                pictures.append((picture.type, picture.data))
+
+    pictures = [(kind, data) for kind, data in pictures if data and len(data) <= MAX_COVER_BYTES]
+    if not pictures:
+        return None
+    front = [data for kind, data in pictures if kind == FRONT_COVER_TYPE]
+    return front[0] if front else pictures[0][1]
+
+def save_cover(data: bytes) -> str:
+    """Сохраняет картинку (если такой еще нет) и возвращает ее хеш"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.verify()  # Проверка заголовка без полного декодирования
+
+    cover_hash = hashlib.sha256(data).hexdigest()
+    path = cover_path(cover_hash)
+    if not os.path.exists(path):
+        os.makedirs(originals_folder(), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return cover_hash
+
+def save_embedded_cover(file_path: str) -> str:
+    """Извлекает и сохраняет обложку трека; хеш или None, если картинки нет"""
+    data = extract_cover(file_path)
+    return save_cover(data) if data else None
+
+def render_thumbnail(cover_hash: str, size: int, path: str) -> int:
+    """Создает миниатюру, возвращает размер файла"""
+    from PIL import Image
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(cover_path(cover_hash)) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8)
+        image.draft('RGB', (size, size))
+        thumbnail = image.convert('RGB')
+    thumbnail.thumbnail((size, size), Image.LANCZOS)
+
+    tmp_path = f"{path}.part"
+    thumbnail.save(tmp_path, 'JPEG', quality=85, optimize=True, progressive=size >= 256)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+class ThumbnailCache:
+    def __init__(self, max_bytes: int = None, workers: int = 2):
+        self.max_bytes = max_bytes or config.COVER_CACHE_MAX_BYTES
+        self.entries = OrderedDict()  # путь -> размер, от давно запрошенных к недавним
+        self.total_bytes = 0
+        self.loaded = False
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+
+    def load(self):
+        """Восстанавливает порядок LRU по времени изменения файлов (под self.lock)"""
+        if self.loaded:
+            return
+        self.loaded = True
+        folder = thumbnails_folder()
+        if not os.path.isdir(folder):
+            return
+        files = []
+        for entry in os.scandir(folder):
+            if entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        for _, path, size in sorted(files):
+            self.entries[path] = size
+            self.total_bytes += size
+
+    def get(self, cover_hash: str, size: int, timeout: float = THUMBNAIL_TIMEOUT) -> str:
+        """Путь к миниатюре; при первом запросе ждет ее генерации в пуле"""
+        path = thumbnail_path(cover_hash, size)
+        with self.lock:
+            self.load()
+            if path in self.entries and os.path.exists(path):
+                self.entries.move_to_end(path)
+                hit = True
+            else:
+                hit = False
+                future = self.in_flight.get(path)
+                if future is None:
+                    future = self.executor.submit(self.generate, cover_hash, size, path)
+                    self.in_flight[path] = future
+
+        if hit:
+            # mtime хранит порядок LRU между перезапусками
+            os.utime(path)
+            return path
+        future.result(timeout)
+        return path
+
+    def generate(self, cover_hash: str, size: int, path: str):
+        try:
+            file_size = render_thumbnail(cover_hash, size, path)
+            with self.lock:
+                self.total_bytes -= self.entries.pop(path, 0)
+                self.entries[path] = file_size
+                self.total_bytes += file_size
+                self.evict()
+        finally:
+            with self.lock:
+                self.in_flight.pop(path, None)
+
+    def evict(self):
+        """Удаляет давно не запрошенные миниатюры, пока кеш больше лимита (под self.lock)"""
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            path, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+thumbnail_cache = ThumbnailCache()
+
+def get_thumbnail(cover_hash: str, size: int) -> str:
+    return thumbnail_cache.get(cover_hash, size)
+
+if __name__ == '__main__':
+    from database import DatabaseManager
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    db = DatabaseManager()
+    try:
+        pending = [(track.id, track.file_path) for track in db.get_all_tracks()
+                   if track.cover_hash is None and os.path.exists(track.file_path)]
+        for track_id, file_path in pending:
+            try:
+                cover_hash = save_embedded_cover(file_path)
+                if cover_hash:
+                    db.set_track_cover(track_id, cover_hash)
+                    logger.info(f"Обложка извлечена: {file_path}")
+            except Exception as e:
+                logger.error(f"Ошибка извлечения обложки {file_path}: {e}")
+    finally:
+        db.close()
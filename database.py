@@ -1,6 +1,26 @@
-from sqlalchemy.orm import Session
-from models import User, Album, Playlist, Track, get_db
+from sqlalchemy.orm import Session, joinedload, selectinload
+from datetime import datetime
+from sqlalchemy import func, insert, text, bindparam, DateTime
+from sqlalchemy.exc import IntegrityError
+from models import (User, Album, Playlist, PlaylistItem, Track, TrackVariant, TranscodeJob, AnalysisJob,
+                    PendingFileDeletion, PlayEvent, PlayStat, Upload, POSITION_GAP, get_db)
 from typing import List, Optional
+import config
+from media import peaks_path, album_loudness
+from covers import cover_path, cover_hash_from_path
+
+# Сколько id подставлять в один IN (...) - у SQLite есть лимит на число параметров
+DELETE_BATCH_SIZE = 500
+
+# Почасовая сводка: счетчик увеличивается на месте (ON CONFLICT есть в SQLite 3.24+ и PostgreSQL)
+PLAY_STATS_UPSERT = text(
+    'INSERT INTO play_stats (user_id, track_id, hour, play_count, last_played_at) '
+    'VALUES (:user_id, :track_id, :hour, :play_count, :last_played_at) '
+    'ON CONFLICT (user_id, track_id, hour) DO UPDATE SET '
+    'play_count = play_stats.play_count + excluded.play_count, '
+    'last_played_at = CASE WHEN excluded.last_played_at > play_stats.last_played_at '
+    'THEN excluded.last_played_at ELSE play_stats.last_played_at END'
+).bindparams(bindparam('hour', type_=DateTime()), bindparam('last_played_at', type_=DateTime()))
 
 class DatabaseManager:
     def __init__(self):
@@ -33,6 +53,7 @@ class DatabaseManager:
             user_id=user_id
         )
         self.db.add(album)
+        self._library_changed(user_id)
         self.db.commit()
         self.db.refresh(album)
         return album
@@ -43,6 +64,12 @@ class DatabaseManager:
     def get_album_by_id(self, album_id: int) -> Optional[Album]:
         return self.db.query(Album).filter(Album.id == album_id).first()
     
+    def get_album_track_counts(self, user_id: int) -> dict:
+        """Число треков в каждом альбоме пользователя одним запросом"""
+        return dict(self.db.query(Track.album_id, func.count(Track.id)).join(Album).filter(
+            Album.user_id == user_id
+        ).group_by(Track.album_id).all())
+    
     # Методы для работы с плейлистами
     def create_playlist(self, user_id: int, name: str, description: str = None) -> Playlist:
         playlist = Playlist(
@@ -51,6 +78,7 @@ class DatabaseManager:
             user_id=user_id
         )
         self.db.add(playlist)
+        self._library_changed(user_id)
         self.db.commit()
         self.db.refresh(playlist)
         return playlist
@@ -61,10 +89,32 @@ class DatabaseManager:
     def get_playlist_by_id(self, playlist_id: int) -> Optional[Playlist]:
         return self.db.query(Playlist).filter(Playlist.id == playlist_id).first()
     
+    def get_playlist_track_counts(self, user_id: int) -> dict:
+        """Число треков в каждом плейлисте пользователя одним запросом"""
+        return dict(self.db.query(PlaylistItem.playlist_id, func.count(PlaylistItem.id)).join(Playlist).filter(
+            Playlist.user_id == user_id
+        ).group_by(PlaylistItem.playlist_id).all())
+    
+    # Методы для работы с версией библиотеки (по ней бот сбрасывает кеш клавиатур, а fingerprint.py - индексы)
+    def get_library_version(self, user_id: int) -> int:
+        return self.db.query(User.library_version).filter(User.id == user_id).scalar() or 0
+    
+    def _library_changed(self, *user_ids) -> None:
+        """Увеличивает версию библиотек в той же транзакции, что и само изменение (без commit)"""
+        user_ids = [user_id for user_id in user_ids if user_id is not None]
+        if user_ids:
+            self.db.query(User).filter(User.id.in_(user_ids)).update(
+                {User.library_version: func.coalesce(User.library_version, 0) + 1}, synchronize_session=False
+            )
+    
+    def _playlist_changed(self, playlist_id: int) -> None:
+        self._library_changed(self.db.query(Playlist.user_id).filter(Playlist.id == playlist_id).scalar())
+    
     # Методы для работы с треками
     def add_track(self, user_id: int, title: str, artist: str, file_path: str, 
                   file_id: str = None, duration: int = None, 
-                  album_id: int = None, playlist_id: int = None) -> Track:
+                  album_id: int = None, playlist_id: int = None,
+                  fingerprint: bytes = None, cover_hash: str = None) -> Track:
         track = Track(
             title=title,
             artist=artist,
@@ -72,10 +122,21 @@ class DatabaseManager:
             file_id=file_id,
             duration=duration,
             album_id=album_id,
-            playlist_id=playlist_id,
-            user_id=user_id
+            user_id=user_id,
+            fingerprint=fingerprint,
+            cover_hash=cover_hash
         )
         self.db.add(track)
+        # Пики, громкость и отпечаток считаются отдельно от перекодирования (analysis.py)
+        track.analysis_job = AnalysisJob()
+        if config.TRANSCODE_ENABLED:
+            # Задача перекодирования сохраняется в той же транзакции, что и трек
+            track.transcode_job = TranscodeJob()
+        if playlist_id:
+            self.db.flush()
+            self.db.add(PlaylistItem(playlist_id=playlist_id, track_id=track.id,
+                                     position=self._next_playlist_position(playlist_id)))
+        self._library_changed(user_id)
         self.db.commit()
         self.db.refresh(track)
         return track
@@ -84,34 +145,451 @@ class DatabaseManager:
         return self.db.query(Track).filter(Track.album_id == album_id).all()
     
     def get_playlist_tracks(self, playlist_id: int) -> List[Track]:
-        return self.db.query(Track).filter(Track.playlist_id == playlist_id).all()
+        return self.db.query(Track).join(PlaylistItem).filter(
+            PlaylistItem.playlist_id == playlist_id
+        ).order_by(PlaylistItem.position).all()
     
     def get_all_user_tracks(self, user_id: int) -> List[Track]:
-        return self.db.query(Track).filter(Track.user_id == user_id).all()
+        """Треки с альбомом и плейлистами (track.playlists) - без отдельного запроса на каждый трек"""
+        return self.db.query(Track).options(
+            joinedload(Track.album),
+            selectinload(Track.playlist_items).joinedload(PlaylistItem.playlist)
+        ).filter(Track.user_id == user_id).all()
+    
+    def get_all_tracks(self) -> List[Track]:
+        return self.db.query(Track).order_by(Track.id).all()
     
     def get_track_by_id(self, track_id: int) -> Optional[Track]:
         return self.db.query(Track).filter(Track.id == track_id).first()
     
     def delete_track(self, track_id: int) -> bool:
-        track = self.get_track_by_id(track_id)
-        if track:
-            self.db.delete(track)
-            self.db.commit()
-            return True
-        return False
+        return self.delete_tracks([track_id]) > 0
+    
+    def delete_tracks(self, track_ids: List[int], user_id: int = None) -> int:
+        """Удаляет треки (только треки user_id, если он задан); возвращает число удаленных"""
+        deleted, album_ids, user_ids = self._delete_tracks(track_ids, user_id)
+        self.db.flush()
+        for album_id in album_ids:
+            if self.get_album_by_id(album_id):
+                self.update_album_gain(album_id)
+        self._library_changed(*user_ids)
+        self.db.commit()
+        return deleted
     
     def delete_album(self, album_id: int) -> bool:
         album = self.get_album_by_id(album_id)
-        if album:
-            self.db.delete(album)
-            self.db.commit()
-            return True
-        return False
+        if not album:
+            return False
+        user_id = album.user_id
+        track_ids = [track_id for track_id, in self.db.query(Track.id).filter(Track.album_id == album_id)]
+        self._delete_tracks(track_ids)
+        # Незавершенные загрузки в этот альбом попадут просто в библиотеку
+        self.db.query(Upload).filter(Upload.album_id == album_id).update({Upload.album_id: None})
+        self.db.query(Album).filter(Album.id == album_id).delete()
+        self._library_changed(user_id)
+        self.db.commit()
+        return True
     
     def delete_playlist(self, playlist_id: int) -> bool:
         playlist = self.get_playlist_by_id(playlist_id)
-        if playlist:
-            self.db.delete(playlist)
+        if not playlist:
+            return False
+        user_id = playlist.user_id
+        self.db.query(PlaylistItem).filter(PlaylistItem.playlist_id == playlist_id).delete()
+        self.db.query(Upload).filter(Upload.playlist_id == playlist_id).update({Upload.playlist_id: None})
+        self.db.query(Playlist).filter(Playlist.id == playlist_id).delete()
+        self._library_changed(user_id)
+        self.db.commit()
+        return True
+    
+    def _delete_tracks(self, track_ids: List[int], user_id: int = None) -> tuple:
+        """Set-based удаление треков и зависимых строк без commit; файлы ставятся в очередь удаления"""
+        track_ids = list(set(track_ids))
+        deleted = 0
+        album_ids = set()
+        user_ids = set()
+        for start in range(0, len(track_ids), DELETE_BATCH_SIZE):
+            query = self.db.query(Track.id, Track.file_path, Track.album_id, Track.cover_hash, Track.user_id).filter(
+                Track.id.in_(track_ids[start:start + DELETE_BATCH_SIZE])
+            )
+            if user_id is not None:
+                query = query.filter(Track.user_id == user_id)
+            rows = query.all()
+            if not rows:
+                continue
+            
+            ids = [row.id for row in rows]
+            file_paths = [row.file_path for row in rows] + [peaks_path(row.file_path) for row in rows]
+            file_paths += [path for path, in self.db.query(TrackVariant.file_path).filter(TrackVariant.track_id.in_(ids))]
+            # Обложка может быть общей с другими треками - это проверит reaper перед удалением
+            file_paths += [cover_path(cover_hash) for cover_hash in {row.cover_hash for row in rows if row.cover_hash}]
+            self.queue_file_deletions(file_paths)
+            
+            for model in (PlaylistItem, TrackVariant, TranscodeJob, AnalysisJob, PlayEvent, PlayStat):
+                self.db.query(model).filter(model.track_id.in_(ids)).delete()
+            deleted += self.db.query(Track).filter(Track.id.in_(ids)).delete()
+            album_ids.update(row.album_id for row in rows if row.album_id)
+            user_ids.update(row.user_id for row in rows)
+        return deleted, album_ids, user_ids
+    
+    # Методы для работы с очередью удаления файлов
+    def queue_file_deletions(self, file_paths: List[str]) -> None:
+        """Файлы удалит reaper.py после commit - в той же транзакции, что и строки"""
+        if file_paths:
+            self.db.execute(insert(PendingFileDeletion), [{'file_path': path} for path in file_paths])
+    
+    def discard_files(self, file_paths: List[str]) -> None:
+        """Ставит в очередь файлы, которые больше не нужны (удалятся, если на них никто не ссылается)"""
+        self.queue_file_deletions(file_paths)
+        self.db.commit()
+    
+    def get_pending_file_deletions(self, limit: int) -> List[PendingFileDeletion]:
+        return self.db.query(PendingFileDeletion).order_by(PendingFileDeletion.id).limit(limit).all()
+    
+    def get_referenced_file_paths(self, file_paths: List[str]) -> set:
+        """Пути, которые все еще нужны трекам (например, тот же файл загрузили повторно)"""
+        referenced = {path for path, in self.db.query(Track.file_path).filter(Track.file_path.in_(file_paths))}
+        # Пики лежат рядом с файлом и ставятся в очередь вместе с ним
+        referenced.update([peaks_path(path) for path in referenced])
+        covers = {cover_hash_from_path(path): path for path in file_paths if cover_hash_from_path(path)}
+        if covers:
+            referenced.update(covers[cover_hash] for cover_hash, in self.db.query(Track.cover_hash).filter(
+                Track.cover_hash.in_(list(covers))
+            ).distinct())
+        referenced.update(path for path, in self.db.query(TrackVariant.file_path).filter(TrackVariant.file_path.in_(file_paths)))
+        return referenced
+    
+    def count_pending_file_deletions(self) -> int:
+        return self.db.query(func.count(PendingFileDeletion.id)).scalar()
+    
+    def finish_file_deletions(self, done_ids: List[int], failed_ids: List[int]) -> None:
+        if done_ids:
+            self.db.query(PendingFileDeletion).filter(PendingFileDeletion.id.in_(done_ids)).delete()
+        if failed_ids:
+            self.db.query(PendingFileDeletion).filter(PendingFileDeletion.id.in_(failed_ids)).update(
+                {PendingFileDeletion.attempts: PendingFileDeletion.attempts + 1}
+            )
+        self.db.commit()
+    
+    # Методы для работы с позициями в плейлистах
+    def get_playlist_item(self, playlist_id: int, track_id: int) -> Optional[PlaylistItem]:
+        return self.db.query(PlaylistItem).filter(
+            PlaylistItem.playlist_id == playlist_id,
+            PlaylistItem.track_id == track_id
+        ).first()
+    
+    def _next_playlist_position(self, playlist_id: int) -> int:
+        last = self.db.query(func.max(PlaylistItem.position)).filter(
+            PlaylistItem.playlist_id == playlist_id
+        ).scalar()
+        return (last or 0) + POSITION_GAP
+    
+    def add_track_to_playlist(self, playlist_id: int, track_id: int) -> Optional[PlaylistItem]:
+        """Добавляет уже загруженный трек в конец плейлиста (None, если он там уже есть)"""
+        if self.get_playlist_item(playlist_id, track_id):
+            return None
+        item = PlaylistItem(playlist_id=playlist_id, track_id=track_id,
+                            position=self._next_playlist_position(playlist_id))
+        self.db.add(item)
+        self._playlist_changed(playlist_id)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # Тот же трек успели добавить параллельным запросом (уникальность playlist_id, track_id)
+            self.db.rollback()
+            return None
+        return item
+    
+    def move_playlist_track(self, playlist_id: int, track_id: int, after_track_id: int = None) -> bool:
+        """Ставит трек сразу после after_track_id (None - в начало плейлиста)"""
+        item = self.get_playlist_item(playlist_id, track_id)
+        if not item:
+            return False
+        after = self.get_playlist_item(playlist_id, after_track_id) if after_track_id else None
+        if after_track_id and not after:
+            return False
+        
+        position = self._position_after(playlist_id, item, after)
+        if position is None:
+            # Между соседями не осталось места - раздвигаем плейлист и пробуем снова
+            self._renumber_playlist(playlist_id)
+            position = self._position_after(playlist_id, item, after)
+        item.position = position
+        self._playlist_changed(playlist_id)
+        self.db.commit()
+        return True
+    
+    def _position_after(self, playlist_id: int, item: PlaylistItem, after: Optional[PlaylistItem]) -> Optional[int]:
+        low = after.position if after else 0
+        high = self.db.query(func.min(PlaylistItem.position)).filter(
+            PlaylistItem.playlist_id == playlist_id,
+            PlaylistItem.position > low,
+            PlaylistItem.id != item.id
+        ).scalar()
+        if high is None:
+            return low + POSITION_GAP
+        if high - low < 2:
+            return None
+        return (low + high) // 2
+    
+    def _renumber_playlist(self, playlist_id: int) -> None:
+        items = self.db.query(PlaylistItem).filter(
+            PlaylistItem.playlist_id == playlist_id
+        ).order_by(PlaylistItem.position, PlaylistItem.id).all()
+        for index, item in enumerate(items, start=1):
+            item.position = index * POSITION_GAP
+        self.db.flush()
+    
+    def remove_track_from_playlist(self, playlist_id: int, track_id: int) -> bool:
+        """Убирает трек из плейлиста, сам трек и файл остаются"""
+        item = self.get_playlist_item(playlist_id, track_id)
+        if item:
+            self.db.delete(item)
+            self._playlist_changed(playlist_id)
             self.db.commit()
             return True
-        return False
\ No newline at end of file
+        return False
+    
+    # Методы для работы с перекодированием
+    def get_track_variant(self, track_id: int, quality: str, codec: str) -> Optional[TrackVariant]:
+        return self.db.query(TrackVariant).filter(
+            TrackVariant.track_id == track_id,
+            TrackVariant.quality == quality,
+            TrackVariant.codec == codec
+        ).first()
+    
+    def claim_transcode_jobs(self, limit: int) -> List[TranscodeJob]:
+        """Забирает ожидающие задачи в работу"""
+        jobs = self.db.query(TranscodeJob).filter(
+            TranscodeJob.status == 'pending'
+        ).order_by(TranscodeJob.id).limit(limit).all()
+        for job in jobs:
+            job.status = 'running'
+            job.attempts += 1
+        self.db.commit()
+        return jobs
+    
+    def reset_running_transcode_jobs(self) -> int:
+        """Возвращает в очередь задачи, прерванные перезапуском"""
+        count = self.db.query(TranscodeJob).filter(
+            TranscodeJob.status == 'running'
+        ).update({TranscodeJob.status: 'pending'}, synchronize_session=False)
+        self.db.commit()
+        return count
+    
+    def complete_transcode_job(self, job_id: int, variants: List[dict]) -> None:
+        job = self.db.query(TranscodeJob).filter(TranscodeJob.id == job_id).first()
+        if not job:
+            # Трек удален, пока шло перекодирование - новые файлы тоже никому не нужны
+            self.queue_file_deletions([variant['file_path'] for variant in variants])
+            self.db.commit()
+            return
+        for variant in variants:
+            existing = self.get_track_variant(job.track_id, variant['quality'], variant['codec'])
+            if existing:
+                self.db.delete(existing)
+                self.db.flush()
+            self.db.add(TrackVariant(track_id=job.track_id, **variant))
+        job.status = 'done'
+        job.error = None
+        self.db.commit()
+    
+    def count_transcode_jobs(self) -> List[tuple]:
+        """[(статус, число задач)]"""
+        return self.db.query(TranscodeJob.status, func.count(TranscodeJob.id)).group_by(TranscodeJob.status).all()
+    
+    def fail_transcode_job(self, job_id: int, error: str) -> None:
+        job = self.db.query(TranscodeJob).filter(TranscodeJob.id == job_id).first()
+        if not job:
+            return
+        job.status = 'failed' if job.attempts >= config.TRANSCODE_MAX_ATTEMPTS else 'pending'
+        job.error = error
+        self.db.commit()
+    
+    # Методы для работы с очередью анализа
+    def claim_analysis_jobs(self, limit: int) -> List[AnalysisJob]:
+        """Забирает ожидающие задачи анализа в работу"""
+        jobs = self.db.query(AnalysisJob).filter(
+            AnalysisJob.status == 'pending'
+        ).order_by(AnalysisJob.id).limit(limit).all()
+        for job in jobs:
+            job.status = 'running'
+            job.attempts += 1
+        self.db.commit()
+        return jobs
+    
+    def reset_running_analysis_jobs(self) -> int:
+        """Возвращает в очередь задачи анализа, прерванные перезапуском"""
+        count = self.db.query(AnalysisJob).filter(
+            AnalysisJob.status == 'running'
+        ).update({AnalysisJob.status: 'pending'}, synchronize_session=False)
+        self.db.commit()
+        return count
+    
+    def complete_analysis_job(self, job_id: int, file_path: str) -> None:
+        job = self.db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+        if not job:
+            # Трек удален, пока шел анализ - пики тоже никому не нужны
+            self.discard_files([peaks_path(file_path)])
+            return
+        job.status = 'done'
+        job.error = None
+        self.db.commit()
+    
+    def fail_analysis_job(self, job_id: int, error: str) -> None:
+        job = self.db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+        if not job:
+            return
+        job.status = 'failed' if job.attempts >= config.ANALYSIS_MAX_ATTEMPTS else 'pending'
+        job.error = error
+        self.db.commit()
+    
+    def count_analysis_jobs(self) -> List[tuple]:
+        """[(статус, число задач)]"""
+        return self.db.query(AnalysisJob.status, func.count(AnalysisJob.id)).group_by(AnalysisJob.status).all()
+    
+    # Методы для работы с громкостью
+    def get_tracks_without_loudness(self) -> List[Track]:
+        return self.db.query(Track).filter(Track.loudness.is_(None)).order_by(Track.id).all()
+    
+    def set_tracks_loudness(self, results: List[tuple]) -> None:
+        """Сохраняет результаты анализа [(track_id, result)] и пересчитывает gain альбомов"""
+        album_ids = set()
+        for track_id, result in results:
+            track = self.get_track_by_id(track_id)
+            if not track:
+                continue
+            track.loudness = result['loudness']
+            track.true_peak = result['true_peak']
+            track.track_gain = result['gain']
+            if track.album_id:
+                album_ids.add(track.album_id)
+        self.db.flush()
+        
+        for album_id in album_ids:
+            self.update_album_gain(album_id)
+        self.db.commit()
+    
+    def update_album_gain(self, album_id: int) -> None:
+        album = self.get_album_by_id(album_id)
+        tracks = self.get_album_tracks(album_id)
+        loudness = album_loudness([
+            {'loudness': track.loudness, 'duration': track.duration} for track in tracks
+        ])
+        peaks = [track.true_peak for track in tracks if track.true_peak is not None]
+        album.album_gain = (config.LOUDNESS_TARGET_LUFS - loudness) if loudness is not None else None
+        album.album_peak = max(peaks) if peaks else None
+    
+    # Методы для работы с акустическими отпечатками
+    def get_user_fingerprints(self, user_id: int) -> List[tuple]:
+        return self.db.query(Track.id, Track.fingerprint).filter(
+            Track.user_id == user_id,
+            Track.fingerprint.isnot(None)
+        ).all()
+    
+    def set_track_fingerprint(self, track_id: int, fingerprint: bytes) -> None:
+        track = self.get_track_by_id(track_id)
+        if track:
+            track.fingerprint = fingerprint
+            # Индексы отпечатков в других процессах узнают о новом отпечатке по версии библиотеки
+            self._library_changed(track.user_id)
+            self.db.commit()
+    
+    # Методы для работы с обложками
+    def set_track_cover(self, track_id: int, cover_hash: str) -> None:
+        track = self.get_track_by_id(track_id)
+        if track:
+            track.cover_hash = cover_hash
+            self.db.commit()
+    
+    # Методы для работы с историей прослушиваний
+    def record_play_events(self, events: List[tuple]) -> None:
+        """Пишет пачку событий [(user_id, track_id, source, played_at)] и почасовые сводки одной транзакцией"""
+        if not events:
+            return
+        self.db.execute(insert(PlayEvent), [
+            {'user_id': user_id, 'track_id': track_id, 'source': source, 'played_at': played_at}
+            for user_id, track_id, source, played_at in events
+        ])
+        
+        # Сначала сворачиваем пачку в памяти - одна строка на (пользователь, трек, час)
+        stats = {}
+        for user_id, track_id, _, played_at in events:
+            key = (user_id, track_id, played_at.replace(minute=0, second=0, microsecond=0))
+            count, last_played_at = stats.get(key, (0, played_at))
+            stats[key] = (count + 1, max(last_played_at, played_at))
+        self.db.execute(PLAY_STATS_UPSERT, [
+            {'user_id': user_id, 'track_id': track_id, 'hour': hour,
+             'play_count': count, 'last_played_at': last_played_at}
+            for (user_id, track_id, hour), (count, last_played_at) in stats.items()
+        ])
+        self.db.commit()
+    
+    def get_most_played_tracks(self, user_id: int, since: datetime = None, limit: int = 20) -> List[tuple]:
+        """[(Track, число прослушиваний)] по почасовым сводкам"""
+        plays = func.sum(PlayStat.play_count).label('plays')
+        query = self.db.query(Track, plays).join(PlayStat, PlayStat.track_id == Track.id).filter(
+            PlayStat.user_id == user_id
+        )
+        if since:
+            query = query.filter(PlayStat.hour >= since.replace(minute=0, second=0, microsecond=0))
+        return query.group_by(Track.id).order_by(plays.desc(), Track.id).limit(limit).all()
+    
+    def get_recently_played_tracks(self, user_id: int, limit: int = 20) -> List[tuple]:
+        """[(Track, время последнего прослушивания)] по почасовым сводкам"""
+        last_played_at = func.max(PlayStat.last_played_at).label('last_played_at')
+        return self.db.query(Track, last_played_at).join(PlayStat, PlayStat.track_id == Track.id).filter(
+            PlayStat.user_id == user_id
+        ).group_by(Track.id).order_by(last_played_at.desc()).limit(limit).all()
+    
+    # Методы для работы с загрузками из веб-дашборда
+    def create_upload(self, upload_id: str, user_id: int, filename: str, file_path: str, size: int,
+                      checksum: str = None, album_id: int = None, playlist_id: int = None) -> Upload:
+        upload = Upload(
+            id=upload_id,
+            user_id=user_id,
+            filename=filename,
+            file_path=file_path,
+            size=size,
+            checksum=checksum,
+            album_id=album_id,
+            playlist_id=playlist_id
+        )
+        self.db.add(upload)
+        self.db.commit()
+        self.db.refresh(upload)
+        return upload
+    
+    def get_upload(self, upload_id: str) -> Optional[Upload]:
+        return self.db.query(Upload).filter(Upload.id == upload_id).first()
+    
+    def set_upload_received(self, upload_id: str, received: int) -> None:
+        self.db.query(Upload).filter(Upload.id == upload_id).update(
+            {Upload.received: received, Upload.updated_at: datetime.utcnow()}
+        )
+        self.db.commit()
+    
+    def delete_upload(self, upload_id: str, remove_file: bool = False) -> bool:
+        """Удаляет загрузку; при remove_file .part файл ставится в очередь удаления"""
+        upload = self.get_upload(upload_id)
+        if not upload:
+            return False
+        if remove_file:
+            self.queue_file_deletions([upload.file_path])
+        self.db.query(Upload).filter(Upload.id == upload_id).delete()
+        self.db.commit()
+        return True
+    
+    def count_uploads(self) -> int:
+        return self.db.query(func.count(Upload.id)).scalar()
+    
+    def expire_uploads(self, before: datetime) -> List[str]:
+        """Удаляет загрузки без новых кусков с момента before вместе с их .part файлами; возвращает их id"""
+        stale = self.db.query(Upload.id, Upload.file_path).filter(Upload.updated_at < before).all()
+        if not stale:
+            return []
+        upload_ids = [row.id for row in stale]
+        self.queue_file_deletions([row.file_path for row in stale])
+        self.db.query(Upload).filter(Upload.id.in_(upload_ids)).delete()
+        self.db.commit()
+        return upload_ids
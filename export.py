@@ -0,0 +1,90 @@
+"""
+Экспорт альбомов и плейлистов: потоковый ZIP и плейлист M3U8
+
+ZIP собирается на лету без сжатия (ZIP_STORED - аудио все равно не
+сжимается) прямо в ответ: zipfile пишет в объект-приемник, из которого
+генератор сразу отдает байты. В памяти одновременно находится один кусок
+файла, временных файлов нет. Так как выход не поддерживает seek, CRC и
+размеры пишутся после данных (data descriptor), а для файлов больше 4 ГБ
+включается ZIP64.
+"""
+
+import io
+import os
+import re
+import zipfile
+
+# Размер куска, которым файл читается с диска и отдается клиенту
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+# Символы, недопустимые в именах файлов Windows/macOS
+UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+class StreamSink(io.RawIOBase):
+    """Приемник для zipfile: копит записанные байты до следующего drain()"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def safe_filename(name: str) -> str:
+    return UNSAFE_FILENAME_RE.sub('_', name).strip(' .') or 'track'
+
+def archive_entries(tracks: list) -> list:
+    """[(имя в архиве, путь к файлу)] с номерами по порядку и без повторов имен"""
+    entries = []
+    width = max(2, len(str(len(tracks))))
+    for number, track in enumerate(tracks, start=1):
+        extension = os.path.splitext(track.file_path)[1] or '.mp3'
+        name = safe_filename(f"{number:0{width}d} - {track.artist} - {track.title}")
+        entries.append((f"{name}{extension}", track.file_path))
+    return entries
+
+def iter_zip(entries: list, chunk_size: int = ZIP_CHUNK_SIZE):
+    """Генератор байтов ZIP-архива из [(имя в архиве, путь к файлу)]"""
+    sink = StreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, file_path in entries:
+            try:
+                source = open(file_path, 'rb')
+            except FileNotFoundError:
+                continue  # Трек удалили, пока собирался архив
+
+            with source:
+                info = zipfile.ZipInfo.from_file(file_path, arcname)
+                info.compress_type = zipfile.ZIP_STORED
+                force_zip64 = info.file_size >= zipfile.ZIP64_LIMIT
+                with archive.open(info, 'w', force_zip64=force_zip64) as target:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        yield sink.drain()
+            yield sink.drain()
+    # Центральный каталог пишется при закрытии архива
+    yield sink.drain()
+
+def build_m3u8(name: str, tracks: list, track_url) -> str:
+    """Плейлист M3U8 со ссылками на стриминг; track_url(track) -> абсолютный URL"""
+    lines = ['#EXTM3U', f'#PLAYLIST:{name}']
+    for track in tracks:
+        lines.append(f'#EXTINF:{track.duration or -1},{track.artist} - {track.title}')
+        lines.append(track_url(track))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Акустические отпечатки треков для поиска дубликатов в библиотеке
+
+Отпечаток строится по первым MAX_SECONDS секундам звука: энергия в
+BANDS логарифмических полосах (300-2000 Гц) усредняется по SEGMENTS
+отрезкам времени, а биты - знаки разностей энергии между соседними
+полосами и соседними отрезками (схема Haitsma-Kalker). Такой отпечаток
+почти не меняется при перекодировании, в отличие от хеша файла.
+
+Поиск похожих - banded LSH: ключи - LSH_BANDS байтов отпечатка (полосы
+по 8 бит), кандидаты - треки, у которых совпала хотя бы одна полоса, затем
+кандидаты проверяются расстоянием Хэмминга. При доле различающихся бит
+DUPLICATE_MAX_BER = 0.2 полоса совпадает с вероятностью 0.8^8 ~ 17%, хотя
+бы одна из 32 - ~99.7% (с 16-битными полосами было бы ~60%); случайный
+трек попадает в кандидаты с вероятностью ~12%.
+
+Индексы пользователей живут в памяти процесса и помнят версию библиотеки
+(users.library_version), по которой построены. Версия растет в той же
+транзакции, что и любое изменение треков, поэтому индекс перезагружается
+после добавления или удаления трека и в другом процессе (в том числе когда
+SQLite отдает новому треку id только что удаленного).
+
+Досчитать отпечатки для уже загруженных треков:  python fingerprint.py
+"""
+
+import logging
+import os
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pcm import iter_pcm_chunks
+from library_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 5512
+FRAME_SIZE = 1024  # ~186 мс
+HOP_SIZE = FRAME_SIZE // 4  # перекрытие кадров сглаживает сдвиг начала (задержка энкодера)
+MAX_SECONDS = 120
+
+BANDS = 33
+MIN_FREQUENCY = 300
+MAX_FREQUENCY = 2000
+SEGMENTS = 64
+
+# 63 x 32 бита = 252 байта
+FINGERPRINT_BITS = (SEGMENTS - 1) * (BANDS - 1)
+FINGERPRINT_BYTES = FINGERPRINT_BITS // 8
+
+# LSH: 32 байта отпечатка - по одному из каждых двух отрезков, с разным смещением
+# внутри отрезка (4 байта = 32 полосы частот), чтобы ключи покрывали все частоты
+LSH_BANDS = 32
+LSH_BYTES = np.arange(LSH_BANDS) * 8 + np.arange(LSH_BANDS) % 4
+
+# Доля различающихся бит, при которой треки считаются одной записью
+DUPLICATE_MAX_BER = 0.2
+
+# Сколько новых отпечатков проверять перебором до перестройки индекса
+PENDING_REBUILD_THRESHOLD = 1024
+
+# Сколько индексов пользователей держать в памяти
+USER_INDEX_CACHE_SIZE = 100
+
+def band_edges() -> np.ndarray:
+    """Границы полос в бинах rfft"""
+    frequencies = np.geomspace(MIN_FREQUENCY, MAX_FREQUENCY, BANDS + 1)
+    return np.round(frequencies * FRAME_SIZE / SAMPLE_RATE).astype(np.intp)
+
+class FingerprintBuilder:
+    """Потоковое построение отпечатка: feed() по кускам, затем finish()"""
+
+    def __init__(self):
+        self.window = np.hanning(FRAME_SIZE).astype(np.float32)
+        self.edges = band_edges()
+        self.remainder = np.empty(0, dtype=np.int16)
+        self.energies = []
+        self.frames = 0
+        self.max_frames = MAX_SECONDS * SAMPLE_RATE // HOP_SIZE
+
+    @property
+    def done(self) -> bool:
+        return self.frames >= self.max_frames
+
+    def feed(self, samples: np.ndarray):
+        if self.done:
+            return
+        if self.remainder.size:
+            samples = np.concatenate((self.remainder, samples))
+        if samples.size < FRAME_SIZE:
+            self.remainder = samples.copy()
+            return
+
+        frames = sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE][:self.max_frames - self.frames]
+        # Следующий кадр начинается с отсчета frames * HOP_SIZE
+        self.remainder = samples[frames.shape[0] * HOP_SIZE:].copy()
+
+        spectrum = np.fft.rfft(frames * self.window, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        # Последний отрезок reduceat (от верхней границы до конца спектра) отбрасываем
+        self.energies.append(np.add.reduceat(power, self.edges, axis=1)[:, :BANDS])
+        self.frames += frames.shape[0]
+
+    def finish(self) -> bytes:
+        """Отпечаток (FINGERPRINT_BYTES байт) или None, если трек слишком короткий"""
+        if self.frames < SEGMENTS:
+            return None
+
+        energies = np.concatenate(self.energies)
+        starts = np.linspace(0, energies.shape[0], SEGMENTS, endpoint=False).astype(np.intp)
+        counts = np.diff(np.append(starts, energies.shape[0]))
+        segments = np.log(np.add.reduceat(energies, starts, axis=0) / counts[:, None] + 1e-6)
+
+        band_diff = segments[:, :-1] - segments[:, 1:]
+        bits = (band_diff[1:] - band_diff[:-1]) > 0
+        return np.packbits(bits).tobytes()
+
+def compute_fingerprint(file_path: str) -> bytes:
+    builder = FingerprintBuilder()
+    chunks = iter_pcm_chunks(file_path, SAMPLE_RATE)
+    try:
+        for samples in chunks:
+            builder.feed(samples)
+            if builder.done:
+                break
+    finally:
+        # Остаток трека не нужен - закрытие генератора останавливает ffmpeg
+        chunks.close()
+    return builder.finish()
+
+def lsh_keys(fingerprints: np.ndarray) -> np.ndarray:
+    """Ключи полос LSH для массива отпечатков формы (n, FINGERPRINT_BYTES)"""
+    return fingerprints[:, LSH_BYTES]
+
+class FingerprintIndex:
+    """Индекс отпечатков с поиском похожих за сублинейное время"""
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.fingerprints = np.empty((0, FINGERPRINT_BYTES), dtype=np.uint8)
+        self.alive = np.empty(0, dtype=bool)
+        self.indexed = 0  # строки [0, indexed) попали в отсортированные полосы
+        self.sorted_keys = []
+        self.sorted_rows = []
+        # Версия библиотеки пользователя, по которой построен индекс
+        self.version = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def add_many(self, items):
+        """Пакетное добавление [(track_id, fingerprint)]"""
+        items = [(track_id, fp) for track_id, fp in items if fp and len(fp) == FINGERPRINT_BYTES]
+        if not items:
+            return
+        ids = np.array([track_id for track_id, _ in items], dtype=np.int64)
+        fingerprints = np.frombuffer(b''.join(fp for _, fp in items), dtype=np.uint8).reshape(-1, FINGERPRINT_BYTES)
+        with self.lock:
+            self.ids = np.concatenate((self.ids, ids))
+            self.fingerprints = np.concatenate((self.fingerprints, fingerprints))
+            self.alive = np.concatenate((self.alive, np.ones(len(ids), dtype=bool)))
+            if len(self.ids) - self.indexed > PENDING_REBUILD_THRESHOLD:
+                self.rebuild()
+
+    def add(self, track_id: int, fingerprint: bytes):
+        self.add_many([(track_id, fingerprint)])
+
+    def remove(self, track_id: int):
+        with self.lock:
+            self.alive[self.ids == track_id] = False
+
+    def rebuild(self):
+        """Сортирует ключи каждой полосы; поиск по полосе - бинарный"""
+        keys = lsh_keys(self.fingerprints)
+        self.sorted_rows = [np.argsort(keys[:, band], kind='stable') for band in range(keys.shape[1])]
+        self.sorted_keys = [keys[rows, band] for band, rows in enumerate(self.sorted_rows)]
+        self.indexed = len(self.ids)
+
+    def query(self, fingerprint: bytes, max_ber: float = DUPLICATE_MAX_BER) -> list:
+        """[(track_id, доля различающихся бит)] по возрастанию расстояния"""
+        if not fingerprint or len(fingerprint) != FINGERPRINT_BYTES:
+            return []
+        query = np.frombuffer(fingerprint, dtype=np.uint8)
+        query_keys = lsh_keys(query[None, :])[0]
+
+        with self.lock:
+            candidates = [np.arange(self.indexed, len(self.ids))]
+            for band, key in enumerate(query_keys):
+                keys = self.sorted_keys[band] if self.sorted_keys else None
+                if keys is None:
+                    break
+                lo = np.searchsorted(keys, key, side='left')
+                hi = np.searchsorted(keys, key, side='right')
+                candidates.append(self.sorted_rows[band][lo:hi])
+
+            rows = np.unique(np.concatenate(candidates))
+            rows = rows[self.alive[rows]]
+            if not rows.size:
+                return []
+
+            distances = np.unpackbits(self.fingerprints[rows] ^ query, axis=1).sum(axis=1) / FINGERPRINT_BITS
+            matches = distances <= max_ber
+            order = np.argsort(distances[matches])
+            return [(int(track_id), float(ber)) for track_id, ber
+                    in zip(self.ids[rows][matches][order], distances[matches][order])]
+
+# Индексы по пользователям; загружаются из БД при первом обращении и после изменений в другом процессе
+_user_indexes = LRUCache(USER_INDEX_CACHE_SIZE)
+_user_indexes_lock = threading.Lock()
+
+def get_user_index(db, user_id: int) -> FingerprintIndex:
+    # Версию читаем до загрузки: изменение между ними просто вызовет еще одну перезагрузку
+    version = db.get_library_version(user_id)
+    with _user_indexes_lock:
+        index = _user_indexes.get(user_id)
+        if index is None or index.version != version:
+            index = FingerprintIndex()
+            index.add_many(db.get_user_fingerprints(user_id))
+            index.version = version
+            _user_indexes.set(user_id, index)
+        return index
+
+def find_duplicates(db, user_id: int, fingerprint: bytes) -> list:
+    """Треки пользователя, похожие на отпечаток (удаленные треки отбрасываются)"""
+    index = get_user_index(db, user_id)
+    tracks = []
+    for track_id, _ in index.query(fingerprint):
+        track = db.get_track_by_id(track_id)
+        if track:
+            tracks.append(track)
+        else:
+            index.remove(track_id)
+    return tracks
+
+def register_fingerprint(db, user_id: int, track_id: int, fingerprint: bytes):
+    """Добавляет отпечаток нового (уже сохраненного в БД) трека в индекс пользователя"""
+    if not fingerprint:
+        return
+    with _user_indexes_lock:
+        index = _user_indexes.get(user_id)
+        if index is None or index.version is None:
+            return
+        version = db.get_library_version(user_id)
+        # Сохранение этого трека увеличило версию на 1; если других изменений с загрузки индекса
+        # не было - дописываем трек, иначе индекс перезагрузится из БД при следующем поиске
+        if index.version == version - 1:
+            index.add(track_id, fingerprint)
+            index.version = version
+
+if __name__ == '__main__':
+    from database import DatabaseManager
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    db = DatabaseManager()
+    try:
+        pending = [(track.id, track.file_path) for track in db.get_all_tracks()
+                   if track.fingerprint is None and os.path.exists(track.file_path)]
+        for track_id, file_path in pending:
+            try:
+                db.set_track_fingerprint(track_id, compute_fingerprint(file_path))
+                logger.info(f"Отпечаток посчитан: {file_path}")
+            except Exception as e:
+                logger.error(f"Ошибка расчета отпечатка {file_path}: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+"""
+Общий путь добавления трека для бота и веб-загрузки
+
+Откуда бы ни пришел файл (Telegram или загрузка из дашборда), метаданные,
+акустический отпечаток и обложка извлекаются одинаково, а трек создается
+через DatabaseManager.add_track.
+"""
+
+import logging
+import os
+from mutagen import File as MutagenFile
+from fingerprint import compute_fingerprint, register_fingerprint
+from covers import save_embedded_cover
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TITLE = "Неизвестный трек"
+DEFAULT_ARTIST = "Неизвестный исполнитель"
+
+def first_tag(tags, key: str):
+    values = tags.get(key) if tags else None
+    return str(values[0]) if values else None
+
+def read_metadata(file_path: str, title: str = None, artist: str = None,
+                  duration: float = None, default_title: str = DEFAULT_TITLE) -> dict:
+    """Название, исполнитель и длительность; переданные значения важнее тегов файла"""
+    try:
+        # easy=True дает одинаковые ключи title/artist для ID3, MP4, FLAC и Ogg
+        audio_file = MutagenFile(file_path, easy=True)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать теги {file_path}: {e}")
+        audio_file = None
+
+    tags = audio_file.tags if audio_file is not None else None
+    if not duration and audio_file is not None and audio_file.info:
+        duration = audio_file.info.length
+
+    return {
+        'title': title or first_tag(tags, 'title') or default_title,
+        'artist': artist or first_tag(tags, 'artist') or DEFAULT_ARTIST,
+        'duration': int(duration) if duration else None
+    }
+
+def analyze_audio(file_path: str) -> dict:
+    """Отпечаток и обложка; долгая операция - вызывать вне event loop/потока запроса"""
+    try:
+        fingerprint = compute_fingerprint(file_path)
+    except Exception as e:
+        logger.warning(f"Не удалось посчитать отпечаток: {e}")
+        fingerprint = None
+
+    # Обложку извлекаем один раз при загрузке (одинаковые картинки хранятся однократно)
+    try:
+        cover_hash = save_embedded_cover(file_path)
+    except Exception as e:
+        logger.warning(f"Не удалось извлечь обложку: {e}")
+        cover_hash = None
+
+    return {'fingerprint': fingerprint, 'cover_hash': cover_hash}
+
+def create_track(db, user_id: int, audio_data: dict, album_id: int = None, playlist_id: int = None):
+    """Создает трек из данных read_metadata/analyze_audio и регистрирует его отпечаток"""
+    track = db.add_track(
+        user_id=user_id,
+        title=audio_data['title'],
+        artist=audio_data['artist'],
+        file_path=audio_data['file_path'],
+        file_id=audio_data.get('file_id'),
+        duration=audio_data['duration'],
+        album_id=album_id,
+        playlist_id=playlist_id,
+        fingerprint=audio_data.get('fingerprint'),
+        cover_hash=audio_data.get('cover_hash')
+    )
+    register_fingerprint(db, user_id, track.id, track.fingerprint)
+    return track
+
+def title_from_filename(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0] or DEFAULT_TITLE
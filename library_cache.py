@@ -0,0 +1,41 @@
+"""
+Кеши поверх библиотеки пользователя
+
+LRUCache - ограниченный по числу записей потокобезопасный кеш. Версия
+библиотеки пользователя (users.library_version) увеличивается при каждом
+изменении его альбомов, плейлистов и треков в той же транзакции, что и само
+изменение (это делает DatabaseManager), поэтому запись кеша, построенная по
+БД, хранит версию, с которой она строилась, и считается устаревшей, как
+только версия изменилась - даже если изменение пришло из другого процесса
+(веб-приложение, запущенное отдельно от бота).
+"""
+
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.items.pop(key, default)
+
+    def __len__(self):
+        return len(self.items)
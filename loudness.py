@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Анализ громкости по EBU R128 / ITU-R BS.1770 для нормализации воспроизведения
+
+Интегральная громкость считается потоково: PCM режется на подблоки по
+100 мс, K-фильтр применяется в частотной области (энергия подблока по
+теореме Парсеваля, взвешенная |H(f)|^2), из четырех подблоков собираются
+стробируемые блоки по 400 мс с перекрытием 75%. True peak - по сигналу,
+передискретизированному в 4 раза полифазным FIR-фильтром.
+
+Обработать все еще не проанализированные треки:
+    python loudness.py [--workers N]
+"""
+
+import argparse
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from mutagen import File as MutagenFile
+from pcm import iter_pcm_chunks
+import config
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 48000
+SUBBLOCK_SIZE = SAMPLE_RATE // 10  # 100 мс
+SUBBLOCKS_PER_BLOCK = 4  # блок 400 мс с шагом 100 мс
+
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# Коэффициенты K-фильтра для 48 кГц (BS.1770-4): high shelf + high pass
+K_FILTER_STAGES = [
+    ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585]),
+    ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621]),
+]
+
+OVERSAMPLE = 4
+TAPS_PER_PHASE = 12
+
+# Сколько результатов сохранять в БД одной транзакцией
+SAVE_BATCH_SIZE = 100
+
+def k_weighting_power(n: int) -> np.ndarray:
+    """|H(f)|^2 K-фильтра в точках rfft длины n"""
+    z = np.exp(-1j * np.pi * np.arange(n // 2 + 1) / (n // 2))
+    response = np.ones_like(z)
+    for b, a in K_FILTER_STAGES:
+        response *= (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+    power = np.abs(response) ** 2
+
+    # Парсеваль для rfft: все бины, кроме нулевого и последнего, встречаются дважды
+    power[1:-1] *= 2
+    return power / (n * n)
+
+def true_peak_filters() -> np.ndarray:
+    """Фазы интерполирующего фильтра, форма (TAPS_PER_PHASE, OVERSAMPLE)"""
+    taps = OVERSAMPLE * TAPS_PER_PHASE
+    t = (np.arange(taps) - (taps - 1) / 2) / OVERSAMPLE
+    h = np.sinc(t) * np.kaiser(taps, 5.0)
+    phases = h.reshape(TAPS_PER_PHASE, OVERSAMPLE).T
+    phases = phases / phases.sum(axis=1, keepdims=True)
+
+    # Свертка = скалярное произведение окна с развернутым фильтром
+    return np.ascontiguousarray(phases[:, ::-1].T).astype(np.float32)
+
+class LoudnessMeter:
+    """Потоковый измеритель: feed() по кускам, затем result()"""
+
+    def __init__(self, channels: int):
+        self.channels = channels
+        self.weights = k_weighting_power(SUBBLOCK_SIZE)
+        self.filters = true_peak_filters()
+        self.remainder = np.empty((0, channels), dtype=np.float32)
+        self.history = np.zeros((TAPS_PER_PHASE - 1, channels), dtype=np.float32)
+        self.subblock_energy = []
+        self.peak = 0.0
+        self.samples = 0
+
+    def feed(self, samples: np.ndarray):
+        samples = samples.reshape(-1, self.channels).astype(np.float32) / 32768.0
+        self.samples += samples.shape[0]
+        self.update_true_peak(samples)
+
+        if self.remainder.size:
+            samples = np.concatenate((self.remainder, samples))
+        full = samples.shape[0] - samples.shape[0] % SUBBLOCK_SIZE
+        if full:
+            # (подблок, отсчет, канал) -> энергия K-взвешенного сигнала по подблокам
+            subblocks = samples[:full].reshape(-1, SUBBLOCK_SIZE, self.channels)
+            spectrum = np.fft.rfft(subblocks, axis=1)
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            energy = np.einsum('bfc,f->b', power, self.weights)
+            self.subblock_energy.append(energy)
+        self.remainder = samples[full:]
+
+    def update_true_peak(self, samples: np.ndarray):
+        # Хвост прошлого куска нужен, чтобы фильтр не видел разрыва на границе
+        padded = np.concatenate((self.history, samples))
+        self.history = padded[-(TAPS_PER_PHASE - 1):]
+        peak = float(np.abs(samples).max(initial=0.0))
+        for channel in range(self.channels):
+            # Все фазы сразу: окна по TAPS_PER_PHASE отсчетов @ (TAPS_PER_PHASE, OVERSAMPLE)
+            windows = sliding_window_view(padded[:, channel], TAPS_PER_PHASE)
+            interpolated = windows @ self.filters
+            peak = max(peak, float(np.abs(interpolated).max(initial=0.0)))
+        self.peak = max(self.peak, peak)
+
+    def result(self) -> dict:
+        energy = np.concatenate(self.subblock_energy) if self.subblock_energy else np.empty(0)
+        true_peak = 20 * math.log10(self.peak) if self.peak > 0 else -math.inf
+        if energy.size < SUBBLOCKS_PER_BLOCK:
+            return {'loudness': None, 'true_peak': true_peak, 'duration': self.samples / SAMPLE_RATE}
+
+        # Средняя энергия скользящих блоков по 400 мс
+        cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+        blocks = (cumulative[SUBBLOCKS_PER_BLOCK:] - cumulative[:-SUBBLOCKS_PER_BLOCK]) / SUBBLOCKS_PER_BLOCK
+
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(blocks)
+
+        gated = blocks[block_loudness > ABSOLUTE_GATE_LUFS]
+        if gated.size == 0:
+            return {'loudness': None, 'true_peak': true_peak, 'duration': self.samples / SAMPLE_RATE}
+
+        relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+        gated = blocks[(block_loudness > ABSOLUTE_GATE_LUFS) & (block_loudness > relative_gate)]
+        return {
+            'loudness': float(-0.691 + 10 * np.log10(gated.mean())),
+            'true_peak': true_peak,
+            'duration': self.samples / SAMPLE_RATE
+        }
+
+def channel_count(file_path: str) -> int:
+    """Моно считаем как моно (иначе +3 дБ), все остальное сводим к стерео"""
+    try:
+        audio_file = MutagenFile(file_path)
+        if audio_file and getattr(audio_file.info, 'channels', 2) == 1:
+            return 1
+    except Exception:
+        pass
+    return 2
+
+def analyze_file(file_path: str) -> dict:
+    """Громкость, true peak и gain трека (функция выполняется в пуле процессов)"""
+    channels = channel_count(file_path)
+    meter = LoudnessMeter(channels)
+    for samples in iter_pcm_chunks(file_path, SAMPLE_RATE, channels=channels):
+        meter.feed(samples)
+
+    result = meter.result()
+    result['gain'] = (config.LOUDNESS_TARGET_LUFS - result['loudness']) if result['loudness'] is not None else None
+    if not math.isfinite(result['true_peak']):
+        result['true_peak'] = None
+    return result
+
+# Один пул процессов на процесс приложения: backlog и очередь анализа новых треков (analysis.py)
+_pool = None
+_pool_lock = threading.Lock()
+
+def process_pool(workers: int = None) -> ProcessPoolExecutor:
+    """Общий пул процессов анализа; число процессов задает первый вызов"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers or config.ANALYSIS_WORKERS)
+        return _pool
+
+def shutdown_process_pool():
+    """Останавливает пул (следующий process_pool() создаст новый, например после падения процесса)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=True)
+
+def analyze_backlog(workers: int = None) -> dict:
+    """Анализ всех треков без данных о громкости в пуле процессов"""
+    from database import DatabaseManager
+
+    db = DatabaseManager()
+    try:
+        pending = [(track.id, track.file_path) for track in db.get_tracks_without_loudness()
+                   if os.path.exists(track.file_path)]
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    analyzed = 0
+    failed = 0
+    batch = []
+
+    def save(batch):
+        db = DatabaseManager()
+        try:
+            db.set_tracks_loudness(batch)
+        finally:
+            db.close()
+
+    pool = process_pool(workers)
+    futures = {pool.submit(analyze_file, file_path): track_id for track_id, file_path in pending}
+    for future in as_completed(futures):
+        track_id = futures[future]
+        try:
+            batch.append((track_id, future.result()))
+            analyzed += 1
+        except Exception as e:
+            logger.error(f"Ошибка анализа громкости трека {track_id}: {e}")
+            failed += 1
+
+        if len(batch) >= SAVE_BATCH_SIZE:
+            save(batch)
+            batch = []
+
+    if batch:
+        save(batch)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'analyzed': analyzed,
+        'failed': failed,
+        'elapsed': elapsed,
+        'tracks_per_second': analyzed / elapsed if elapsed else 0.0
+    }
+
+if __name__ == '__main__':
+    from models import create_tables
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    parser = argparse.ArgumentParser(description='Анализ громкости треков')
+    parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию - число ядер)')
+    args = parser.parse_args()
+
+    create_tables()
+    try:
+        stats = analyze_backlog(args.workers or os.cpu_count())
+    finally:
+        shutdown_process_pool()
+    logger.info(
+        f"Проанализировано треков: {stats['analyzed']} (ошибок: {stats['failed']}) "
+        f"за {stats['elapsed']:.1f} с - {stats['tracks_per_second']:.2f} треков/с"
+    )
@@ -0,0 +1,37 @@
+"""
+Пути к файлам рядом с треком и расчет усиления для плеера
+
+Здесь только стандартная библиотека: модуль импортируют database.py и
+web_app.py, которым не нужны numpy, PIL и mutagen, пока не идет анализ
+аудио (раньше функции жили в waveform.py и loudness.py).
+"""
+
+import math
+import os
+
+PEAKS_EXTENSION = '.peaks'
+
+def peaks_path(file_path: str) -> str:
+    """Путь к файлу пиков рядом с треком"""
+    return file_path + PEAKS_EXTENSION
+
+def legacy_peaks_path(file_path: str) -> str:
+    """Старое имя файла пиков - без расширения трека"""
+    return os.path.splitext(file_path)[0] + PEAKS_EXTENSION
+
+def album_loudness(tracks: list) -> float:
+    """Громкость альбома: энергетическое среднее треков, взвешенное по длительности"""
+    weighted = [(track['loudness'], track.get('duration') or 1) for track in tracks if track['loudness'] is not None]
+    if not weighted:
+        return None
+    total = sum(duration for _, duration in weighted)
+    energy = sum(10 ** (loudness / 10) * duration for loudness, duration in weighted) / total
+    return 10 * math.log10(energy)
+
+def playback_gain(gain: float, peak: float) -> float:
+    """Gain для плеера с защитой от клиппинга (пик не выше 0 dBTP)"""
+    if gain is None:
+        return None
+    if peak is not None:
+        gain = min(gain, -peak)
+    return round(gain, 2)
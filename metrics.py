@@ -0,0 +1,251 @@
+"""
+Метрики в текстовом формате Prometheus (GET /metrics)
+
+Без внешних зависимостей: счетчики и гистограммы живут в памяти процесса
+(бот и веб-приложение работают в одном процессе, см. run.py). Обновление
+метрики - поиск бакета bisect'ом и запись в словарь по меткам под
+блокировкой, порядка микросекунды (замер: python -m benchmarks.metrics_overhead).
+Глубина очередей не хранится, а считается в момент запроса /metrics.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from profiler import query_context
+
+# Границы бакетов (секунды)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+REGISTRY = []
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self) -> list:
+        raise NotImplementedError
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> list:
+        with self.lock:
+            values = list(self.values.items())
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+                for labels, value in values]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # метки -> [счетчики по бакетам (+Inf последним), сумма]
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self) -> list:
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+class CallbackGauge(Metric):
+    """Значение считается при запросе /metrics: callback() -> число или {метки: число}"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> list:
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+                for labels, value in values.items()]
+
+def transcode_queue_depth() -> dict:
+    from database import DatabaseManager
+    db = DatabaseManager()
+    try:
+        return {(status,): count for status, count in db.count_transcode_jobs()}
+    finally:
+        db.close()
+
+def analysis_queue_depth() -> dict:
+    from database import DatabaseManager
+    db = DatabaseManager()
+    try:
+        return {(status,): count for status, count in db.count_analysis_jobs()}
+    finally:
+        db.close()
+
+def pending_file_deletions() -> int:
+    from database import DatabaseManager
+    db = DatabaseManager()
+    try:
+        return db.count_pending_file_deletions()
+    finally:
+        db.close()
+
+def uploads_in_progress() -> int:
+    from database import DatabaseManager
+    db = DatabaseManager()
+    try:
+        return db.count_uploads()
+    finally:
+        db.close()
+
+def play_events_buffered() -> int:
+    from play_events import play_buffer
+    return len(play_buffer.events)
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            # Недоступная БД не должна ломать остальные метрики
+            lines.append(f'# {metric.name}: ошибка сбора: {escape_label(e)}')
+    return '\n'.join(lines) + '\n'
+
+HTTP_REQUESTS = Counter('musicbot_http_requests_total', 'HTTP-запросы по маршрутам',
+                        ('route', 'method', 'status'))
+HTTP_LATENCY = Histogram('musicbot_http_request_duration_seconds',
+                         'Время обработки HTTP-запроса (для потоковых ответов - до начала отдачи)',
+                         ('route', 'method'))
+BOT_HANDLER_LATENCY = Histogram('musicbot_bot_handler_duration_seconds',
+                                'Время обработчиков бота (кнопки - по действию)', ('handler',))
+DB_QUERY_LATENCY = Histogram('musicbot_db_query_duration_seconds',
+                             'Время SQL-запросов (_count - число запросов)', ('operation',), QUERY_BUCKETS)
+AUDIO_BYTES_STREAMED = Counter('musicbot_audio_bytes_streamed_total',
+                               'Байты аудио, фактически отданные клиентам', ('quality',))
+
+# Очереди загрузки и фоновой обработки
+CallbackGauge('musicbot_transcode_jobs', 'Задачи перекодирования по статусу', transcode_queue_depth, ('status',))
+CallbackGauge('musicbot_analysis_jobs', 'Задачи анализа треков по статусу', analysis_queue_depth, ('status',))
+CallbackGauge('musicbot_uploads_in_progress', 'Незавершенные загрузки из дашборда', uploads_in_progress)
+CallbackGauge('musicbot_play_events_buffered', 'События прослушивания, ждущие записи в БД', play_events_buffered)
+CallbackGauge('musicbot_pending_file_deletions', 'Файлы в очереди на удаление', pending_file_deletions)
+
+def init_app(app):
+    """Время и число запросов по шаблону маршрута (а не по URL - иначе метки не ограничены)"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - started, (route, request.method))
+            HTTP_REQUESTS.inc((route, request.method, str(response.status_code)))
+        return response
+
+def sql_operation(statement: str) -> str:
+    operation = statement.lstrip()[:6].upper()
+    return operation if operation in SQL_OPERATIONS else 'OTHER'
+
+def instrument_engine(engine):
+    """Время каждого SQL-запроса через события движка SQLAlchemy"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_query_metrics(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'metrics_started', None)
+        if started is not None:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - started, (sql_operation(statement),))
+
+def timed_handler(label):
+    """Декоратор обработчика бота (self, update, context); label - имя или функция от update"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(self, update, context):
+            started = time.perf_counter()
+            name = label(update) if callable(label) else label
+            # Обработчик и пользователь - для журнала медленных запросов
+            user = getattr(getattr(update, 'effective_user', None), 'id', None)
+            token = query_context.set((name, user))
+            try:
+                return await handler(self, update, context)
+            finally:
+                query_context.reset(token)
+                BOT_HANDLER_LATENCY.observe(time.perf_counter() - started, (name,))
+        return wrapper
+    return decorator
+
+def count_streamed_bytes(iterable, quality: str):
+    """Обертка тела ответа: считает байты, реально ушедшие клиенту (перемотка обрывает поток)"""
+    sent = 0
+    try:
+        for chunk in iterable:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        AUDIO_BYTES_STREAMED.inc((quality,), sent)
+        close = getattr(iterable, 'close', None)
+        if close:
+            close()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, inspect, text, Column, Integer, BigInteger, Float, String, DateTime, ForeignKey, Text, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -17,6 +17,8 @@ class User(Base):
     first_name = Column(String(100))
     last_name = Column(String(100))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Растет при каждом изменении альбомов, плейлистов и треков (кеш клавиатур бота, см. library_cache.py)
+    library_version = Column(Integer, default=0)
     
     # Связи
     albums = relationship("Album", back_populates="user", cascade="all, delete-orphan")
@@ -32,6 +34,10 @@ class Album(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Громкость альбома (ReplayGain album gain), считается по трекам
+    album_gain = Column(Float)  # дБ
+    album_peak = Column(Float)  # dBTP
+    
     # Связи
     user = relationship("User", back_populates="albums")
     tracks = relationship("Track", back_populates="album", cascade="all, delete-orphan")
@@ -48,7 +54,9 @@ class Playlist(Base):
     
     # Связи
     user = relationship("User", back_populates="playlists")
-    tracks = relationship("Track", back_populates="playlist", cascade="all, delete-orphan")
+    # Удаление плейлиста удаляет только позиции, сами треки остаются в библиотеке
+    items = relationship("PlaylistItem", back_populates="playlist", cascade="all, delete-orphan",
+                         order_by="PlaylistItem.position")
 
 # Модель трека
 class Track(Base):
@@ -61,14 +69,148 @@ class Track(Base):
     file_id = Column(String(200))  # Telegram file_id для быстрой отправки
     duration = Column(Integer)  # Длительность в секундах
     album_id = Column(Integer, ForeignKey('albums.id'))
-    playlist_id = Column(Integer, ForeignKey('playlists.id'))
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Громкость по EBU R128
+    loudness = Column(Float)  # Интегральная громкость, LUFS
+    true_peak = Column(Float)  # dBTP
+    track_gain = Column(Float)  # дБ до целевой громкости
+    
+    # Акустический отпечаток для поиска дубликатов (см. fingerprint.py)
+    fingerprint = Column(LargeBinary)
+    
+    # sha256 встроенной обложки (одинаковые картинки хранятся один раз, см. covers.py)
+    cover_hash = Column(String(64), index=True)
+    
     # Связи
     album = relationship("Album", back_populates="tracks")
-    playlist = relationship("Playlist", back_populates="tracks")
+    playlist_items = relationship("PlaylistItem", back_populates="track", cascade="all, delete-orphan")
     user = relationship("User")
+    variants = relationship("TrackVariant", back_populates="track", cascade="all, delete-orphan")
+    transcode_job = relationship("TranscodeJob", back_populates="track", uselist=False, cascade="all, delete-orphan")
+    analysis_job = relationship("AnalysisJob", back_populates="track", uselist=False, cascade="all, delete-orphan")
+
+    @property
+    def playlists(self):
+        return [item.playlist for item in self.playlist_items]
+
+# Модель позиции трека в плейлисте (один трек может быть в нескольких плейлистах)
+class PlaylistItem(Base):
+    __tablename__ = 'playlist_items'
+    __table_args__ = (UniqueConstraint('playlist_id', 'track_id'),)
+    
+    id = Column(Integer, primary_key=True)
+    playlist_id = Column(Integer, ForeignKey('playlists.id'), nullable=False, index=True)
+    track_id = Column(Integer, ForeignKey('tracks.id'), nullable=False, index=True)
+    # Позиции идут с шагом POSITION_GAP: перестановка меняет одну строку
+    position = Column(Integer, nullable=False)
+    added_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Связи
+    playlist = relationship("Playlist", back_populates="items")
+    track = relationship("Track", back_populates="playlist_items")
+
+# Шаг между соседними позициями в плейлисте
+POSITION_GAP = 1024
+
+# Модель перекодированной версии трека (лестница битрейтов)
+class TrackVariant(Base):
+    __tablename__ = 'track_variants'
+    __table_args__ = (UniqueConstraint('track_id', 'quality', 'codec'),)
+    
+    id = Column(Integer, primary_key=True)
+    track_id = Column(Integer, ForeignKey('tracks.id'), nullable=False, index=True)
+    quality = Column(String(20), nullable=False)  # low / medium
+    codec = Column(String(20), nullable=False)  # opus / aac
+    bitrate = Column(Integer, nullable=False)  # кбит/с
+    mimetype = Column(String(50), nullable=False)
+    file_path = Column(String(500), nullable=False)
+    file_size = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Связи
+    track = relationship("Track", back_populates="variants")
+
+# Модель задачи перекодирования (персистентная очередь)
+class TranscodeJob(Base):
+    __tablename__ = 'transcode_jobs'
+    
+    id = Column(Integer, primary_key=True)
+    track_id = Column(Integer, ForeignKey('tracks.id'), nullable=False, unique=True)
+    status = Column(String(20), nullable=False, default='pending', index=True)  # pending / running / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Связи
+    track = relationship("Track", back_populates="transcode_job")
+
+# Модель задачи анализа трека: пики, громкость, отпечаток (см. analysis.py)
+class AnalysisJob(Base):
+    __tablename__ = 'analysis_jobs'
+    
+    id = Column(Integer, primary_key=True)
+    track_id = Column(Integer, ForeignKey('tracks.id'), nullable=False, unique=True)
+    status = Column(String(20), nullable=False, default='pending', index=True)  # pending / running / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Связи
+    track = relationship("Track", back_populates="analysis_job")
+
+# Модель события прослушивания (пишется пачками, см. play_events.py)
+class PlayEvent(Base):
+    __tablename__ = 'play_events'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    track_id = Column(Integer, ForeignKey('tracks.id'), nullable=False, index=True)
+    source = Column(String(20), nullable=False)  # web / bot
+    played_at = Column(DateTime, nullable=False)
+
+# Модель почасовой сводки прослушиваний - по ней строятся "топ" и "недавние"
+class PlayStat(Base):
+    __tablename__ = 'play_stats'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'track_id', 'hour'),
+        Index('ix_play_stats_user_hour', 'user_id', 'hour'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    track_id = Column(Integer, ForeignKey('tracks.id'), nullable=False, index=True)
+    hour = Column(DateTime, nullable=False)  # начало часа
+    play_count = Column(Integer, nullable=False, default=0)
+    last_played_at = Column(DateTime, nullable=False)
+
+# Модель файла, ожидающего удаления с диска (очередь для reaper.py)
+class PendingFileDeletion(Base):
+    __tablename__ = 'pending_file_deletions'
+    
+    id = Column(Integer, primary_key=True)
+    file_path = Column(String(500), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Модель незавершенной загрузки из веб-дашборда (см. uploads.py)
+class Upload(Base):
+    __tablename__ = 'uploads'
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(500), nullable=False)  # .part файл в UPLOAD_FOLDER/incoming
+    size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, nullable=False, default=0)  # подтвержденное смещение
+    checksum = Column(String(64))  # SHA-256 файла от клиента (необязательно)
+    album_id = Column(Integer, ForeignKey('albums.id'))
+    playlist_id = Column(Integer, ForeignKey('playlists.id'))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
 # Создание движка и сессии базы данных
 engine = create_engine(config.DATABASE_URL)
@@ -77,6 +219,44 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Создание таблиц
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    migrate_playlist_items()
+    enqueue_missing_analysis()
+
+# create_all не меняет существующие таблицы - новые колонки и их индексы добавляем сами
+def add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+# Раньше трек принадлежал одному плейлисту (tracks.playlist_id) - переносим связи в playlist_items
+def migrate_playlist_items():
+    columns = {column['name'] for column in inspect(engine).get_columns('tracks')}
+    if 'playlist_id' not in columns:
+        return
+    with engine.begin() as connection:
+        # id трека возрастает вместе с порядком загрузки, его и берем за позицию
+        connection.execute(text(
+            'INSERT INTO playlist_items (playlist_id, track_id, position, added_at) '
+            'SELECT playlist_id, id, id * :gap, created_at FROM tracks WHERE playlist_id IS NOT NULL'
+        ), {'gap': POSITION_GAP})
+        connection.execute(text('UPDATE tracks SET playlist_id = NULL WHERE playlist_id IS NOT NULL'))
+
+# Раньше треки анализировались внутри задач перекодирования - непроанализированные ставим в очередь анализа
+def enqueue_missing_analysis():
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO analysis_jobs (track_id, status, attempts, created_at, updated_at) "
+            "SELECT id, 'pending', 0, :now, :now FROM tracks "
+            "WHERE loudness IS NULL AND id NOT IN (SELECT track_id FROM analysis_jobs)"
+        ), {'now': datetime.utcnow()})
 
 # Функция для получения сессии БД
 def get_db():
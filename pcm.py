@@ -0,0 +1,67 @@
+"""
+Потоковое декодирование аудио в PCM через ffmpeg
+
+Файл никогда не загружается в память целиком: ffmpeg пишет 16-битный
+PCM в pipe, а вызывающий код получает его кусками фиксированного размера.
+"""
+
+import os
+import subprocess
+import tempfile
+import numpy as np
+import config
+
+CHUNK_BYTES = 256 * 1024
+
+# Сколько последних байт stderr ffmpeg попадает в текст ошибки
+STDERR_TAIL_BYTES = 4096
+
+def read_tail(file, limit: int = STDERR_TAIL_BYTES) -> str:
+    """Последние limit байт файла"""
+    size = file.seek(0, os.SEEK_END)
+    file.seek(max(0, size - limit))
+    return file.read().decode(errors='replace').strip()
+
+def iter_pcm_chunks(file_path: str, sample_rate: int, channels: int = 1,
+                    chunk_bytes: int = CHUNK_BYTES):
+    """Генератор массивов int16 (для channels > 1 - формы (n, channels))"""
+    command = [
+        config.FFMPEG_PATH, '-nostdin', '-v', 'error',
+        '-i', file_path,
+        '-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ac', str(channels), '-ar', str(sample_rate),
+        '-'
+    ]
+    # stderr - во временный файл: если ffmpeg заполнит pipe предупреждениями,
+    # пока мы читаем stdout, оба процесса встанут
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+    frame_bytes = 2 * channels
+    pending = b''
+
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+
+            # Read из pipe может вернуть неполный кадр - остаток ждет следующего куска
+            data = pending + data
+            usable = len(data) - len(data) % frame_bytes
+            pending = data[usable:]
+            if usable == 0:
+                continue
+
+            samples = np.frombuffer(data[:usable], dtype='<i2')
+            yield samples.reshape(-1, channels) if channels > 1 else samples
+
+        process.wait()
+        if process.returncode != 0:
+            error = read_tail(stderr)
+            raise RuntimeError(error or f"ffmpeg завершился с кодом {process.returncode}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr.close()
@@ -0,0 +1,86 @@
+"""
+Буфер событий прослушивания
+
+Веб-плеер и бот только добавляют событие в список в памяти. Фоновый поток
+записывает накопленное одной транзакцией (executemany для событий и для
+почасовых сводок), как только набралось PLAY_EVENTS_BATCH_SIZE событий или
+прошло PLAY_EVENTS_FLUSH_INTERVAL секунд. Остаток дописывается при выходе.
+"""
+
+import atexit
+import logging
+import threading
+from datetime import datetime
+from database import DatabaseManager
+import config
+
+logger = logging.getLogger(__name__)
+
+# Если БД недоступна, столько событий держим в памяти до следующей попытки
+MAX_PENDING_EVENTS = 100000
+
+class PlayEventBuffer:
+    def __init__(self, batch_size: int = None, flush_interval: float = None):
+        self.batch_size = batch_size or config.PLAY_EVENTS_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else config.PLAY_EVENTS_FLUSH_INTERVAL
+        self.events = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def record(self, user_id: int, track_id: int, source: str, played_at: datetime = None):
+        """Добавляет событие в буфер; запись в БД - в фоновом потоке"""
+        with self.lock:
+            self.events.append((user_id, track_id, source, played_at or datetime.utcnow()))
+            full = len(self.events) >= self.batch_size
+            if self.thread is None:
+                self.start()
+        if full:
+            self.wakeup.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='play-events', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Записывает накопленные события; возвращает их число"""
+        with self.flush_lock:
+            with self.lock:
+                events, self.events = self.events, []
+            if not events:
+                return 0
+
+            db = DatabaseManager()
+            try:
+                db.record_play_events(events)
+                return len(events)
+            except Exception as e:
+                logger.error(f"Ошибка записи событий прослушивания ({len(events)} шт.): {e}")
+                with self.lock:
+                    # Возвращаем пачку в начало буфера, но не растем бесконечно
+                    self.events = (events + self.events)[-MAX_PENDING_EVENTS:]
+                return 0
+            finally:
+                db.close()
+
+# Общий буфер процесса для веб-приложения и бота
+play_buffer = PlayEventBuffer()
+
+def record_play(user_id: int, track_id: int, source: str):
+    play_buffer.record(user_id, track_id, source)
@@ -0,0 +1,240 @@
+"""
+Профилирование запросов и журнал медленных SQL-запросов
+
+Профиль запроса включается для всех запросов (PROFILING_ENABLED=true) или
+для одного запроса заголовком X-Profile-Token со значением ADMIN_TOKEN.
+В профиль попадают все SQL-запросы с временем (события движка
+before/after_cursor_execute), время рендеринга шаблонов и сериализации
+JSON, а также сэмплы стека потока запроса раз в PROFILE_SAMPLE_INTERVAL_MS
+(формат collapsed stacks, можно отдать flamegraph.pl). Итог - в заголовке
+Server-Timing (видно в DevTools), полный отчет - на /admin/profiles/<id>.
+
+Запросы дольше SLOW_QUERY_MS пишутся в журнал slow_queries с маршрутом
+(или обработчиком бота) и пользователем - независимо от профилирования.
+"""
+
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+import config
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('slow_queries')
+
+# Сколько последних профилей хранится в памяти
+PROFILE_HISTORY = 50
+# Сколько строк отчета показывать (запросы, стеки)
+REPORT_TOP = 20
+# Стек глубже обрезается сверху (кадры сервера и Flask не интересны)
+MAX_STACK_DEPTH = 40
+SLOW_QUERY_MAX_LENGTH = 1000
+
+# Профиль текущего запроса и (маршрут или обработчик, пользователь) для журнала
+current_profile = ContextVar('current_profile', default=None)
+query_context = ContextVar('query_context', default=None)
+
+profiles = deque(maxlen=PROFILE_HISTORY)
+
+class StackSampler:
+    """Раз в interval секунд снимает стек потока thread_id"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profiler-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def top(self, limit: int = REPORT_TOP) -> list:
+        return [{'stack': stack, 'samples': count} for stack, count in self.counts.most_common(limit)]
+
+class RequestProfile:
+    def __init__(self, route: str, user):
+        self.id = uuid.uuid4().hex[:12]
+        self.route = route
+        self.user = user
+        self.created_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.queries = []  # (SQL, секунды)
+        self.template_time = 0.0
+        self.template_started = None
+        self.json_time = 0.0
+        self.sampler = StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        self.sampler.start()
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        self.sampler.stop()
+
+    @property
+    def total_time(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def sql_time(self) -> float:
+        return sum(duration for _, duration in self.queries)
+
+    def server_timing(self) -> str:
+        parts = [('sql', self.sql_time), ('tmpl', self.template_time), ('json', self.json_time),
+                 ('total', self.total_time)]
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in parts)
+
+    def summary(self) -> dict:
+        return {
+            'id': self.id,
+            'route': self.route,
+            'user': self.user,
+            'created_at': self.created_at.isoformat(),
+            'total_ms': round(self.total_time * 1000, 2),
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'sql_count': len(self.queries),
+            'template_ms': round(self.template_time * 1000, 2),
+            'json_ms': round(self.json_time * 1000, 2)
+        }
+
+    def report(self) -> dict:
+        # Одинаковые запросы с разными параметрами - одна строка (видно N+1)
+        statements = {}
+        for statement, duration in self.queries:
+            entry = statements.setdefault(statement, {'statement': statement, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += duration * 1000
+            entry['max_ms'] = max(entry['max_ms'], duration * 1000)
+        top_statements = sorted(statements.values(), key=lambda entry: entry['total_ms'], reverse=True)[:REPORT_TOP]
+        for entry in top_statements:
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+
+        report = self.summary()
+        report['other_ms'] = round((self.total_time - self.sql_time - self.template_time - self.json_time) * 1000, 2)
+        report['statements'] = top_statements
+        report['samples'] = self.sampler.top()
+        report['sample_interval_ms'] = config.PROFILE_SAMPLE_INTERVAL_MS
+        return report
+
+def get_profile(profile_id: str):
+    for profile in list(profiles):
+        if profile.id == profile_id:
+            return profile
+    return None
+
+def is_admin(token: str) -> bool:
+    return bool(config.ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, config.ADMIN_TOKEN)
+
+def instrument_engine(engine):
+    """SQL-запросы в профиль текущего запроса и медленные - в журнал"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.profiler_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'profiler_started', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+
+        profile = current_profile.get()
+        if profile is not None:
+            profile.queries.append((statement, duration))
+
+        if config.SLOW_QUERY_MS and duration * 1000 >= config.SLOW_QUERY_MS:
+            route, user = query_context.get() or ('-', None)
+            slow_query_logger.warning(
+                f"{duration * 1000:.0f} мс [{route}] пользователь {user}: "
+                f"{' '.join(statement.split())[:SLOW_QUERY_MAX_LENGTH]}"
+            )
+
+def init_app(app):
+    """Контекст для журнала медленных запросов и профиль по конфигу или заголовку администратора"""
+    from flask import request, template_rendered, before_render_template
+    from flask.json.provider import DefaultJSONProvider
+
+    class ProfilingJSONProvider(DefaultJSONProvider):
+        def response(self, *args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return super().response(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return super().response(*args, **kwargs)
+            finally:
+                profile.json_time += time.perf_counter() - started
+
+    app.json = ProfilingJSONProvider(app)
+
+    @app.before_request
+    def start_profile():
+        route = request.url_rule.rule if request.url_rule else request.path
+        user = (request.view_args or {}).get('telegram_id')
+        query_context.set((route, user))
+        if config.PROFILING_ENABLED or is_admin(request.headers.get('X-Profile-Token')):
+            current_profile.set(RequestProfile(route, user))
+
+    @app.after_request
+    def finish_profile(response):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.finish()
+            profiles.append(profile)
+            response.headers['Server-Timing'] = profile.server_timing()
+            response.headers['X-Profile-Id'] = profile.id
+            summary = profile.summary()
+            logger.info(
+                f"Профиль {profile.id} [{profile.route}]: {summary['total_ms']} мс, "
+                f"SQL {summary['sql_ms']} мс ({summary['sql_count']} запросов), "
+                f"шаблоны {summary['template_ms']} мс, JSON {summary['json_ms']} мс"
+            )
+        return response
+
+    @app.teardown_request
+    def reset_profile(exception=None):
+        # Поток сервера обслуживает следующие запросы - контекст не должен перейти к ним
+        profile = current_profile.get()
+        if profile is not None and profile.finished is None:
+            profile.finish()
+        current_profile.set(None)
+        query_context.set(None)
+
+    def template_started(sender, template, context, **extra):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.template_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        profile = current_profile.get()
+        if profile is not None and profile.template_started is not None:
+            profile.template_time += time.perf_counter() - profile.template_started
+            profile.template_started = None
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
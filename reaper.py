@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Фоновое удаление файлов удаленных треков
+
+Запросы на удаление только удаляют строки из БД и в той же транзакции
+записывают пути файлов в pending_file_deletions. Этот поток забирает
+очередь пачками и удаляет файлы с диска, поэтому запрос не ждет диска,
+а сбой посередине не оставляет строк без файлов или файлов без строк.
+
+Разово очистить очередь:  python reaper.py
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from database import DatabaseManager
+import config
+
+logger = logging.getLogger(__name__)
+
+# Сколько файлов удалять за один проход
+REAP_BATCH_SIZE = 500
+
+# После стольких неудачных попыток файл убирается из очереди (с записью в лог)
+REAP_MAX_ATTEMPTS = 5
+
+def reap_pending_files(limit: int = REAP_BATCH_SIZE) -> int:
+    """Один проход по очереди; возвращает число обработанных записей"""
+    db = DatabaseManager()
+    try:
+        pending = db.get_pending_file_deletions(limit)
+        if not pending:
+            return 0
+        referenced = db.get_referenced_file_paths([item.file_path for item in pending])
+
+        done_ids = []
+        failed_ids = []
+        for item in pending:
+            if item.file_path in referenced:
+                done_ids.append(item.id)
+                continue
+            try:
+                os.remove(item.file_path)
+                done_ids.append(item.id)
+            except FileNotFoundError:
+                done_ids.append(item.id)
+            except OSError as e:
+                if item.attempts + 1 >= REAP_MAX_ATTEMPTS:
+                    logger.error(f"Не удалось удалить файл {item.file_path}, попытки исчерпаны: {e}")
+                    done_ids.append(item.id)
+                else:
+                    logger.warning(f"Ошибка удаления файла {item.file_path}: {e}")
+                    failed_ids.append(item.id)
+
+        db.finish_file_deletions(done_ids, failed_ids)
+        return len(pending)
+    finally:
+        db.close()
+
+def expire_stale_uploads() -> int:
+    """Незавершенные загрузки без новых кусков дольше UPLOAD_EXPIRY_HOURS"""
+    from uploads import forget_upload
+
+    db = DatabaseManager()
+    try:
+        expired = db.expire_uploads(datetime.utcnow() - timedelta(hours=config.UPLOAD_EXPIRY_HOURS))
+    finally:
+        db.close()
+    # Хеши и блокировки брошенных загрузок тоже больше не нужны
+    for upload_id in expired:
+        forget_upload(upload_id)
+    return len(expired)
+
+class FileReaper:
+    def __init__(self, interval: float = None):
+        self.interval = interval if interval is not None else config.FILE_REAPER_INTERVAL
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                # .part файлы брошенных загрузок попадают в ту же очередь
+                expire_stale_uploads()
+                # Полная пачка - в очереди, скорее всего, есть еще: продолжаем без паузы
+                if reap_pending_files() >= REAP_BATCH_SIZE:
+                    continue
+            except Exception as e:
+                logger.error(f"Ошибка очереди удаления файлов: {e}")
+            self.stop_event.wait(self.interval)
+
+if __name__ == '__main__':
+    from models import create_tables
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    create_tables()
+    expired = expire_stale_uploads()
+    if expired:
+        logger.info(f"Удалено брошенных загрузок: {expired}")
+    total = 0
+    while True:
+        processed = reap_pending_files()
+        total += processed
+        if processed < REAP_BATCH_SIZE:
+            break
+    logger.info(f"Обработано записей очереди удаления: {total}")
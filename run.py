@@ -4,14 +4,13 @@
 Запускает и телеграм бота и веб-приложение одновременно
 """
 
-import asyncio
 import threading
 import signal
 import sys
+import time
 import logging
-from telegram_bot import main as run_bot
-from web_app import app
 import config
+import startup
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,22 +23,27 @@ class MusicBotService:
     def __init__(self):
         self.bot_thread = None
         self.web_thread = None
+        self.web_server = None
+        self.transcode_worker = None
+        self.analysis_worker = None
+        self.file_reaper = None
         self.running = False
     
     def start_web_app(self):
-        """Запуск Flask веб-приложения"""
+        """Запуск Flask веб-приложения в отдельном потоке; возвращается, когда сокет уже слушает"""
+        from werkzeug.serving import make_server
+        from web_app import app
+        
         logger.info(f"🌐 Запуск веб-приложения на http://{config.FLASK_HOST}:{config.FLASK_PORT}")
-        app.run(
-            host=config.FLASK_HOST,
-            port=config.FLASK_PORT,
-            debug=False,
-            use_reloader=False,
-            threaded=True
-        )
+        self.web_server = make_server(config.FLASK_HOST, config.FLASK_PORT, app, threaded=True)
+        self.web_thread = threading.Thread(target=self.web_server.serve_forever, daemon=True)
+        self.web_thread.start()
+        startup.set_ready('web')
     
     def start_telegram_bot(self):
-        """Запуск телеграм бота"""
+        """Запуск телеграм бота (стек telegram импортируется только здесь)"""
         logger.info("🤖 Запуск Telegram бота...")
+        from telegram_bot import main as run_bot
         run_bot()
     
     def start(self):
@@ -51,22 +55,40 @@ class MusicBotService:
             return
         
         self.running = True
+        started = time.perf_counter()
         
         logger.info("🎵 Запуск музыкального бота-песенника...")
         logger.info("=" * 50)
         
+        # Папки и схема БД - один раз, до запуска сервисов
+        startup.expect('web', 'bot')
+        startup.initialize()
+        
         # Запускаем веб-приложение в отдельном потоке
-        self.web_thread = threading.Thread(target=self.start_web_app, daemon=True)
-        self.web_thread.start()
+        self.start_web_app()
         
-        # Даем время веб-серверу запуститься
-        import time
-        time.sleep(2)
+        # Воркеры (и numpy, mutagen для анализа) импортируются только при запуске сервиса
+        from transcoder import TranscodeWorker
+        from analysis import AnalysisWorker
+        from reaper import FileReaper
         
-        logger.info("✅ Сервисы запущены!")
+        # Фоновый анализ новых треков (пики, громкость, отпечаток)
+        self.analysis_worker = AnalysisWorker()
+        self.analysis_worker.start()
+        
+        # Фоновое перекодирование треков
+        if config.TRANSCODE_ENABLED:
+            self.transcode_worker = TranscodeWorker()
+            self.transcode_worker.start()
+        
+        # Фоновое удаление файлов удаленных треков
+        self.file_reaper = FileReaper()
+        self.file_reaper.start()
+        
+        logger.info(f"✅ Веб-сервис запущен за {(time.perf_counter() - started) * 1000:.0f} мс")
         logger.info("=" * 50)
-        logger.info(f"📱 Telegram бот: готов к работе")
         logger.info(f"🌐 Веб-интерфейс: http://{config.FLASK_HOST}:{config.FLASK_PORT}")
+        logger.info(f"🩺 Готовность: http://{config.FLASK_HOST}:{config.FLASK_PORT}/readyz")
         logger.info(f"📁 Папка загрузок: {config.UPLOAD_FOLDER}")
         logger.info("=" * 50)
         logger.info("💡 Инструкции:")
@@ -87,6 +109,16 @@ class MusicBotService:
         logger.info("\n🛑 Остановка сервисов...")
         self.running = False
         
+        if self.web_server:
+            startup.set_ready('web', False)
+            self.web_server.shutdown()
+        if self.analysis_worker:
+            self.analysis_worker.stop()
+        if self.transcode_worker:
+            self.transcode_worker.stop()
+        if self.file_reaper:
+            self.file_reaper.stop()
+        
         logger.info("✅ Все сервисы остановлены")
         sys.exit(0)
 
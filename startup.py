@@ -0,0 +1,100 @@
+"""
+Инициализация процесса и готовность сервисов
+
+Проверка схемы БД и создание папок выполняются не при импорте модулей, а
+один раз на процесс в initialize(): явно из точек входа (run.py,
+telegram_bot.main) или при первом запросе к веб-приложению, запущенному
+через WSGI. Там же на движок БД вешаются замеры SQL-запросов (metrics.py,
+profiler.py). Поэтому импорт любого модуля (скрипты, бенчмарки, воркеры) не
+трогает ни БД, ни диск, ни движок.
+
+Точка входа объявляет, какие компоненты должны подняться (expect), а сами
+компоненты отмечают готовность (set_ready): веб-сервер - когда сокет уже
+слушает, бот - когда Telegram ответил на getMe. /readyz отдает 503, пока
+не готов хоть один компонент, схема не проверена или БД не отвечает.
+"""
+
+import logging
+import os
+import threading
+import time
+import config
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_initialized = False
+_engine_instrumented = False
+_process_started = time.time()
+
+# Компонент -> готов ли он
+components = {}
+
+def initialize():
+    """Папки и схема БД - один раз на процесс"""
+    global _initialized
+    if _initialized:
+        return
+    with _lock:
+        if _initialized:
+            return
+        started = time.perf_counter()
+        instrument_engine()
+        config.ensure_directories()
+        from models import create_tables
+        create_tables()
+        _initialized = True
+        logger.info(f"Схема БД и папки проверены за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+def instrument_engine():
+    """Время SQL-запросов для /metrics и журнала медленных запросов"""
+    global _engine_instrumented
+    # Отдельный флаг: если initialize() упал, повторный вызов не должен навесить слушателей второй раз
+    if _engine_instrumented:
+        return
+    import metrics
+    import profiler
+    from models import engine
+    if config.METRICS_ENABLED:
+        metrics.instrument_engine(engine)
+    profiler.instrument_engine(engine)
+    _engine_instrumented = True
+
+def is_initialized() -> bool:
+    return _initialized
+
+def expect(*names):
+    for name in names:
+        components.setdefault(name, False)
+
+def set_ready(name: str, ready: bool = True):
+    components[name] = ready
+
+def check_database() -> dict:
+    from sqlalchemy import text
+    from models import engine
+    started = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'ms': round((time.perf_counter() - started) * 1000, 2)}
+
+def readiness() -> dict:
+    checks = {}
+    try:
+        initialize()
+        checks['schema'] = {'ok': True}
+    except Exception as e:
+        logger.error(f"Ошибка инициализации: {e}")
+        checks['schema'] = {'ok': False, 'error': str(e)}
+    checks['database'] = check_database()
+    checks['uploads'] = {'ok': os.access(config.UPLOAD_FOLDER, os.W_OK)}
+    for name, ready in list(components.items()):
+        checks[name] = {'ok': ready}
+    return {
+        'ready': all(check['ok'] for check in checks.values()),
+        'uptime': round(time.time() - _process_started, 3),
+        'checks': checks
+    }
@@ -7,6 +7,25 @@ let isShuffled = false;
 let originalPlaylist = [];
 let audioPlayer = null;
 let telegramId = null;
+let currentPeaks = null;
+let historyLists = { top: [], recent: [] };  // Списки секции "История"
+
+// Загрузка файлов по частям (см. uploads.py)
+const UPLOAD_PARALLEL_FILES = 3;
+const UPLOAD_MAX_RETRIES = 8;
+// Поле reason ответа сервера, при котором кусок отправляется повторно
+const UPLOAD_RETRY_REASONS = ['busy', 'chunk_checksum_mismatch'];
+let uploadQueue = [];
+let activeUploads = 0;
+
+// Нормализация громкости
+let audioContext = null;
+let gainNode = null;
+let albumGain = null;  // gain альбома, пока альбом играет целиком
+let currentGainFactor = 1;
+
+// Качество аудио: auto (по скорости сети), low, medium или original
+let audioQuality = localStorage.getItem('audioQuality') || 'auto';
 
 // Инициализация плеера
 function initializeMusicPlayer(userId) {
@@ -32,14 +51,135 @@ function initializeMusicPlayer(userId) {
         audioPlayer.volume = volumeSlider.value / 100;
     }
     
+    // Настройка качества
+    const qualitySelect = document.getElementById('quality-select');
+    if (qualitySelect) {
+        qualitySelect.value = audioQuality;
+        qualitySelect.addEventListener('change', setAudioQuality);
+    }
+    
     // Настройка клика по прогресс-бару
     const progressBar = document.getElementById('progress-bar');
     if (progressBar && progressBar.parentElement) {
         progressBar.parentElement.addEventListener('click', seekTo);
     }
     
+    // Зона загрузки файлов
+    initializeUploadZone();
+    
     // Загружаем все треки пользователя
     loadAllTracks();
+
+    // Оффлайн-кеш
+    registerServiceWorker();
+}
+
+// Регистрация service worker
+async function registerServiceWorker() {
+    if (!('serviceWorker' in navigator)) return;
+
+    try {
+        await navigator.serviceWorker.register('/sw.js');
+        const registration = await navigator.serviceWorker.ready;
+
+        // Кешируем оболочку: все стили и скрипты текущей страницы
+        const urls = [location.pathname];
+        document.querySelectorAll('link[rel="stylesheet"][href], script[src]').forEach(el => {
+            urls.push(el.href || el.src);
+        });
+        registration.active.postMessage({type: 'precache', urls});
+    } catch (error) {
+        console.error('Ошибка регистрации service worker:', error);
+    }
+}
+
+// Отправка сообщения service worker с ответами через MessageChannel
+function postToServiceWorker(message, onMessage) {
+    return navigator.serviceWorker.ready.then(registration => new Promise(resolve => {
+        const channel = new MessageChannel();
+        channel.port1.onmessage = event => {
+            if (onMessage) onMessage(event.data);
+            if (event.data.type === 'done') resolve(event.data);
+        };
+        registration.active.postMessage(message, [channel.port2]);
+    }));
+}
+
+// Скачивание треков для оффлайн-прослушивания
+async function downloadTracksOffline(tracks, name) {
+    if (!('serviceWorker' in navigator)) {
+        showToast('Оффлайн-режим не поддерживается браузером', 'warning');
+        return;
+    }
+
+    if (tracks.length === 0) {
+        showToast('Нет треков для скачивания', 'warning');
+        return;
+    }
+
+    showToast(`Скачивание: ${name} (${tracks.length} треков)`, 'info');
+
+    const result = await postToServiceWorker({
+        type: 'cache-tracks',
+        trackIds: tracks.map(t => t.id),
+        query: audioQueryString(),
+        pin: true
+    });
+
+    if (result.failed > 0) {
+        showToast(`Скачано ${result.done} из ${result.total} треков`, 'warning');
+    } else {
+        showToast(`${name} доступен оффлайн`, 'success');
+    }
+}
+
+// Скачать альбом для оффлайн-прослушивания
+async function downloadAlbumOffline(albumId) {
+    try {
+        const response = await fetch(`/api/album/${albumId}/tracks`);
+        const album = await response.json();
+        await downloadTracksOffline(album.tracks, album.name);
+    } catch (error) {
+        console.error('Ошибка скачивания альбома:', error);
+        showToast('Ошибка скачивания альбома', 'error');
+    }
+}
+
+// Скачать плейлист для оффлайн-прослушивания
+async function downloadPlaylistOffline(playlistId) {
+    try {
+        const response = await fetch(`/api/playlist/${playlistId}/tracks`);
+        const playlist = await response.json();
+        await downloadTracksOffline(playlist.tracks, playlist.name);
+    } catch (error) {
+        console.error('Ошибка скачивания плейлиста:', error);
+        showToast('Ошибка скачивания плейлиста', 'error');
+    }
+}
+
+// Удаленные треки убираем из оффлайн-кеша (аудио, пики, обложки)
+function forgetTracksOffline(trackIds) {
+    if (!('serviceWorker' in navigator) || !navigator.serviceWorker.controller || trackIds.length === 0) return;
+    postToServiceWorker({type: 'delete-tracks', trackIds}).catch(error => {
+        console.error('Ошибка очистки оффлайн-кеша:', error);
+    });
+}
+
+// Адрес аудио с учетом качества и поддерживаемого браузером кодека
+function trackAudioUrl(trackId) {
+    return `/api/track/${trackId}/audio?${audioQueryString()}`;
+}
+
+function audioQueryString() {
+    const probe = audioPlayer || document.createElement('audio');
+    const codec = probe.canPlayType('audio/ogg; codecs="opus"') ? 'opus' : 'aac';
+    return `quality=${audioQuality}&codec=${codec}`;
+}
+
+// Смена качества аудио
+function setAudioQuality(event) {
+    audioQuality = event.target.value;
+    localStorage.setItem('audioQuality', audioQuality);
 }
 
 // Загрузка всех треков
@@ -51,6 +191,7 @@ async function loadAllTracks() {
         if (Array.isArray(tracks)) {
             currentPlaylist = tracks;
             originalPlaylist = [...tracks];
+            albumGain = null;
         }
     } catch (error) {
         console.error('Ошибка загрузки треков:', error);
@@ -92,13 +233,20 @@ async function playTrack(trackId) {
     updateTrackInfo();
     updatePlayButton(false);
     
+    // Форма волны грузится параллельно со звуком
+    loadWaveform(trackId);
+    
+    // Выравниваем громкость
+    applyGain(track);
+    
     // Загружаем и воспроизводим
     try {
-        audioPlayer.src = `/api/track/${trackId}/audio`;
+        audioPlayer.src = trackAudioUrl(trackId);
         await audioPlayer.play();
         isPlaying = true;
         updatePlayButton(true);
         highlightCurrentTrack();
+        reportPlay(trackId);
         showToast(`Воспроизводится: ${track.artist} - ${track.title}`, 'success');
     } catch (error) {
         console.error('Ошибка воспроизведения:', error);
@@ -221,6 +369,7 @@ async function playAlbum(albumId) {
             currentPlaylist = album.tracks;
             originalPlaylist = [...album.tracks];
             isShuffled = false;
+            albumGain = album.gain ?? null;
             
             // Сбрасываем состояние перемешивания
             const shuffleBtn = document.querySelector('#shuffle-icon').parentElement;
@@ -248,6 +397,7 @@ async function playPlaylist(playlistId) {
             currentPlaylist = playlist.tracks;
             originalPlaylist = [...playlist.tracks];
             isShuffled = false;
+            albumGain = null;
             
             // Сбрасываем состояние перемешивания
             const shuffleBtn = document.querySelector('#shuffle-icon').parentElement;
@@ -267,7 +417,46 @@ async function playPlaylist(playlistId) {
 // Установка громкости
 function setVolume(event) {
     if (audioPlayer) {
-        audioPlayer.volume = event.target.value / 100;
+        // Без Web Audio нормализация возможна только за счет ослабления
+        const volume = event.target.value / 100;
+        audioPlayer.volume = gainNode ? volume : Math.min(volume * currentGainFactor, 1);
+    }
+}
+
+// Нормализация громкости: gain альбома при воспроизведении альбома, иначе gain трека
+function applyGain(track) {
+    const gainDb = albumGain !== null ? albumGain : track.gain;
+    currentGainFactor = (gainDb !== null && gainDb !== undefined) ? Math.pow(10, gainDb / 20) : 1;
+    
+    if (ensureGainNode()) {
+        gainNode.gain.value = currentGainFactor;
+        if (audioContext.state === 'suspended') {
+            audioContext.resume();
+        }
+    }
+    
+    const volumeSlider = document.getElementById('volume-slider');
+    if (volumeSlider) {
+        setVolume({target: volumeSlider});
+    }
+}
+
+function ensureGainNode() {
+    if (gainNode) return true;
+    
+    const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+    if (!AudioContextClass) return false;
+    
+    try {
+        audioContext = new AudioContextClass();
+        const source = audioContext.createMediaElementSource(audioPlayer);
+        gainNode = audioContext.createGain();
+        source.connect(gainNode).connect(audioContext.destination);
+        return true;
+    } catch (error) {
+        console.error('Web Audio недоступен:', error);
+        gainNode = null;
+        return false;
     }
 }
 
@@ -312,6 +501,7 @@ async function deleteTrack(trackId) {
                 updateTrackInfo();
             }
             
+            forgetTracksOffline([trackId]);
             showToast('Трек удален', 'success');
             loadUserStats();
         } else {
@@ -323,6 +513,62 @@ async function deleteTrack(trackId) {
     }
 }
 
+// Выбор всех треков в таблице
+function toggleAllTrackCheckboxes(checked) {
+    document.querySelectorAll('.track-checkbox').forEach(checkbox => {
+        checkbox.checked = checked;
+    });
+}
+
+// Удаление выбранных треков одним запросом
+async function deleteSelectedTracks() {
+    const trackIds = Array.from(document.querySelectorAll('.track-checkbox:checked'))
+        .map(checkbox => parseInt(checkbox.value));
+    if (trackIds.length === 0) {
+        showToast('Выберите треки для удаления', 'info');
+        return;
+    }
+    if (!confirm(`Вы уверены, что хотите удалить выбранные треки (${trackIds.length})?`)) return;
+    
+    try {
+        const response = await fetch(`/api/user/${telegramId}/tracks`, {
+            method: 'DELETE',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ track_ids: trackIds })
+        });
+        
+        if (response.ok) {
+            const result = await response.json();
+            trackIds.forEach(trackId => {
+                const trackRow = document.querySelector(`tr[data-track-id="${trackId}"]`);
+                if (trackRow) {
+                    trackRow.remove();
+                }
+            });
+            
+            currentPlaylist = currentPlaylist.filter(t => !trackIds.includes(t.id));
+            originalPlaylist = originalPlaylist.filter(t => !trackIds.includes(t.id));
+            
+            if (currentTrack && trackIds.includes(currentTrack.id)) {
+                audioPlayer.pause();
+                currentTrack = null;
+                isPlaying = false;
+                updatePlayButton(false);
+                updateTrackInfo();
+            }
+            
+            forgetTracksOffline(trackIds);
+            showToast(`Удалено треков: ${result.deleted}`, 'success');
+            loadUserStats();
+        } else {
+            throw new Error('Ошибка удаления');
+        }
+    } catch (error) {
+        console.error('Ошибка удаления треков:', error);
+        showToast('Ошибка удаления треков', 'error');
+    }
+}
+
 // Удаление альбома
 async function deleteAlbum(albumId) {
     if (!confirm('Вы уверены, что хотите удалить этот альбом? Все треки в нем будут удалены.')) return;
@@ -339,6 +585,8 @@ async function deleteAlbum(albumId) {
                 albumCard.remove();
             }
             
+            const result = await response.json();
+            forgetTracksOffline(result.track_ids || []);
             showToast('Альбом удален', 'success');
             loadUserStats();
             loadAllTracks(); // Перезагружаем треки
@@ -353,7 +601,7 @@ async function deleteAlbum(albumId) {
 
 // Удаление плейлиста
 async function deletePlaylist(playlistId) {
-    if (!confirm('Вы уверены, что хотите удалить этот плейлист? Все треки в нем будут удалены.')) return;
+    if (!confirm('Вы уверены, что хотите удалить этот плейлист? Треки останутся в библиотеке.')) return;
     
     try {
         const response = await fetch(`/api/playlist/${playlistId}`, {
@@ -379,6 +627,230 @@ async function deletePlaylist(playlistId) {
     }
 }
 
+// Добавление уже загруженного трека в плейлист (файл не копируется)
+async function addTrackToPlaylist(trackId, playlistId) {
+    try {
+        const response = await fetch(`/api/playlist/${playlistId}/tracks`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ track_id: trackId })
+        });
+        
+        if (response.status === 409) {
+            showToast('Трек уже есть в этом плейлисте', 'info');
+        } else if (response.ok) {
+            showToast('Трек добавлен в плейлист', 'success');
+        } else {
+            throw new Error('Ошибка добавления');
+        }
+    } catch (error) {
+        console.error('Ошибка добавления в плейлист:', error);
+        showToast('Ошибка добавления в плейлист', 'error');
+    }
+}
+
+// Зона drag-and-drop загрузки
+function initializeUploadZone() {
+    const zone = document.getElementById('upload-zone');
+    const input = document.getElementById('upload-input');
+    if (!zone || !input) return;
+    
+    zone.addEventListener('dragover', event => {
+        event.preventDefault();
+        zone.classList.add('dragover');
+    });
+    zone.addEventListener('dragleave', () => zone.classList.remove('dragover'));
+    zone.addEventListener('drop', event => {
+        event.preventDefault();
+        zone.classList.remove('dragover');
+        enqueueUploads(event.dataTransfer.files);
+    });
+    input.addEventListener('change', () => {
+        enqueueUploads(input.files);
+        input.value = '';
+    });
+}
+
+function enqueueUploads(files) {
+    const target = document.getElementById('upload-target')?.value || '';
+    Array.from(files).forEach(file => {
+        uploadQueue.push({ file, target, row: createUploadRow(file) });
+    });
+    pumpUploads();
+}
+
+// Одновременно грузится не больше UPLOAD_PARALLEL_FILES файлов
+function pumpUploads() {
+    while (activeUploads < UPLOAD_PARALLEL_FILES && uploadQueue.length) {
+        const item = uploadQueue.shift();
+        activeUploads++;
+        uploadFile(item).finally(() => {
+            activeUploads--;
+            pumpUploads();
+        });
+    }
+}
+
+// id незавершенной загрузки хранится по имени, размеру и дате файла -
+// повторный выбор того же файла (даже после перезагрузки страницы) продолжит ее
+function uploadStorageKey(file) {
+    return `upload:${telegramId}:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function getUploadStatus(uploadId) {
+    if (!uploadId) return null;
+    const response = await fetch(`/api/uploads/${uploadId}`);
+    return response.ok ? await response.json() : null;
+}
+
+async function createUpload(file, target) {
+    const [kind, id] = target.split(':');
+    const response = await fetch(`/api/user/${telegramId}/uploads`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            filename: file.name,
+            size: file.size,
+            album_id: kind === 'album' ? parseInt(id) : null,
+            playlist_id: kind === 'playlist' ? parseInt(id) : null
+        })
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        throw Object.assign(new Error(data.error || 'Ошибка загрузки'), { fatal: true });
+    }
+    return data;
+}
+
+// Кусок с контрольной суммой (crypto.subtle есть только на https и localhost)
+async function sendUploadChunk(uploadId, offset, chunk) {
+    const headers = { 'Upload-Offset': String(offset), 'Content-Type': 'application/offset+octet-stream' };
+    let body = chunk;
+    if (window.crypto && crypto.subtle) {
+        body = await chunk.arrayBuffer();
+        const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', body));
+        headers['Upload-Checksum'] = 'sha256 ' + btoa(String.fromCharCode(...digest));
+    }
+    const response = await fetch(`/api/uploads/${uploadId}`, { method: 'PATCH', headers, body });
+    return { response, data: await response.json() };
+}
+
+async function uploadFile({ file, target, row }) {
+    const key = uploadStorageKey(file);
+    try {
+        let upload = await getUploadStatus(localStorage.getItem(key));
+        if (!upload) {
+            upload = await createUpload(file, target);
+            localStorage.setItem(key, upload.id);
+        }
+        
+        let offset = upload.offset;
+        let retries = 0;
+        let track = null;
+        updateUploadRow(row, offset / file.size);
+        
+        while (!track) {
+            try {
+                const chunk = file.slice(offset, offset + upload.chunk_size);
+                const { response, data } = await sendUploadChunk(upload.id, offset, chunk);
+                if (data.reason === 'offset_mismatch' && data.offset !== undefined) {
+                    // Сервер принял другое число байт - продолжаем с его смещения
+                    offset = data.offset;
+                    continue;
+                }
+                if (!response.ok) {
+                    // Занятая загрузка и испорченный в пути кусок - повторяем, остальные 4xx - нет
+                    throw Object.assign(new Error(data.error || 'Ошибка загрузки'), {
+                        fatal: response.status >= 400 && response.status < 500 && !UPLOAD_RETRY_REASONS.includes(data.reason)
+                    });
+                }
+                offset = data.offset;
+                track = data.track;
+                retries = 0;
+                updateUploadRow(row, offset / file.size);
+            } catch (error) {
+                if (error.fatal || ++retries > UPLOAD_MAX_RETRIES) throw error;
+                // Обрыв связи: ждем и узнаем у сервера, сколько байт дошло
+                updateUploadRow(row, offset / file.size, 'Нет связи, повтор...');
+                await new Promise(resolve => setTimeout(resolve, Math.min(30000, 1000 * 2 ** (retries - 1))));
+                const status = await getUploadStatus(upload.id).catch(() => null);
+                if (status) {
+                    offset = status.offset;
+                } else if (navigator.onLine) {
+                    throw Object.assign(new Error('Загрузка не найдена на сервере'), { fatal: true });
+                }
+            }
+        }
+        
+        localStorage.removeItem(key);
+        updateUploadRow(row, 1, 'Готово', 'success');
+        appendTrackRow(track);
+        currentPlaylist.push(track);
+        originalPlaylist.push(track);
+        loadUserStats();
+    } catch (error) {
+        console.error('Ошибка загрузки файла:', error);
+        if (error.fatal) localStorage.removeItem(key);
+        updateUploadRow(row, null, error.message || 'Ошибка загрузки', 'danger');
+        showToast(`Не удалось загрузить ${file.name}`, 'error');
+    }
+}
+
+function createUploadRow(file) {
+    const row = document.createElement('div');
+    row.className = 'upload-item small mb-2';
+    row.innerHTML = `
+        <div class="d-flex justify-content-between">
+            <span class="upload-name text-truncate"></span>
+            <span class="upload-status text-muted">В очереди</span>
+        </div>
+        <div class="progress"><div class="progress-bar" style="width: 0%"></div></div>
+    `;
+    row.querySelector('.upload-name').textContent = file.name;
+    document.getElementById('upload-list').appendChild(row);
+    return row;
+}
+
+function updateUploadRow(row, progress, status = null, type = null) {
+    const bar = row.querySelector('.progress-bar');
+    if (progress !== null) {
+        bar.style.width = `${Math.floor(progress * 100)}%`;
+    }
+    if (type) {
+        bar.classList.add(`bg-${type}`);
+    }
+    row.querySelector('.upload-status').textContent = status || `${Math.floor((progress || 0) * 100)}%`;
+}
+
+// Строка нового трека в таблице "Все треки"
+function appendTrackRow(track) {
+    const row = document.createElement('tr');
+    row.dataset.trackId = track.id;
+    row.innerHTML = `
+        <td><input type="checkbox" class="form-check-input track-checkbox" value="${track.id}"></td>
+        <td>
+            <button class="btn btn-sm btn-outline-success" onclick="playTrack(${track.id})">
+                <i class="fas fa-play"></i>
+            </button>
+        </td>
+        <td class="fw-medium"></td>
+        <td class="text-muted"></td>
+        <td class="text-muted small"></td>
+        <td class="text-muted">${track.duration ? formatTime(track.duration) : '-'}</td>
+        <td class="text-nowrap">
+            <button class="btn btn-sm btn-outline-danger" onclick="deleteTrack(${track.id})">
+                <i class="fas fa-trash"></i>
+            </button>
+        </td>
+    `;
+    const cells = row.querySelectorAll('td');
+    cells[2].textContent = track.title;
+    cells[3].textContent = track.artist;
+    const places = (track.album ? [`📀 ${track.album}`] : []).concat(track.playlists.map(name => `📝 ${name}`));
+    cells[4].textContent = places.join(' ') || '-';
+    document.getElementById('tracks-table-body').appendChild(row);
+}
+
 // Переключение секций
 function showSection(sectionName) {
     // Скрываем все секции
@@ -398,6 +870,118 @@ function showSection(sectionName) {
     });
     
     event.target.classList.add('active');
+    
+    if (sectionName === 'history') {
+        loadListeningHistory();
+    }
+}
+
+// Событие прослушивания для истории (ошибки не мешают воспроизведению)
+function reportPlay(trackId) {
+    fetch(`/api/track/${trackId}/play`, { method: 'POST', keepalive: true })
+        .catch(error => console.error('Ошибка отправки события прослушивания:', error));
+}
+
+// История прослушиваний: самые популярные и недавние треки
+async function loadListeningHistory() {
+    try {
+        const [topResponse, recentResponse] = await Promise.all([
+            fetch(`/api/user/${telegramId}/top-tracks?days=30`),
+            fetch(`/api/user/${telegramId}/recent-tracks`)
+        ]);
+        historyLists.top = await topResponse.json();
+        historyLists.recent = await recentResponse.json();
+        
+        renderHistoryList('top-tracks-list', 'top', track => `${track.plays} раз`);
+        renderHistoryList('recent-tracks-list', 'recent', track => new Date(track.last_played_at + 'Z').toLocaleString());
+    } catch (error) {
+        console.error('Ошибка загрузки истории:', error);
+        showToast('Ошибка загрузки истории', 'error');
+    }
+}
+
+function renderHistoryList(elementId, kind, describe) {
+    const list = document.getElementById(elementId);
+    list.innerHTML = '';
+    
+    if (historyLists[kind].length === 0) {
+        list.innerHTML = '<li class="list-group-item text-muted">Пока пусто</li>';
+        return;
+    }
+    
+    historyLists[kind].forEach(track => {
+        const item = document.createElement('li');
+        item.className = 'list-group-item list-group-item-action d-flex justify-content-between';
+        item.style.cursor = 'pointer';
+        item.textContent = `${track.artist} - ${track.title}`;
+        
+        const details = document.createElement('span');
+        details.className = 'text-muted small';
+        details.textContent = describe(track);
+        item.appendChild(details);
+        
+        item.onclick = () => playHistoryTrack(kind, track.id);
+        list.appendChild(item);
+    });
+}
+
+function playHistoryTrack(kind, trackId) {
+    currentPlaylist = historyLists[kind];
+    originalPlaylist = [...historyLists[kind]];
+    albumGain = null;
+    playTrack(trackId);
+}
+
+// Форма волны
+async function loadWaveform(trackId) {
+    currentPeaks = null;
+    const container = document.getElementById('progress-bar').parentElement;
+    container.classList.remove('has-waveform');
+    
+    try {
+        const response = await fetch(`/api/track/${trackId}/peaks`);
+        if (!response.ok) return;  // Пики еще не посчитаны - остается обычная полоса
+        
+        const peaks = new Int8Array(await response.arrayBuffer());
+        if (!currentTrack || currentTrack.id !== trackId) return;
+        
+        currentPeaks = peaks;
+        container.classList.add('has-waveform');
+        drawWaveform(audioPlayer.duration ? (audioPlayer.currentTime / audioPlayer.duration) * 100 : 0);
+    } catch (error) {
+        console.error('Ошибка загрузки формы волны:', error);
+    }
+}
+
+function drawWaveform(progress) {
+    const canvas = document.getElementById('waveform-canvas');
+    if (!canvas || !currentPeaks) return;
+    
+    // Размер буфера под реальный размер элемента и плотность пикселей
+    const ratio = window.devicePixelRatio || 1;
+    const width = canvas.clientWidth;
+    const height = canvas.clientHeight;
+    if (canvas.width !== width * ratio || canvas.height !== height * ratio) {
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+    }
+    
+    const ctx = canvas.getContext('2d');
+    ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+    ctx.clearRect(0, 0, width, height);
+    
+    const buckets = currentPeaks.length / 2;
+    const middle = height / 2;
+    const playedX = width * progress / 100;
+    
+    for (let x = 0; x < width; x++) {
+        const i = Math.floor(x * buckets / width);
+        const top = middle - (currentPeaks[2 * i + 1] / 128) * middle;
+        const bottom = middle - (currentPeaks[2 * i] / 128) * middle;
+        
+        ctx.fillStyle = x < playedX ? 'rgba(255, 255, 255, 0.95)' : 'rgba(255, 255, 255, 0.35)';
+        ctx.fillRect(x, top, 1, Math.max(bottom - top, 1));
+    }
 }
 
 // События аудио плеера
@@ -424,6 +1008,7 @@ function onTimeUpdate() {
         if (progressBar) {
             progressBar.style.width = `${progress}%`;
         }
+        drawWaveform(progress);
         
         // Обновляем время
         const currentTimeEl = document.getElementById('current-time');
@@ -455,6 +1040,7 @@ function onAudioError(event) {
 function updateTrackInfo() {
     const titleEl = document.getElementById('current-track-title');
     const artistEl = document.getElementById('current-track-artist');
+    const coverEl = document.getElementById('current-track-cover');
     
     if (currentTrack) {
         if (titleEl) titleEl.textContent = currentTrack.title;
@@ -463,6 +1049,17 @@ function updateTrackInfo() {
         if (titleEl) titleEl.textContent = 'Выберите трек';
         if (artistEl) artistEl.textContent = 'для воспроизведения';
     }
+    
+    if (coverEl) {
+        if (currentTrack && currentTrack.has_cover) {
+            // 128 px - запас для экранов с высокой плотностью пикселей
+            coverEl.src = `/api/track/${currentTrack.id}/cover/128`;
+            coverEl.classList.remove('d-none');
+        } else {
+            coverEl.removeAttribute('src');
+            coverEl.classList.add('d-none');
+        }
+    }
 }
 
 function updatePlayButton(playing) {
@@ -0,0 +1,390 @@
+// Service worker: оффлайн-воспроизведение и кеш аудио
+const SHELL_CACHE = 'musicbot-shell-v1';
+const AUDIO_CACHE = 'musicbot-audio-v1';
+// Пики и обложки: файлы неизменны, но их много - отдельный ограниченный кеш
+const MEDIA_CACHE = 'musicbot-media-v1';
+// Ответы API и страницы вне оболочки (у каждого query string своя запись) - тоже ограниченный кеш
+const DATA_CACHE = 'musicbot-data-v1';
+const CACHE_NAMES = [SHELL_CACHE, AUDIO_CACHE, MEDIA_CACHE, DATA_CACHE];
+
+// Служебные записи с LRU-индексами кешей
+const AUDIO_INDEX_URL = '/__audio-index__';
+const MEDIA_INDEX_URL = '/__media-index__';
+const DATA_INDEX_URL = '/__data-index__';
+const CACHE_INDEX_URLS = {[AUDIO_CACHE]: AUDIO_INDEX_URL, [MEDIA_CACHE]: MEDIA_INDEX_URL, [DATA_CACHE]: DATA_INDEX_URL};
+
+// Ограничения незакрепленных записей: аудио - по суммарному размеру (один трек весит
+// десятки МБ), остальное - по числу записей
+const AUDIO_CACHE_MAX_BYTES = 500 * 1024 * 1024;
+const MEDIA_CACHE_MAX_ENTRIES = 300;
+const DATA_CACHE_MAX_ENTRIES = 100;
+const CACHE_LIMITS = {
+    [AUDIO_CACHE]: {maxBytes: AUDIO_CACHE_MAX_BYTES},
+    [MEDIA_CACHE]: {maxEntries: MEDIA_CACHE_MAX_ENTRIES},
+    [DATA_CACHE]: {maxEntries: DATA_CACHE_MAX_ENTRIES},
+};
+
+const AUDIO_PATH_RE = /^\/api\/track\/\d+\/audio$/;
+const MEDIA_PATH_RE = /^\/api\/track\/\d+\/(peaks|cover\/\d+)$/;
+
+self.addEventListener('install', event => {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+    // Удаляем кеши старых версий
+    event.waitUntil(
+        caches.keys().then(keys => Promise.all(
+            keys.filter(key => !CACHE_NAMES.includes(key))
+                .map(key => caches.delete(key))
+        )).then(removeDynamicFromShell).then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+
+    // Архивы и экспорт плейлистов - мимо кеша (архив может весить гигабайты),
+    // состояние загрузок - тоже: устаревшее смещение из кеша только мешает
+    if (url.pathname.includes('/export.') || url.pathname.startsWith('/api/uploads/')) return;
+
+    if (url.origin === self.location.origin && AUDIO_PATH_RE.test(url.pathname)) {
+        event.respondWith(handleAudioRequest(event, url.pathname + url.search));
+    } else if (url.origin === self.location.origin && MEDIA_PATH_RE.test(url.pathname)) {
+        event.respondWith(handleMediaRequest(event, url.pathname));
+    } else if (request.mode === 'navigate' || url.pathname.startsWith('/api/')) {
+        // Страницы и JSON: сначала сеть, без сети - последняя копия из кеша
+        event.respondWith(networkFirst(event, url.pathname + url.search));
+    } else if (url.origin !== self.location.origin || url.pathname.startsWith('/static/')) {
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+self.addEventListener('message', event => {
+    const message = event.data || {};
+    const port = event.ports[0];
+
+    if (message.type === 'precache') {
+        event.waitUntil(precacheShell(message.urls || []));
+    } else if (message.type === 'cache-tracks') {
+        event.waitUntil(cacheTracks(message.trackIds || [], message.query || '', !!message.pin, port));
+    } else if (message.type === 'unpin-tracks') {
+        event.waitUntil(unpinTracks(message.trackIds || []).then(() => reply(port, {type: 'done'})));
+    } else if (message.type === 'delete-tracks') {
+        // Треки удалены на сервере - их аудио (в том числе закрепленное), пики и обложки не нужны
+        event.waitUntil(deleteTracks(message.trackIds || []).then(() => reply(port, {type: 'done'})));
+    }
+});
+
+// Оболочка приложения
+async function precacheShell(urls) {
+    const cache = await caches.open(SHELL_CACHE);
+    await Promise.all(urls.map(async url => {
+        if (await cache.match(url)) return;
+        const sameOrigin = new URL(url, self.location.origin).origin === self.location.origin;
+        try {
+            const response = await fetch(url, {mode: sameOrigin ? 'same-origin' : 'no-cors'});
+            if (response.ok || response.type === 'opaque') {
+                await cache.put(url, response);
+            }
+        } catch (error) {
+            // Оффлайн - закешируем при следующем визите
+        }
+    }));
+
+    // Старые сборки статики с другими хешами больше не нужны
+    const current = new Set(urls.map(url => new URL(url, self.location.origin).href));
+    for (const request of await cache.keys()) {
+        if (new URL(request.url).pathname.startsWith('/static/dist/') && !current.has(request.url)) {
+            await cache.delete(request);
+        }
+    }
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(request);
+    if (cached) return cached;
+
+    const response = await fetch(request);
+    if (response.ok || response.type === 'opaque') {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+// Раньше пики, обложки и ответы API попадали в кеш оболочки без ограничения
+async function removeDynamicFromShell() {
+    const cache = await caches.open(SHELL_CACHE);
+    for (const request of await cache.keys()) {
+        const pathname = new URL(request.url).pathname;
+        if (MEDIA_PATH_RE.test(pathname) || pathname.startsWith('/api/')) {
+            await cache.delete(request);
+        }
+    }
+}
+
+async function networkFirst(event, key) {
+    // В кеше оболочки обновляем только то, что туда положил precacheShell (страницу дашборда),
+    // остальное - в ограниченный DATA_CACHE
+    const shell = await caches.open(SHELL_CACHE);
+    const inShell = event.request.mode === 'navigate' && !!(await shell.match(key));
+    const cache = inShell ? shell : await caches.open(DATA_CACHE);
+    try {
+        const response = await fetch(event.request);
+        if (response.ok) {
+            const stored = cache.put(key, response.clone());
+            event.waitUntil(inShell ? stored : stored.then(() => touchEntry(DATA_CACHE, key)));
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(key);
+        if (!cached) throw error;
+        if (!inShell) event.waitUntil(touchEntry(DATA_CACHE, key));
+        return cached;
+    }
+}
+
+// Аудио
+async function handleAudioRequest(event, path) {
+    const cache = await caches.open(AUDIO_CACHE);
+    const range = parseRange(event.request.headers.get('Range'));
+    const cached = await cache.match(path);
+
+    if (cached) {
+        event.waitUntil(touchAudio(path));
+        return rangeResponse(cached, range);
+    }
+
+    // Перемотка до того, как трек скачан целиком, - обычный запрос в сеть
+    if (range && (range.start > 0 || range.end !== null)) {
+        return fetch(event.request);
+    }
+
+    let response;
+    try {
+        response = await fetch(path, {credentials: 'same-origin'});
+    } catch (error) {
+        return new Response(null, {status: 503, statusText: 'Offline'});
+    }
+    if (response.status !== 200) return response;
+
+    // Одна загрузка: поток уходит в плеер и одновременно в кеш
+    event.waitUntil(
+        cache.put(path, response.clone()).then(() => touchAudio(path))
+    );
+
+    if (!range) return response;
+
+    const size = response.headers.get('Content-Length');
+    if (!size) return response;
+
+    const headers = new Headers(response.headers);
+    headers.set('Content-Range', `bytes 0-${size - 1}/${size}`);
+    return new Response(response.body, {status: 206, statusText: 'Partial Content', headers});
+}
+
+function parseRange(header) {
+    const match = /^bytes=(\d*)-(\d*)$/.exec(header || '');
+    if (!match) return null;
+    return {
+        start: match[1] === '' ? null : Number(match[1]),
+        end: match[2] === '' ? null : Number(match[2])
+    };
+}
+
+async function rangeResponse(cached, range) {
+    if (!range) return cached;
+
+    const blob = await cached.blob();
+    const size = blob.size;
+    let start, end;
+
+    if (range.start === null) {
+        // bytes=-N: последние N байт
+        start = Math.max(size - range.end, 0);
+        end = size - 1;
+    } else {
+        start = range.start;
+        end = range.end === null ? size - 1 : Math.min(range.end, size - 1);
+    }
+
+    if (start >= size || start > end) {
+        return new Response(null, {
+            status: 416,
+            statusText: 'Range Not Satisfiable',
+            headers: {'Content-Range': `bytes */${size}`}
+        });
+    }
+
+    const headers = new Headers(cached.headers);
+    headers.set('Content-Range', `bytes ${start}-${end}/${size}`);
+    headers.set('Content-Length', String(end - start + 1));
+    return new Response(blob.slice(start, end + 1), {status: 206, statusText: 'Partial Content', headers});
+}
+
+// Пики и обложки
+async function handleMediaRequest(event, path) {
+    const cache = await caches.open(MEDIA_CACHE);
+    const cached = await cache.match(path);
+    if (cached) {
+        event.waitUntil(touchEntry(MEDIA_CACHE, path));
+        return cached;
+    }
+
+    const response = await fetch(event.request);
+    if (response.ok) {
+        event.waitUntil(
+            cache.put(path, response.clone()).then(() => touchEntry(MEDIA_CACHE, path))
+        );
+    }
+    return response;
+}
+
+// LRU-индекс: {path: {lastUsed, pinned}}. Изменения каждого кеша идут строго по очереди
+const indexQueues = {};
+
+function updateCacheIndex(cacheName, mutate) {
+    const queue = (indexQueues[cacheName] || Promise.resolve()).then(async () => {
+        const cache = await caches.open(cacheName);
+        const stored = await cache.match(CACHE_INDEX_URLS[cacheName]);
+        const index = stored ? await stored.json() : {};
+
+        const result = await mutate(index, cache);
+        await evictEntries(cache, index, CACHE_LIMITS[cacheName]);
+        await cache.put(CACHE_INDEX_URLS[cacheName], new Response(JSON.stringify(index), {
+            headers: {'Content-Type': 'application/json'}
+        }));
+        return result;
+    }).catch(error => console.error('Ошибка индекса кеша:', cacheName, error));
+    indexQueues[cacheName] = queue;
+    return queue;
+}
+
+function updateAudioIndex(mutate) {
+    return updateCacheIndex(AUDIO_CACHE, mutate);
+}
+
+function touchEntry(cacheName, path, pin = false) {
+    return updateCacheIndex(cacheName, async (index, cache) => {
+        const entry = index[path] || {pinned: false};
+        entry.lastUsed = Date.now();
+        entry.pinned = entry.pinned || pin;
+        if (entry.size === undefined && CACHE_LIMITS[cacheName].maxBytes) {
+            entry.size = await responseSize(cache, path);
+        }
+        index[path] = entry;
+    });
+}
+
+async function responseSize(cache, path) {
+    const cached = await cache.match(path);
+    if (!cached) return 0;
+    const length = Number(cached.headers.get('Content-Length'));
+    return length > 0 ? length : (await cached.blob()).size;
+}
+
+function touchAudio(path, pin = false) {
+    return touchEntry(AUDIO_CACHE, path, pin);
+}
+
+async function evictEntries(cache, index, {maxEntries = Infinity, maxBytes = Infinity}) {
+    if (maxBytes !== Infinity) {
+        // Записи из индекса старого формата (без размера)
+        for (const [path, entry] of Object.entries(index)) {
+            if (entry.size === undefined) entry.size = await responseSize(cache, path);
+        }
+    }
+
+    // Закрепленные записи не вытесняются, но занимают место
+    let bytes = Object.values(index).reduce((total, entry) => total + (entry.size || 0), 0);
+    const unpinned = Object.entries(index)
+        .filter(([, entry]) => !entry.pinned)
+        .sort((a, b) => a[1].lastUsed - b[1].lastUsed);
+    let count = unpinned.length;
+
+    for (const [path, entry] of unpinned) {
+        if (count <= maxEntries && bytes <= maxBytes) break;
+        await cache.delete(path);
+        delete index[path];
+        count--;
+        bytes -= entry.size || 0;
+    }
+}
+
+// Ключ кеша включает query string: разные качества - разные записи
+function audioKey(trackId, query) {
+    return query ? `/api/track/${trackId}/audio?${query}` : `/api/track/${trackId}/audio`;
+}
+
+async function cacheTracks(trackIds, query, pin, port) {
+    const cache = await caches.open(AUDIO_CACHE);
+    let done = 0;
+    let failed = 0;
+
+    for (const trackId of trackIds) {
+        const path = audioKey(trackId, query);
+        try {
+            if (!(await cache.match(path))) {
+                const response = await fetch(path, {credentials: 'same-origin'});
+                if (response.status !== 200) throw new Error(`HTTP ${response.status}`);
+                await cache.put(path, response);
+            }
+            await touchAudio(path, pin);
+            done++;
+        } catch (error) {
+            failed++;
+        }
+        reply(port, {type: 'progress', done, failed, total: trackIds.length});
+    }
+
+    reply(port, {type: 'done', done, failed, total: trackIds.length});
+}
+
+function isTrackAudio(path, trackIds) {
+    return trackIds.some(trackId => {
+        const prefix = audioKey(trackId, '');
+        return path === prefix || path.startsWith(prefix + '?');
+    });
+}
+
+function unpinTracks(trackIds) {
+    return updateAudioIndex(index => {
+        for (const [path, entry] of Object.entries(index)) {
+            if (isTrackAudio(path, trackIds)) {
+                entry.pinned = false;
+            }
+        }
+    });
+}
+
+function deleteTracks(trackIds) {
+    const removeAudio = updateAudioIndex(async (index, cache) => {
+        // Все качества трека, включая записи, которых почему-то нет в индексе
+        for (const request of await cache.keys()) {
+            const url = new URL(request.url);
+            const path = url.pathname + url.search;
+            if (isTrackAudio(path, trackIds)) {
+                await cache.delete(request);
+                delete index[path];
+            }
+        }
+    });
+    const removeMedia = updateCacheIndex(MEDIA_CACHE, async (index, cache) => {
+        const prefixes = trackIds.map(trackId => `/api/track/${trackId}/`);
+        for (const path of Object.keys(index)) {
+            if (prefixes.some(prefix => path.startsWith(prefix))) {
+                await cache.delete(path);
+                delete index[path];
+            }
+        }
+    });
+    return Promise.all([removeAudio, removeMedia]);
+}
+
+function reply(port, message) {
+    if (port) port.postMessage(message);
+}
@@ -4,16 +4,16 @@ import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Audio
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 from telegram.constants import ParseMode
-from mutagen import File as MutagenFile
 from database import DatabaseManager
-from models import create_tables
+from fingerprint import find_duplicates
+from ingest import read_metadata, analyze_audio, create_track
+from play_events import record_play
+from metrics import timed_handler
+from callbacks import encode_callback, decode_callback, callback_action_name, resolve_user_id, CallbackRequest
+from library_cache import LRUCache
 import config
+import startup
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Состояния для разговора
@@ -27,39 +27,69 @@ class MusicBot:
     def __init__(self):
         self.user_states = {}
         self.temp_audio_data = {}
+        # telegram_id -> id пользователя в БД (пользователи не удаляются, id не меняется)
+        self.user_ids = LRUCache(config.BOT_USER_CACHE_SIZE)
+        # (id пользователя, экран, id объекта) -> (версия библиотеки, текст, клавиатура, parse_mode)
+        self.keyboards = LRUCache(config.BOT_KEYBOARD_CACHE_SIZE)
+        
+        # Действие кнопки -> обработчик (query, request)
+        self.callback_routes = {
+            'view_albums': self.show_albums,
+            'view_playlists': self.show_playlists,
+            'choose_album': self.show_albums_for_selection,
+            'choose_playlist': self.show_playlists_for_selection,
+            'create_album': self.start_album_creation,
+            'create_playlist': self.start_playlist_creation,
+            'album': self.handle_album_action,
+            'playlist': self.handle_playlist_action,
+            'track': self.send_track,
+            'add_to_album': self.add_track_to_album,
+            'add_to_playlist': self.add_track_to_playlist,
+            'pick_playlist': self.show_playlists_for_existing_track,
+            'pladd': self.add_existing_track_to_playlist,
+            'plmove': self.move_track_up_in_playlist,
+            'plremove': self.remove_track_from_playlist,
+        }
     
+    @timed_handler('start')
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
-        db = DatabaseManager()
-        try:
-            user = db.get_or_create_user(
-                telegram_id=update.effective_user.id,
-                username=update.effective_user.username,
-                first_name=update.effective_user.first_name,
-                last_name=update.effective_user.last_name
-            )
-            
-            keyboard = [
-                [InlineKeyboardButton("🎵 Мои альбомы", callback_data="view_albums")],
-                [InlineKeyboardButton("📝 Мои плейлисты", callback_data="view_playlists")],
-                [InlineKeyboardButton("🌐 Веб-приложение", web_app={"url": f"http://{config.FLASK_HOST}:{config.FLASK_PORT}/web/{user.telegram_id}"})]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
-                f"Привет, {update.effective_user.first_name}! 👋\n\n"
-                "Добро пожаловать в бота-песенника! 🎵\n\n"
-                "Что умеет этот бот:\n"
-                "• Добавлять аудио файлы в твою библиотеку\n"
-                "• Создавать альбомы и плейлисты\n"
-                "• Прослушивать добавленную музыку\n"
-                "• Веб-интерфейс для удобного управления\n\n"
-                "Просто отправь мне аудио файл, чтобы начать! 🎧",
-                reply_markup=reply_markup
-            )
-        finally:
-            db.close()
+        telegram_user = update.effective_user
+        
+        # Известному пользователю БД не нужна
+        if self.user_ids.get(telegram_user.id) is None:
+            db = DatabaseManager()
+            try:
+                user = db.get_or_create_user(
+                    telegram_id=telegram_user.id,
+                    username=telegram_user.username,
+                    first_name=telegram_user.first_name,
+                    last_name=telegram_user.last_name
+                )
+                self.user_ids.set(telegram_user.id, user.id)
+            finally:
+                db.close()
+        
+        keyboard = [
+            [InlineKeyboardButton("🎵 Мои альбомы", callback_data=encode_callback('view_albums'))],
+            [InlineKeyboardButton("📝 Мои плейлисты", callback_data=encode_callback('view_playlists'))],
+            [InlineKeyboardButton("🌐 Веб-приложение", web_app={"url": f"http://{config.FLASK_HOST}:{config.FLASK_PORT}/web/{telegram_user.id}"})]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await update.message.reply_text(
+            f"Привет, {update.effective_user.first_name}! 👋\n\n"
+            "Добро пожаловать в бота-песенника! 🎵\n\n"
+            "Что умеет этот бот:\n"
+            "• Добавлять аудио файлы в твою библиотеку\n"
+            "• Создавать альбомы и плейлисты\n"
+            "• Прослушивать добавленную музыку\n"
+            "• Веб-интерфейс для удобного управления\n\n"
+            "Просто отправь мне аудио файл, чтобы начать! 🎧",
+            reply_markup=reply_markup
+        )
     
+    @timed_handler('handle_audio')
     async def handle_audio(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик аудио файлов"""
         audio: Audio = update.message.audio
@@ -76,52 +106,76 @@ class MusicBot:
         # Скачиваем файл
         await file.download_to_drive(file_path)
         
-        # Получаем метаданные
-        try:
-            audio_file = MutagenFile(file_path)
-            title = audio.title or (audio_file.get('TIT2', [None])[0] if audio_file else None) or "Неизвестный трек"
-            artist = audio.performer or (audio_file.get('TPE1', [None])[0] if audio_file else None) or "Неизвестный исполнитель"
-            duration = audio.duration or (audio_file.info.length if audio_file else None)
-        except:
-            title = audio.title or "Неизвестный трек"
-            artist = audio.performer or "Неизвестный исполнитель"
-            duration = audio.duration
+        # Получаем метаданные (данные Telegram важнее тегов файла)
+        metadata = read_metadata(file_path, audio.title, audio.performer, audio.duration)
+        title = metadata['title']
+        artist = metadata['artist']
+        
+        # Отпечаток и обложку считаем в пуле потоков, чтобы не блокировать бота
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(None, analyze_audio, file_path)
+        fingerprint = analysis['fingerprint']
         
         # Сохраняем временные данные
         self.temp_audio_data[user_id] = {
-            'title': title,
-            'artist': artist,
+            **metadata,
             'file_path': file_path,
             'file_id': audio.file_id,
-            'duration': int(duration) if duration else None
+            **analysis,
+            'duplicate_id': None
         }
         
         # Получаем альбомы и плейлисты пользователя
         db = DatabaseManager()
         try:
-            user = db.get_or_create_user(telegram_id=user_id)
-            albums = db.get_user_albums(user.id)
-            playlists = db.get_user_playlists(user.id)
+            user_db_id = resolve_user_id(self.user_ids, user_id, lambda: db)
+            albums = db.get_user_albums(user_db_id)
+            playlists = db.get_user_playlists(user_db_id)
             
             keyboard = []
             
             if albums:
-                keyboard.append([InlineKeyboardButton("📀 Выбрать альбом", callback_data="choose_album")])
+                keyboard.append([InlineKeyboardButton("📀 Выбрать альбом", callback_data=encode_callback('choose_album'))])
             
             if playlists:
-                keyboard.append([InlineKeyboardButton("📝 Выбрать плейлист", callback_data="choose_playlist")])
+                keyboard.append([InlineKeyboardButton("📝 Выбрать плейлист", callback_data=encode_callback('choose_playlist'))])
             
             keyboard.extend([
-                [InlineKeyboardButton("➕ Создать новый альбом", callback_data="create_album")],
-                [InlineKeyboardButton("➕ Создать новый плейлист", callback_data="create_playlist")]
+                [InlineKeyboardButton("➕ Создать новый альбом", callback_data=encode_callback('create_album'))],
+                [InlineKeyboardButton("➕ Создать новый плейлист", callback_data=encode_callback('create_playlist'))]
             ])
             
             reply_markup = InlineKeyboardMarkup(keyboard)
             
+            # Предупреждаем, если эта запись уже есть в библиотеке (в любой кодировке)
+            duplicate_warning = ""
+            duplicates = find_duplicates(db, user_db_id, fingerprint) if fingerprint else []
+            if duplicates:
+                duplicate = duplicates[0]
+                self.temp_audio_data[user_id]['duplicate_id'] = duplicate.id
+                if duplicate.album:
+                    location = f"в альбоме '{duplicate.album.name}'"
+                elif duplicate.playlist_items:
+                    location = f"в плейлисте '{duplicate.playlists[0].name}'"
+                else:
+                    location = "в библиотеке"
+                duplicate_warning = (
+                    f"⚠️ Похоже, этот трек уже есть {location}: "
+                    f"{duplicate.artist} - {duplicate.title}\n\n"
+                )
+                if playlists:
+                    # Существующий трек можно положить в плейлист без повторной загрузки
+                    keyboard.insert(0, [InlineKeyboardButton(
+                        "📝 Добавить найденный трек в плейлист",
+                        callback_data=encode_callback('pick_playlist', duplicate.id)
+                    )])
+                    reply_markup = InlineKeyboardMarkup(keyboard)
+            
             await update.message.reply_text(
                 f"🎵 Получен трек:\n"
                 f"🎤 <b>{artist}</b>\n"
                 f"📄 <b>{title}</b>\n\n"
+                f"{duplicate_warning}"
                 f"Куда добавить этот трек?",
                 parse_mode=ParseMode.HTML,
                 reply_markup=reply_markup
@@ -129,190 +183,186 @@ class MusicBot:
         finally:
             db.close()
     
+    @timed_handler(lambda update: f"button:{callback_action_name(update.callback_query.data)}")
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик нажатий на кнопки"""
         query = update.callback_query
         await query.answer()
         
-        user_id = update.effective_user.id
-        data = query.data
+        decoded = decode_callback(query.data)
+        if decoded is None:
+            logger.warning(f"Неизвестные данные кнопки: {query.data!r}")
+            return
         
-        db = DatabaseManager()
+        action, args = decoded
+        request = CallbackRequest(update.effective_user.id, action, args, self.user_ids)
         try:
-            user = db.get_or_create_user(telegram_id=user_id)
-            
-            if data == "view_albums":
-                await self.show_albums(query, db, user.id)
-            elif data == "view_playlists":
-                await self.show_playlists(query, db, user.id)
-            elif data == "choose_album":
-                await self.show_albums_for_selection(query, db, user.id)
-            elif data == "choose_playlist":
-                await self.show_playlists_for_selection(query, db, user.id)
-            elif data == "create_album":
-                await self.start_album_creation(query, user_id)
-            elif data == "create_playlist":
-                await self.start_playlist_creation(query, user_id)
-            elif data.startswith("album_"):
-                await self.handle_album_action(query, db, data)
-            elif data.startswith("playlist_"):
-                await self.handle_playlist_action(query, db, data)
-            elif data.startswith("track_"):
-                await self.send_track(query, db, data)
-            elif data.startswith("add_to_album_"):
-                await self.add_track_to_album(query, db, user.id, data)
-            elif data.startswith("add_to_playlist_"):
-                await self.add_track_to_playlist(query, db, user.id, data)
+            await self.callback_routes[action](query, request)
         finally:
-            db.close()
+            request.close()
+    
+    async def show_cached(self, query, request: CallbackRequest, screen: str, render, object_id: int = None):
+        """Показать экран из кеша клавиатур; render(request) строит (текст, клавиатура, parse_mode) по БД или None"""
+        user_id = request.user_id
+        key = (user_id, screen, object_id)
+        # Версию берем до чтения БД: изменение во время построения сделает запись устаревшей.
+        # Один запрос по первичному ключу вместо списков и счетчиков треков
+        version = request.db.get_library_version(user_id)
+        cached = self.keyboards.get(key)
+        if cached is None or cached[0] != version:
+            view = render(request)
+            if view is None:
+                return False
+            cached = (version, *view)
+            self.keyboards.set(key, cached)
+        
+        _, text, reply_markup, parse_mode = cached
+        await query.edit_message_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        return True
     
-    async def show_albums(self, query, db: DatabaseManager, user_id: int):
+    async def show_albums(self, query, request: CallbackRequest):
         """Показать список альбомов"""
-        albums = db.get_user_albums(user_id)
+        await self.show_cached(query, request, 'albums', self.render_albums)
+    
+    def render_albums(self, request: CallbackRequest):
+        albums = request.db.get_user_albums(request.user_id)
         
         if not albums:
-            keyboard = [[InlineKeyboardButton("➕ Создать альбом", callback_data="create_album")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(
-                "📀 У вас пока нет альбомов.\nСоздайте первый альбом!",
-                reply_markup=reply_markup
-            )
-            return
+            keyboard = [[InlineKeyboardButton("➕ Создать альбом", callback_data=encode_callback('create_album'))]]
+            return "📀 У вас пока нет альбомов.\nСоздайте первый альбом!", InlineKeyboardMarkup(keyboard), None
         
+        track_counts = request.db.get_album_track_counts(request.user_id)
         keyboard = []
         for album in albums:
-            track_count = len(db.get_album_tracks(album.id))
             keyboard.append([InlineKeyboardButton(
-                f"📀 {album.name} ({track_count} треков)", 
-                callback_data=f"album_{album.id}"
+                f"📀 {album.name} ({track_counts.get(album.id, 0)} треков)", 
+                callback_data=encode_callback('album', album.id)
             )])
         
-        keyboard.append([InlineKeyboardButton("➕ Создать альбом", callback_data="create_album")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text("📀 Ваши альбомы:", reply_markup=reply_markup)
+        keyboard.append([InlineKeyboardButton("➕ Создать альбом", callback_data=encode_callback('create_album'))])
+        return "📀 Ваши альбомы:", InlineKeyboardMarkup(keyboard), None
     
-    async def show_playlists(self, query, db: DatabaseManager, user_id: int):
+    async def show_playlists(self, query, request: CallbackRequest):
         """Показать список плейлистов"""
-        playlists = db.get_user_playlists(user_id)
+        await self.show_cached(query, request, 'playlists', self.render_playlists)
+    
+    def render_playlists(self, request: CallbackRequest):
+        playlists = request.db.get_user_playlists(request.user_id)
         
         if not playlists:
-            keyboard = [[InlineKeyboardButton("➕ Создать плейлист", callback_data="create_playlist")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(
-                "📝 У вас пока нет плейлистов.\nСоздайте первый плейлист!",
-                reply_markup=reply_markup
-            )
-            return
+            keyboard = [[InlineKeyboardButton("➕ Создать плейлист", callback_data=encode_callback('create_playlist'))]]
+            return "📝 У вас пока нет плейлистов.\nСоздайте первый плейлист!", InlineKeyboardMarkup(keyboard), None
         
+        track_counts = request.db.get_playlist_track_counts(request.user_id)
         keyboard = []
         for playlist in playlists:
-            track_count = len(db.get_playlist_tracks(playlist.id))
             keyboard.append([InlineKeyboardButton(
-                f"📝 {playlist.name} ({track_count} треков)", 
-                callback_data=f"playlist_{playlist.id}"
+                f"📝 {playlist.name} ({track_counts.get(playlist.id, 0)} треков)", 
+                callback_data=encode_callback('playlist', playlist.id)
             )])
         
-        keyboard.append([InlineKeyboardButton("➕ Создать плейлист", callback_data="create_playlist")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text("📝 Ваши плейлисты:", reply_markup=reply_markup)
+        keyboard.append([InlineKeyboardButton("➕ Создать плейлист", callback_data=encode_callback('create_playlist'))])
+        return "📝 Ваши плейлисты:", InlineKeyboardMarkup(keyboard), None
     
-    async def show_albums_for_selection(self, query, db: DatabaseManager, user_id: int):
+    async def show_albums_for_selection(self, query, request: CallbackRequest):
         """Показать альбомы для выбора при добавлении трека"""
-        albums = db.get_user_albums(user_id)
-        
+        await self.show_cached(query, request, 'choose_album', self.render_albums_for_selection)
+    
+    def render_albums_for_selection(self, request: CallbackRequest):
         keyboard = []
-        for album in albums:
+        for album in request.db.get_user_albums(request.user_id):
             keyboard.append([InlineKeyboardButton(
                 f"📀 {album.name}", 
-                callback_data=f"add_to_album_{album.id}"
+                callback_data=encode_callback('add_to_album', album.id)
             )])
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("📀 Выберите альбом:", reply_markup=reply_markup)
+        return "📀 Выберите альбом:", InlineKeyboardMarkup(keyboard), None
     
-    async def show_playlists_for_selection(self, query, db: DatabaseManager, user_id: int):
+    async def show_playlists_for_selection(self, query, request: CallbackRequest):
         """Показать плейлисты для выбора при добавлении трека"""
-        playlists = db.get_user_playlists(user_id)
-        
+        await self.show_cached(query, request, 'choose_playlist', self.render_playlists_for_selection)
+    
+    def render_playlists_for_selection(self, request: CallbackRequest):
         keyboard = []
-        for playlist in playlists:
+        for playlist in request.db.get_user_playlists(request.user_id):
             keyboard.append([InlineKeyboardButton(
                 f"📝 {playlist.name}", 
-                callback_data=f"add_to_playlist_{playlist.id}"
+                callback_data=encode_callback('add_to_playlist', playlist.id)
             )])
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("📝 Выберите плейлист:", reply_markup=reply_markup)
+        return "📝 Выберите плейлист:", InlineKeyboardMarkup(keyboard), None
     
-    async def handle_album_action(self, query, db: DatabaseManager, data: str):
+    async def handle_album_action(self, query, request: CallbackRequest):
         """Обработка действий с альбомом"""
-        album_id = int(data.split("_")[1])
-        album = db.get_album_by_id(album_id)
-        tracks = db.get_album_tracks(album_id)
+        album_id = request.args[0]
+        if not await self.show_cached(query, request, 'album', self.render_album, album_id):
+            await query.answer("Альбом не найден", show_alert=True)
+    
+    def render_album(self, request: CallbackRequest):
+        album = request.db.get_album_by_id(request.args[0])
+        if not album or album.user_id != request.user_id:
+            return None
+        tracks = request.db.get_album_tracks(album.id)
         
         if not tracks:
-            await query.edit_message_text(f"📀 Альбом '{album.name}' пуст.")
-            return
+            return f"📀 Альбом '{album.name}' пуст.", None, None
         
         keyboard = []
         for track in tracks:
             keyboard.append([InlineKeyboardButton(
                 f"🎵 {track.artist} - {track.title}",
-                callback_data=f"track_{track.id}"
+                callback_data=encode_callback('track', track.id)
             )])
         
-        keyboard.append([InlineKeyboardButton("« Назад", callback_data="view_albums")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            f"📀 <b>{album.name}</b>\n\nТреки:",
-            parse_mode=ParseMode.HTML,
-            reply_markup=reply_markup
-        )
+        keyboard.append([InlineKeyboardButton("« Назад", callback_data=encode_callback('view_albums'))])
+        return f"📀 <b>{album.name}</b>\n\nТреки:", InlineKeyboardMarkup(keyboard), ParseMode.HTML
     
-    async def handle_playlist_action(self, query, db: DatabaseManager, data: str):
-        """Обработка действий с плейлистом"""
-        playlist_id = int(data.split("_")[1])
-        playlist = db.get_playlist_by_id(playlist_id)
-        tracks = db.get_playlist_tracks(playlist_id)
+    async def handle_playlist_action(self, query, request: CallbackRequest):
+        """Обработка действий с плейлистом (первый параметр кнопки - id плейлиста)"""
+        playlist_id = request.args[0]
+        if not await self.show_cached(query, request, 'playlist', self.render_playlist, playlist_id):
+            await query.answer("Плейлист не найден", show_alert=True)
+    
+    def render_playlist(self, request: CallbackRequest):
+        playlist = request.db.get_playlist_by_id(request.args[0])
+        if not playlist or playlist.user_id != request.user_id:
+            return None
+        tracks = request.db.get_playlist_tracks(playlist.id)
         
         if not tracks:
-            await query.edit_message_text(f"📝 Плейлист '{playlist.name}' пуст.")
-            return
+            return f"📝 Плейлист '{playlist.name}' пуст.", None, None
         
         keyboard = []
         for track in tracks:
-            keyboard.append([InlineKeyboardButton(
-                f"🎵 {track.artist} - {track.title}",
-                callback_data=f"track_{track.id}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("« Назад", callback_data="view_playlists")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+            keyboard.append([
+                InlineKeyboardButton(f"🎵 {track.artist} - {track.title}", callback_data=encode_callback('track', track.id)),
+                InlineKeyboardButton("⬆️", callback_data=encode_callback('plmove', playlist.id, track.id)),
+                InlineKeyboardButton("✖️", callback_data=encode_callback('plremove', playlist.id, track.id))
+            ])
         
-        await query.edit_message_text(
-            f"📝 <b>{playlist.name}</b>\n\nТреки:",
-            parse_mode=ParseMode.HTML,
-            reply_markup=reply_markup
-        )
+        keyboard.append([InlineKeyboardButton("« Назад", callback_data=encode_callback('view_playlists'))])
+        return f"📝 <b>{playlist.name}</b>\n\nТреки:", InlineKeyboardMarkup(keyboard), ParseMode.HTML
     
-    async def send_track(self, query, db: DatabaseManager, data: str):
+    async def send_track(self, query, request: CallbackRequest):
         """Отправка трека пользователю"""
-        track_id = int(data.split("_")[1])
-        track = db.get_track_by_id(track_id)
+        track = request.db.get_track_by_id(request.args[0])
         
         if not track:
             await query.answer("Трек не найден", show_alert=True)
             return
         
+        # Трек можно добавить в другой плейлист без повторной загрузки файла
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(
+            "📝 В плейлист", callback_data=encode_callback('pick_playlist', track.id)
+        )]])
+        
         try:
             if track.file_id:
                 # Используем сохраненный file_id для быстрой отправки
                 await query.message.reply_audio(
                     audio=track.file_id,
-                    caption=f"🎵 {track.artist} - {track.title}"
+                    caption=f"🎵 {track.artist} - {track.title}",
+                    reply_markup=reply_markup
                 )
             else:
                 # Отправляем файл по пути
@@ -321,84 +371,145 @@ class MusicBot:
                         audio=audio_file,
                         title=track.title,
                         performer=track.artist,
-                        caption=f"🎵 {track.artist} - {track.title}"
+                        caption=f"🎵 {track.artist} - {track.title}",
+                        reply_markup=reply_markup
                     )
+            record_play(track.user_id, track.id, 'bot')
         except Exception as e:
             logger.error(f"Ошибка при отправке трека: {e}")
             await query.answer("Ошибка при отправке трека", show_alert=True)
     
-    async def add_track_to_album(self, query, db: DatabaseManager, user_id: int, data: str):
+    async def add_track_to_album(self, query, request: CallbackRequest):
         """Добавление трека в альбом"""
-        album_id = int(data.split("_")[-1])
+        album_id = request.args[0]
         
-        if user_id not in self.temp_audio_data:
+        if request.telegram_id not in self.temp_audio_data:
             await query.answer("Данные о треке утеряны", show_alert=True)
             return
         
-        audio_data = self.temp_audio_data[user_id]
-        user = db.get_or_create_user(telegram_id=user_id)
-        
-        track = db.add_track(
-            user_id=user.id,
-            title=audio_data['title'],
-            artist=audio_data['artist'],
-            file_path=audio_data['file_path'],
-            file_id=audio_data['file_id'],
-            duration=audio_data['duration'],
-            album_id=album_id
-        )
+        audio_data = self.temp_audio_data[request.telegram_id]
+        
+        create_track(request.db, request.user_id, audio_data, album_id=album_id)
         
-        album = db.get_album_by_id(album_id)
+        album = request.db.get_album_by_id(album_id)
         
         # Очищаем временные данные
-        del self.temp_audio_data[user_id]
+        del self.temp_audio_data[request.telegram_id]
         
         await query.edit_message_text(
             f"✅ Трек добавлен в альбом '{album.name}'!\n\n"
             f"🎵 {audio_data['artist']} - {audio_data['title']}"
         )
     
-    async def add_track_to_playlist(self, query, db: DatabaseManager, user_id: int, data: str):
+    async def add_track_to_playlist(self, query, request: CallbackRequest):
         """Добавление трека в плейлист"""
-        playlist_id = int(data.split("_")[-1])
+        playlist_id = request.args[0]
         
-        if user_id not in self.temp_audio_data:
+        if request.telegram_id not in self.temp_audio_data:
             await query.answer("Данные о треке утеряны", show_alert=True)
             return
         
-        audio_data = self.temp_audio_data[user_id]
-        user = db.get_or_create_user(telegram_id=user_id)
-        
-        track = db.add_track(
-            user_id=user.id,
-            title=audio_data['title'],
-            artist=audio_data['artist'],
-            file_path=audio_data['file_path'],
-            file_id=audio_data['file_id'],
-            duration=audio_data['duration'],
-            playlist_id=playlist_id
-        )
+        audio_data = self.temp_audio_data[request.telegram_id]
         
-        playlist = db.get_playlist_by_id(playlist_id)
+        create_track(request.db, request.user_id, audio_data, playlist_id=playlist_id)
+        
+        playlist = request.db.get_playlist_by_id(playlist_id)
         
         # Очищаем временные данные
-        del self.temp_audio_data[user_id]
+        del self.temp_audio_data[request.telegram_id]
         
         await query.edit_message_text(
             f"✅ Трек добавлен в плейлист '{playlist.name}'!\n\n"
             f"🎵 {audio_data['artist']} - {audio_data['title']}"
         )
     
-    async def start_album_creation(self, query, user_id: int):
+    async def show_playlists_for_existing_track(self, query, request: CallbackRequest):
+        """Показать плейлисты для уже загруженного трека"""
+        track_id = request.args[0]
+        playlists = request.db.get_user_playlists(request.user_id)
+        
+        if not playlists:
+            await query.answer("У вас пока нет плейлистов", show_alert=True)
+            return
+        
+        keyboard = []
+        for playlist in playlists:
+            keyboard.append([InlineKeyboardButton(
+                f"📝 {playlist.name}",
+                callback_data=encode_callback('pladd', playlist.id, track_id)
+            )])
+        
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.message.reply_text("📝 Выберите плейлист:", reply_markup=reply_markup)
+    
+    async def add_existing_track_to_playlist(self, query, request: CallbackRequest):
+        """Добавление уже загруженного трека в плейлист - файл не копируется"""
+        playlist_id, track_id = request.args
+        db = request.db
+        playlist = db.get_playlist_by_id(playlist_id)
+        track = db.get_track_by_id(track_id)
+        
+        if (not playlist or not track or playlist.user_id != request.user_id
+                or track.user_id != playlist.user_id):
+            await query.answer("Трек или плейлист не найден", show_alert=True)
+            return
+        
+        # Если это был ответ на загрузку дубликата, новый файл больше не нужен.
+        # Тот же файл из Telegram скачивается по тому же пути, что и у найденного трека,
+        # поэтому удаляет его reaper - только если на путь не ссылается ни один трек
+        audio_data = self.temp_audio_data.get(request.telegram_id)
+        if audio_data and audio_data.get('duplicate_id') == track.id:
+            del self.temp_audio_data[request.telegram_id]
+            db.discard_files([audio_data['file_path']])
+        
+        if db.add_track_to_playlist(playlist.id, track.id):
+            text = f"✅ Трек добавлен в плейлист '{playlist.name}'!"
+        else:
+            text = f"ℹ️ Трек уже есть в плейлисте '{playlist.name}'"
+        await query.edit_message_text(f"{text}\n\n🎵 {track.artist} - {track.title}")
+    
+    async def check_playlist_owner(self, query, request: CallbackRequest, playlist_id: int) -> bool:
+        """Плейлист существует и принадлежит нажавшему кнопку"""
+        playlist = request.db.get_playlist_by_id(playlist_id)
+        if not playlist or playlist.user_id != request.user_id:
+            await query.answer("Плейлист не найден", show_alert=True)
+            return False
+        return True
+    
+    async def move_track_up_in_playlist(self, query, request: CallbackRequest):
+        """Поднять трек на одну позицию в плейлисте"""
+        playlist_id, track_id = request.args
+        if not await self.check_playlist_owner(query, request, playlist_id):
+            return
+        track_ids = [track.id for track in request.db.get_playlist_tracks(playlist_id)]
+        
+        if track_id not in track_ids or track_ids.index(track_id) == 0:
+            return  # Уже первый - перерисовывать нечего
+        
+        index = track_ids.index(track_id)
+        after_track_id = track_ids[index - 2] if index >= 2 else None
+        request.db.move_playlist_track(playlist_id, track_id, after_track_id)
+        await self.handle_playlist_action(query, request)
+    
+    async def remove_track_from_playlist(self, query, request: CallbackRequest):
+        """Убрать трек из плейлиста (трек остается в библиотеке)"""
+        playlist_id, track_id = request.args
+        if not await self.check_playlist_owner(query, request, playlist_id):
+            return
+        request.db.remove_track_from_playlist(playlist_id, track_id)
+        await self.handle_playlist_action(query, request)
+    
+    async def start_album_creation(self, query, request: CallbackRequest):
         """Начать создание альбома"""
-        self.user_states[user_id] = WAITING_FOR_ALBUM_NAME
+        self.user_states[request.telegram_id] = WAITING_FOR_ALBUM_NAME
         await query.edit_message_text("📀 Введите название для нового альбома:")
     
-    async def start_playlist_creation(self, query, user_id: int):
+    async def start_playlist_creation(self, query, request: CallbackRequest):
         """Начать создание плейлиста"""
-        self.user_states[user_id] = WAITING_FOR_PLAYLIST_NAME
+        self.user_states[request.telegram_id] = WAITING_FOR_PLAYLIST_NAME
         await query.edit_message_text("📝 Введите название для нового плейлиста:")
     
+    @timed_handler('handle_text_message')
     async def handle_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик текстовых сообщений"""
         user_id = update.effective_user.id
@@ -411,17 +522,17 @@ class MusicBot:
         db = DatabaseManager()
         
         try:
-            user = db.get_or_create_user(telegram_id=user_id)
+            user_db_id = resolve_user_id(self.user_ids, user_id, lambda: db)
             
             if state == WAITING_FOR_ALBUM_NAME:
-                album = db.create_album(user.id, text)
+                album = db.create_album(user_db_id, text)
                 del self.user_states[user_id]
                 
                 # Если есть временный трек, предлагаем добавить в новый альбом
                 if user_id in self.temp_audio_data:
                     keyboard = [[InlineKeyboardButton(
                         f"➕ Добавить в '{album.name}'", 
-                        callback_data=f"add_to_album_{album.id}"
+                        callback_data=encode_callback('add_to_album', album.id)
                     )]]
                     reply_markup = InlineKeyboardMarkup(keyboard)
                     await update.message.reply_text(
@@ -432,14 +543,14 @@ class MusicBot:
                     await update.message.reply_text(f"✅ Альбом '{album.name}' создан!")
             
             elif state == WAITING_FOR_PLAYLIST_NAME:
-                playlist = db.create_playlist(user.id, text)
+                playlist = db.create_playlist(user_db_id, text)
                 del self.user_states[user_id]
                 
                 # Если есть временный трек, предлагаем добавить в новый плейлист
                 if user_id in self.temp_audio_data:
                     keyboard = [[InlineKeyboardButton(
                         f"➕ Добавить в '{playlist.name}'", 
-                        callback_data=f"add_to_playlist_{playlist.id}"
+                        callback_data=encode_callback('add_to_playlist', playlist.id)
                     )]]
                     reply_markup = InlineKeyboardMarkup(keyboard)
                     await update.message.reply_text(
@@ -452,10 +563,25 @@ class MusicBot:
         finally:
             db.close()
 
+async def mark_bot_ready(application: Application):
+    """Telegram ответил на getMe - бот готов принимать обновления"""
+    startup.set_ready('bot')
+    logger.info(f"📱 Telegram бот @{application.bot.username}: готов к работе")
+
+async def mark_bot_stopped(application: Application):
+    startup.set_ready('bot', False)
+
 def main():
     """Запуск бота"""
-    # Создаем таблицы БД
-    create_tables()
+    # Настройка логирования (при запуске через run.py уже настроено)
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    
+    # Папки и схема БД (если run.py еще не проверил)
+    startup.expect('bot')
+    startup.initialize()
     
     if not config.BOT_TOKEN:
         logger.error("BOT_TOKEN не найден в переменных окружения!")
@@ -463,7 +589,8 @@ def main():
     
     # Создаем бота
     bot = MusicBot()
-    application = Application.builder().token(config.BOT_TOKEN).build()
+    application = (Application.builder().token(config.BOT_TOKEN)
+                   .post_init(mark_bot_ready).post_shutdown(mark_bot_stopped).build())
     
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", bot.start))
@@ -0,0 +1,48 @@
+"""
+Общие фикстуры тестов
+
+config.py читает переменные окружения при импорте, поэтому временные БД и
+папка загрузок задаются здесь, до импорта модулей проекта. Каждый тест
+получает пустую схему и пустую папку загрузок.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+TEST_ROOT = tempfile.mkdtemp(prefix='musicbot-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_ROOT, 'test.db')}"
+os.environ['UPLOAD_FOLDER'] = os.path.join(TEST_ROOT, 'uploads', 'audio')
+os.environ['METRICS_ENABLED'] = 'false'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import uploads
+from models import Base, engine, create_tables
+from database import DatabaseManager
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    Base.metadata.drop_all(bind=engine)
+    create_tables()
+    shutil.rmtree(os.path.dirname(config.UPLOAD_FOLDER), ignore_errors=True)
+    config.ensure_directories()
+    uploads._hashes.clear()
+    uploads._locks.clear()
+    yield
+
+@pytest.fixture
+def db():
+    manager = DatabaseManager()
+    yield manager
+    manager.close()
+
+@pytest.fixture
+def user(db):
+    return db.get_or_create_user(telegram_id=1000)
+
+def pytest_sessionfinish(session, exitstatus):
+    engine.dispose()
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
@@ -0,0 +1,58 @@
+import pytest
+from callbacks import (ACTIONS, MAX_CALLBACK_DATA, callback_action_name, decode_callback,
+                       encode_callback, resolve_user_id)
+from library_cache import LRUCache
+
+@pytest.mark.parametrize('action', sorted(ACTIONS))
+def test_every_action_round_trips(action):
+    args = tuple(range(35, 35 + ACTIONS[action][1]))
+    assert decode_callback(encode_callback(action, *args)) == (action, args)
+
+def test_encoding_is_compact():
+    assert encode_callback('plmove', 12, 100) == '1pm.c.2s'
+    assert encode_callback('view_albums') == '1A'
+
+def test_large_ids_fit_telegram_limit():
+    data = encode_callback('plremove', 2 ** 63, 2 ** 63)
+    assert len(data.encode()) <= MAX_CALLBACK_DATA
+    assert decode_callback(data) == ('plremove', (2 ** 63, 2 ** 63))
+
+def test_invalid_arguments_are_rejected():
+    with pytest.raises(ValueError):
+        encode_callback('plmove', 1)
+    with pytest.raises(ValueError):
+        encode_callback('album', -1)
+
+@pytest.mark.parametrize('data, expected', [
+    ('view_albums', ('view_albums', ())),
+    ('album_15', ('album', (15,))),
+    ('add_to_playlist_7', ('add_to_playlist', (7,))),
+    ('plmove_12_100', ('plmove', (12, 100))),
+    ('pladd_3_4', ('pladd', (3, 4))),
+])
+def test_legacy_buttons_are_decoded(data, expected):
+    assert decode_callback(data) == expected
+
+@pytest.mark.parametrize('data', [
+    None, '', '1', '1zz', '1a', '1a.1.2', '1pm.c', '1a.!', 'album', 'album_x', 'plmove_1', 'unknown_1',
+])
+def test_malformed_data_is_ignored(data):
+    assert decode_callback(data) is None
+
+def test_action_name_for_metrics():
+    assert callback_action_name(encode_callback('track', 5)) == 'track'
+    assert callback_action_name('album_5') == 'album'
+    assert callback_action_name('garbage') == 'other'
+
+def test_user_id_is_cached():
+    calls = []
+
+    class FakeDatabase:
+        def get_or_create_user(self, telegram_id):
+            calls.append(telegram_id)
+            return type('User', (), {'id': telegram_id + 1})()
+
+    cache = LRUCache(10)
+    assert resolve_user_id(cache, 41, FakeDatabase) == 42
+    assert resolve_user_id(cache, 41, FakeDatabase) == 42
+    assert calls == [41]
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+import fingerprint
+from fingerprint import (FingerprintIndex, DUPLICATE_MAX_BER, FINGERPRINT_BITS, FINGERPRINT_BYTES,
+                         get_user_index, register_fingerprint)
+
+@pytest.fixture(autouse=True)
+def empty_indexes():
+    fingerprint._user_indexes.items.clear()
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+def random_fingerprint(rng) -> bytes:
+    return rng.integers(0, 256, FINGERPRINT_BYTES, dtype=np.uint8).tobytes()
+
+def flip_bits(value: bytes, ber: float, rng) -> bytes:
+    bits = np.unpackbits(np.frombuffer(value, dtype=np.uint8))
+    flips = rng.choice(bits.size, int(bits.size * ber), replace=False)
+    bits[flips] ^= 1
+    return np.packbits(bits).tobytes()
+
+def test_copies_near_threshold_are_found(rng):
+    index = FingerprintIndex()
+    originals = [random_fingerprint(rng) for _ in range(500)]
+    index.add_many(enumerate(originals))
+    index.rebuild()
+
+    # Ровно 0.95 порога: полнота LSH для копий у самой границы
+    ber = int(FINGERPRINT_BITS * DUPLICATE_MAX_BER * 0.95) / FINGERPRINT_BITS
+    found = sum(any(track_id == target for track_id, _ in index.query(flip_bits(originals[target], ber, rng)))
+                for target in range(200))
+    assert found >= 190
+
+def test_unrelated_fingerprint_is_not_a_duplicate(rng):
+    index = FingerprintIndex()
+    index.add_many((track_id, random_fingerprint(rng)) for track_id in range(100))
+    assert index.query(random_fingerprint(rng)) == []
+
+def add_track(db, user, fingerprint_bytes, title='Трек'):
+    return db.add_track(user.id, title, 'Исполнитель', f'/nonexistent/{title}.mp3', fingerprint=fingerprint_bytes)
+
+def test_registered_track_is_added_without_reload(db, user, rng):
+    add_track(db, user, random_fingerprint(rng), 'Первый')
+    index = get_user_index(db, user.id)
+
+    value = random_fingerprint(rng)
+    track = add_track(db, user, value, 'Второй')
+    register_fingerprint(db, user.id, track.id, value)
+
+    assert get_user_index(db, user.id) is index
+    assert index.query(value)[0][0] == track.id
+
+def test_index_reloads_after_changes_from_other_process(db, user, rng):
+    first = add_track(db, user, random_fingerprint(rng), 'Первый')
+    index = get_user_index(db, user.id)
+
+    # Трек добавлен другим процессом - register_fingerprint здесь не вызывался
+    value = random_fingerprint(rng)
+    track = add_track(db, user, value, 'Второй')
+    reloaded = get_user_index(db, user.id)
+    assert reloaded is not index
+    assert reloaded.query(value)[0][0] == track.id
+
+    db.delete_tracks([track.id])
+    assert get_user_index(db, user.id).query(value) == []
+    assert get_user_index(db, user.id).query(db.get_track_by_id(first.id).fingerprint)[0][0] == first.id
+
+def test_reused_track_id_does_not_keep_old_fingerprint(db, user, rng):
+    add_track(db, user, random_fingerprint(rng), 'Первый')
+    old_value = random_fingerprint(rng)
+    old = add_track(db, user, old_value, 'Удаленный')
+    get_user_index(db, user.id)
+
+    # SQLite отдает новому треку id только что удаленного последнего трека
+    db.delete_tracks([old.id])
+    new_value = random_fingerprint(rng)
+    new = add_track(db, user, new_value, 'Новый')
+    assert new.id == old.id
+
+    index = get_user_index(db, user.id)
+    assert index.query(old_value) == []
+    assert index.query(new_value)[0][0] == new.id
+
+def test_fingerprint_set_by_analysis_is_indexed(db, user, rng):
+    track = add_track(db, user, None)
+    index = get_user_index(db, user.id)
+
+    value = random_fingerprint(rng)
+    db.set_track_fingerprint(track.id, value)
+    # Другой процесс (очередь анализа) не вызывал register_fingerprint в этом процессе
+    assert get_user_index(db, user.id) is not index
+    assert get_user_index(db, user.id).query(value)[0][0] == track.id
@@ -0,0 +1,80 @@
+from datetime import datetime
+import pytest
+from models import PlayEvent, PlayStat
+from play_events import PlayEventBuffer
+
+def make_track(db, user, title='Трек'):
+    return db.add_track(user.id, title, 'Исполнитель', f'/nonexistent/{title}.mp3')
+
+def stats(db):
+    db.db.expire_all()
+    return {(stat.track_id, stat.hour): (stat.play_count, stat.last_played_at)
+            for stat in db.db.query(PlayStat)}
+
+def test_batch_is_folded_into_hourly_stats(db, user):
+    track = make_track(db, user)
+    db.record_play_events([
+        (user.id, track.id, 'web', datetime(2024, 5, 1, 10, 5)),
+        (user.id, track.id, 'bot', datetime(2024, 5, 1, 10, 50)),
+        (user.id, track.id, 'web', datetime(2024, 5, 1, 11, 1)),
+    ])
+
+    assert db.db.query(PlayEvent).count() == 3
+    assert stats(db) == {
+        (track.id, datetime(2024, 5, 1, 10)): (2, datetime(2024, 5, 1, 10, 50)),
+        (track.id, datetime(2024, 5, 1, 11)): (1, datetime(2024, 5, 1, 11, 1)),
+    }
+
+def test_upsert_adds_to_existing_hour(db, user):
+    track = make_track(db, user)
+    hour = datetime(2024, 5, 1, 10)
+    db.record_play_events([(user.id, track.id, 'web', datetime(2024, 5, 1, 10, 40))])
+    # Более раннее событие из следующей пачки не сдвигает время последнего прослушивания назад
+    db.record_play_events([(user.id, track.id, 'web', datetime(2024, 5, 1, 10, 20)),
+                           (user.id, track.id, 'web', datetime(2024, 5, 1, 10, 30))])
+
+    assert stats(db) == {(track.id, hour): (3, datetime(2024, 5, 1, 10, 40))}
+
+    db.record_play_events([(user.id, track.id, 'web', datetime(2024, 5, 1, 10, 59))])
+    assert stats(db) == {(track.id, hour): (4, datetime(2024, 5, 1, 10, 59))}
+
+def test_most_played_tracks(db, user):
+    first = make_track(db, user, 'Первый')
+    second = make_track(db, user, 'Второй')
+    played_at = datetime(2024, 5, 1, 10)
+    db.record_play_events([(user.id, first.id, 'web', played_at)] +
+                          [(user.id, second.id, 'web', played_at)] * 3)
+
+    assert [(track.id, plays) for track, plays in db.get_most_played_tracks(user.id)] == \
+        [(second.id, 3), (first.id, 1)]
+    assert db.get_most_played_tracks(user.id, since=datetime(2024, 5, 2)) == []
+
+@pytest.fixture
+def buffer():
+    # Фоновый поток сам не сбросит буфер за время теста - сбрасываем вручную
+    play_buffer = PlayEventBuffer(batch_size=1000, flush_interval=3600)
+    yield play_buffer
+    play_buffer.stop()
+
+def test_buffer_flushes_into_database(db, user, buffer):
+    track = make_track(db, user)
+    for _ in range(5):
+        buffer.record(user.id, track.id, 'web')
+
+    assert buffer.flush() == 5
+    assert buffer.flush() == 0
+    assert sum(count for count, _ in stats(db).values()) == 5
+
+def test_failed_flush_keeps_events(db, user, buffer, monkeypatch):
+    track = make_track(db, user)
+    buffer.record(user.id, track.id, 'web')
+
+    def fail(self, events):
+        raise RuntimeError('БД недоступна')
+    monkeypatch.setattr('database.DatabaseManager.record_play_events', fail)
+    assert buffer.flush() == 0
+    assert len(buffer.events) == 1
+
+    monkeypatch.undo()
+    assert buffer.flush() == 1
+    assert stats(db)
@@ -0,0 +1,69 @@
+from models import PlaylistItem, POSITION_GAP
+
+def make_playlist(db, user, count):
+    playlist = db.create_playlist(user.id, 'Плейлист')
+    tracks = [db.add_track(user.id, f'Трек {number}', 'Исполнитель', f'/nonexistent/{number}.mp3')
+              for number in range(count)]
+    for track in tracks:
+        db.add_track_to_playlist(playlist.id, track.id)
+    return playlist, [track.id for track in tracks]
+
+def playlist_order(db, playlist_id):
+    return [track.id for track in db.get_playlist_tracks(playlist_id)]
+
+def positions(db, playlist_id):
+    db.db.expire_all()
+    return [position for position, in db.db.query(PlaylistItem.position).filter(
+        PlaylistItem.playlist_id == playlist_id
+    ).order_by(PlaylistItem.position)]
+
+def test_tracks_are_appended_with_gaps(db, user):
+    playlist, _ = make_playlist(db, user, 3)
+    assert positions(db, playlist.id) == [POSITION_GAP, 2 * POSITION_GAP, 3 * POSITION_GAP]
+
+def test_duplicate_add_is_rejected(db, user):
+    playlist, track_ids = make_playlist(db, user, 1)
+    assert db.add_track_to_playlist(playlist.id, track_ids[0]) is None
+    assert playlist_order(db, playlist.id) == track_ids
+
+def test_move_changes_only_the_moved_row(db, user):
+    playlist, (first, second, third) = make_playlist(db, user, 3)
+    before = positions(db, playlist.id)
+
+    assert db.move_playlist_track(playlist.id, third, after_track_id=first)
+    assert playlist_order(db, playlist.id) == [first, third, second]
+    after = positions(db, playlist.id)
+    assert after[0] == before[0] and after[2] == before[1]
+    assert before[0] < after[1] < before[1]
+
+def test_move_to_start_and_end(db, user):
+    playlist, (first, second, third) = make_playlist(db, user, 3)
+
+    assert db.move_playlist_track(playlist.id, third)
+    assert playlist_order(db, playlist.id) == [third, first, second]
+    assert db.move_playlist_track(playlist.id, third, after_track_id=second)
+    assert playlist_order(db, playlist.id) == [first, second, third]
+
+def test_exhausted_gap_renumbers_playlist(db, user):
+    playlist, track_ids = make_playlist(db, user, 4)
+    first = track_ids[0]
+    order = list(track_ids)
+
+    # Каждый раз ставим последний трек сразу после первого - промежуток делится пополам,
+    # пока не кончится, после чего плейлист перенумеровывается
+    for _ in range(POSITION_GAP.bit_length() + 2):
+        moved = order[-1]
+        assert db.move_playlist_track(playlist.id, moved, after_track_id=first)
+        order = [first, moved] + [track_id for track_id in order[1:] if track_id != moved]
+        assert playlist_order(db, playlist.id) == order
+
+    current = positions(db, playlist.id)
+    assert len(set(current)) == len(current)
+    assert all(high - low >= 2 for low, high in zip(current, current[1:]))
+
+def test_move_rejects_tracks_outside_playlist(db, user):
+    playlist, (first, _) = make_playlist(db, user, 2)
+    other = db.add_track(user.id, 'Вне плейлиста', 'Исполнитель', '/nonexistent/other.mp3')
+
+    assert not db.move_playlist_track(playlist.id, other.id)
+    assert not db.move_playlist_track(playlist.id, first, after_track_id=other.id)
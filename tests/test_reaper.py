@@ -0,0 +1,66 @@
+import os
+import config
+import reaper
+from models import PendingFileDeletion
+
+def make_file(name, data=b'audio'):
+    path = os.path.join(config.UPLOAD_FOLDER, name)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return path
+
+def pending_paths(db):
+    db.db.expire_all()
+    return sorted(path for path, in db.db.query(PendingFileDeletion.file_path))
+
+def test_deleted_track_file_is_removed_by_reaper(db, user):
+    path = make_file('track.mp3')
+    track = db.add_track(user.id, 'Трек', 'Исполнитель', path)
+
+    assert db.delete_tracks([track.id], user_id=user.id) == 1
+    # Запрос только ставит файл в очередь
+    assert os.path.exists(path)
+    assert path in pending_paths(db)
+
+    assert reaper.reap_pending_files() > 0
+    assert not os.path.exists(path)
+    assert pending_paths(db) == []
+
+def test_file_still_referenced_is_kept(db, user):
+    path = make_file('shared.mp3')
+    first = db.add_track(user.id, 'Первый', 'Исполнитель', path)
+    db.add_track(user.id, 'Второй', 'Исполнитель', path)
+
+    db.delete_tracks([first.id])
+    reaper.reap_pending_files()
+    assert os.path.exists(path)
+    assert pending_paths(db) == []
+
+def test_other_users_tracks_are_not_deleted(db, user):
+    other = db.get_or_create_user(telegram_id=2000)
+    path = make_file('other.mp3')
+    track = db.add_track(other.id, 'Чужой', 'Исполнитель', path)
+
+    assert db.delete_tracks([track.id], user_id=user.id) == 0
+    assert db.get_track_by_id(track.id) is not None
+    assert pending_paths(db) == []
+
+def test_missing_file_leaves_queue(db):
+    db.discard_files([os.path.join(config.UPLOAD_FOLDER, 'missing.mp3')])
+
+    assert reaper.reap_pending_files() == 1
+    assert pending_paths(db) == []
+
+def test_failed_deletion_is_retried_then_dropped(db):
+    # Каталог вместо файла: os.remove падает с OSError
+    path = os.path.join(config.UPLOAD_FOLDER, 'directory.mp3')
+    os.makedirs(path)
+    db.discard_files([path])
+
+    for attempt in range(1, reaper.REAP_MAX_ATTEMPTS):
+        reaper.reap_pending_files()
+        db.db.expire_all()
+        assert db.db.query(PendingFileDeletion.attempts).scalar() == attempt
+    reaper.reap_pending_files()
+    assert pending_paths(db) == []
+    assert os.path.isdir(path)
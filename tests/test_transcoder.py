@@ -0,0 +1,12 @@
+from transcoder import BITRATE_LADDER, variant_path
+
+def test_variants_of_same_named_tracks_do_not_collide():
+    paths = [variant_path(f'/music/song{extension}', quality, codec)
+             for extension in ('.mp3', '.flac')
+             for quality, codecs in BITRATE_LADDER.items()
+             for codec in codecs]
+    assert len(set(paths)) == len(paths)
+
+def test_variant_is_named_after_full_file_name():
+    assert variant_path('/music/song.mp3', 'low', 'aac') == '/music/song.mp3.low.m4a'
+    assert variant_path('/music/song.flac', 'medium', 'opus') == '/music/song.flac.medium.opus'
@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import io
+import pytest
+import uploads
+from uploads import UploadError, REASON_CHUNK_CHECKSUM, REASON_OFFSET_MISMATCH
+from web_app import app
+
+DATA = bytes(range(256)) * 4
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+@pytest.fixture
+def upload_id(client):
+    response = client.post('/api/user/1000/uploads', json={'filename': 'song.mp3', 'size': len(DATA)})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+def send_chunk(client, upload_id, offset, data, checksum=None):
+    headers = {'Upload-Offset': str(offset)}
+    if checksum is not None:
+        headers['Upload-Checksum'] = 'sha256 ' + base64.b64encode(checksum).decode()
+    return client.patch(f'/api/uploads/{upload_id}', data=data, headers=headers)
+
+def received(client, upload_id):
+    return client.get(f'/api/uploads/{upload_id}').get_json()['offset']
+
+def part_file(upload_id):
+    with open(uploads.load_upload(upload_id).file_path, 'rb') as part:
+        return part.read()
+
+class BrokenStream:
+    """Тело запроса, оборвавшееся после limit байт"""
+
+    def __init__(self, data, limit):
+        self.stream = io.BytesIO(data[:limit])
+
+    def read(self, size):
+        data = self.stream.read(size)
+        if not data:
+            raise ConnectionError('соединение разорвано')
+        return data
+
+def test_chunks_advance_offset(client, upload_id):
+    response = send_chunk(client, upload_id, 0, DATA[:100])
+    assert response.status_code == 200
+    assert response.headers['Upload-Offset'] == '100'
+    assert received(client, upload_id) == 100
+
+    response = send_chunk(client, upload_id, 100, DATA[100:300], hashlib.sha256(DATA[100:300]).digest())
+    assert response.get_json()['offset'] == 300
+    assert part_file(upload_id) == DATA[:300]
+
+def test_offset_mismatch_returns_current_offset(client, upload_id):
+    send_chunk(client, upload_id, 0, DATA[:100])
+
+    response = send_chunk(client, upload_id, 0, DATA[:100])
+    assert response.status_code == 409
+    assert response.headers['Upload-Offset'] == '100'
+    assert response.get_json()['reason'] == REASON_OFFSET_MISMATCH
+    assert received(client, upload_id) == 100
+
+def test_chunk_checksum_mismatch_keeps_offset(client, upload_id):
+    send_chunk(client, upload_id, 0, DATA[:100])
+
+    response = send_chunk(client, upload_id, 100, DATA[100:200], hashlib.sha256(b'other').digest())
+    assert response.status_code == 422
+    assert response.get_json()['reason'] == REASON_CHUNK_CHECKSUM
+    assert response.headers['Upload-Offset'] == '100'
+    assert part_file(upload_id) == DATA[:100]
+
+    # Повтор того же куска с верной суммой принимается
+    response = send_chunk(client, upload_id, 100, DATA[100:200], hashlib.sha256(DATA[100:200]).digest())
+    assert response.status_code == 200
+    assert part_file(upload_id) == DATA[:200]
+
+def test_interrupted_chunk_resumes_from_received_bytes(upload_id):
+    result = uploads.write_chunk(upload_id, BrokenStream(DATA, 150), 0, 400)
+    assert result['offset'] == 150
+
+    # После перезапуска процесса хеш принятых байт восстанавливается из .part файла
+    uploads._hashes.clear()
+    result = uploads.write_chunk(upload_id, io.BytesIO(DATA[150:400]), 150, 250)
+    assert result['offset'] == 400
+    assert part_file(upload_id) == DATA[:400]
+    assert uploads.upload_hash(upload_id, uploads.load_upload(upload_id).file_path, 400).digest() \
+        == hashlib.sha256(DATA[:400]).digest()
+
+def test_interrupted_chunk_with_checksum_is_discarded(upload_id):
+    result = uploads.write_chunk(upload_id, BrokenStream(DATA, 150), 0, 400, hashlib.sha256(DATA[:400]).digest())
+    assert result['offset'] == 0
+    assert part_file(upload_id) == b''
+
+def test_chunk_past_size_is_rejected(upload_id):
+    with pytest.raises(UploadError) as error:
+        uploads.write_chunk(upload_id, io.BytesIO(DATA), 0, len(DATA) + 1)
+    assert error.value.status == 400
+
+def test_unknown_upload_creates_no_lock(client):
+    response = send_chunk(client, 'missing', 0, b'data')
+    assert response.status_code == 404
+    assert client.delete('/api/uploads/missing').status_code == 404
+    assert 'missing' not in uploads._locks
+
+def test_cancel_forgets_upload(client, upload_id):
+    send_chunk(client, upload_id, 0, DATA[:100])
+
+    assert client.delete(f'/api/uploads/{upload_id}').get_json() == {'success': True}
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404
+    assert upload_id not in uploads._locks and upload_id not in uploads._hashes
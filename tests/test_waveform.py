@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import config
+import reaper
+from waveform import PeakAccumulator, BLOCK_SIZE, legacy_peaks_path, peaks_path
+
+def test_peaks_do_not_depend_on_chunking():
+    samples = (np.sin(np.arange(100000) / 50) * 20000).astype(np.int16)
+    whole = PeakAccumulator()
+    whole.feed(samples)
+    chunked = PeakAccumulator()
+    for start in range(0, samples.size, 777):
+        chunked.feed(samples[start:start + 777])
+    assert np.array_equal(whole.finish(100), chunked.finish(100))
+
+def test_peaks_are_min_max_pairs():
+    samples = np.zeros(BLOCK_SIZE * 4, dtype=np.int16)
+    samples[BLOCK_SIZE * 3] = -32768
+    samples[BLOCK_SIZE * 3 + 1] = 32767
+    accumulator = PeakAccumulator()
+    accumulator.feed(samples)
+    peaks = accumulator.finish(4)
+    assert peaks.dtype == np.int8 and peaks.size == 8
+    assert list(peaks) == [0, 0, 0, 0, 0, 0, -128, 127]
+
+def test_empty_track_has_flat_peaks():
+    assert not PeakAccumulator().finish(10).any()
+
+def test_sidecar_names_keep_track_extension():
+    # Треки с одинаковым именем и разными расширениями не делят файл пиков
+    assert peaks_path('/music/song.mp3') != peaks_path('/music/song.flac')
+    assert legacy_peaks_path('/music/song.mp3') == legacy_peaks_path('/music/song.flac') == '/music/song.peaks'
+
+def test_peaks_are_reaped_with_track(db, user):
+    path = os.path.join(config.UPLOAD_FOLDER, 'track.mp3')
+    for file_path in (path, peaks_path(path)):
+        with open(file_path, 'wb') as file:
+            file.write(b'data')
+    shared = db.add_track(user.id, 'Первый', 'Исполнитель', path)
+    track = db.add_track(user.id, 'Второй', 'Исполнитель', path)
+
+    # Пока файл нужен другому треку, пики тоже остаются
+    db.delete_tracks([shared.id])
+    reaper.reap_pending_files()
+    assert os.path.exists(peaks_path(path))
+
+    db.delete_tracks([track.id])
+    reaper.reap_pending_files()
+    assert not os.path.exists(path)
+    assert not os.path.exists(peaks_path(path))
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import event
+from models import engine
+from web_app import app
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(engine, 'before_cursor_execute', self)
+
+def make_library(db, user):
+    return db.create_album(user.id, 'Альбом'), [db.create_playlist(user.id, f'Плейлист {number}')
+                                                for number in range(2)]
+
+def add_tracks(db, user, library, start, count):
+    album, playlists = library
+    for number in range(start, start + count):
+        track = db.add_track(user.id, f'Трек {number}', 'Исполнитель', f'/nonexistent/{number}.mp3',
+                             album_id=album.id if number % 2 else None)
+        for playlist in playlists[:number % 3]:
+            db.add_track_to_playlist(playlist.id, track.id)
+
+def count_queries(client, url):
+    client.get(url)  # схема и пользователь - до замера
+    with QueryCounter() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    return counter.count
+
+@pytest.mark.parametrize('url', ['/web/1000', '/api/user/1000/tracks'])
+def test_track_list_queries_do_not_grow_with_tracks(db, user, client, url):
+    library = make_library(db, user)
+    add_tracks(db, user, library, 0, 3)
+    small = count_queries(client, url)
+    add_tracks(db, user, library, 3, 30)
+    assert count_queries(client, url) == small
+
+def test_track_list_includes_playlists(db, user, client):
+    add_tracks(db, user, make_library(db, user), 0, 3)
+    tracks = {track['title']: track for track in client.get('/api/user/1000/tracks').get_json()}
+    assert tracks['Трек 0']['playlists'] == []
+    assert tracks['Трек 1']['playlists'] == ['Плейлист 0']
+    assert tracks['Трек 1']['album'] == 'Альбом'
+    assert sorted(tracks['Трек 2']['playlists']) == ['Плейлист 0', 'Плейлист 1']
+
+@pytest.fixture
+def playlist(db, user):
+    return db.create_playlist(user.id, 'Плейлист')
+
+def make_track(db, user, title='Трек'):
+    return db.add_track(user.id, title, 'Исполнитель', f'/nonexistent/{title}.mp3')
+
+@pytest.mark.parametrize('track_id', ['1', [1], 1.0, True, None])
+def test_add_playlist_track_rejects_invalid_id(db, user, client, playlist, track_id):
+    make_track(db, user)
+    response = client.post(f'/api/playlist/{playlist.id}/tracks', json={'track_id': track_id})
+    assert response.status_code == 400
+    assert db.get_playlist_tracks(playlist.id) == []
+
+def test_add_playlist_track_rejects_other_users_track(db, user, client, playlist):
+    other = db.get_or_create_user(telegram_id=2000)
+    track = make_track(db, other)
+    response = client.post(f'/api/playlist/{playlist.id}/tracks', json={'track_id': track.id})
+    assert response.status_code == 400
+
+def test_add_playlist_track(db, user, client, playlist):
+    track = make_track(db, user)
+    url = f'/api/playlist/{playlist.id}/tracks'
+    assert client.post(url, json={'track_id': track.id}).status_code == 201
+    assert client.post(url, json={'track_id': track.id}).status_code == 409
+
+def make_playlist_tracks(db, user, playlist, *titles):
+    tracks = [make_track(db, user, title) for title in titles]
+    for track in tracks:
+        db.add_track_to_playlist(playlist.id, track.id)
+    return tracks
+
+@pytest.mark.parametrize('after_track_id', ['1', [1], 1.5, False])
+def test_move_playlist_track_rejects_invalid_after_id(db, user, client, playlist, after_track_id):
+    _, second = make_playlist_tracks(db, user, playlist, 'Первый', 'Второй')
+    response = client.put(f'/api/playlist/{playlist.id}/tracks/{second.id}', json={'after_track_id': after_track_id})
+    assert response.status_code == 400
+
+def test_move_playlist_track_rejects_after_id_outside_playlist(db, user, client, playlist):
+    _, second = make_playlist_tracks(db, user, playlist, 'Первый', 'Второй')
+    outside = make_track(db, user, 'Вне плейлиста')
+    url = f'/api/playlist/{playlist.id}/tracks/{second.id}'
+    assert client.put(url, json={'after_track_id': outside.id}).status_code == 400
+    assert client.put(url, json={'after_track_id': second.id}).status_code == 400
+
+def test_move_playlist_track(db, user, client, playlist):
+    first, second = make_playlist_tracks(db, user, playlist, 'Первый', 'Второй')
+    url = f'/api/playlist/{playlist.id}/tracks'
+
+    assert client.put(f'{url}/{second.id}', json={'after_track_id': None}).status_code == 200
+    db.db.expire_all()
+    assert [track.id for track in db.get_playlist_tracks(playlist.id)] == [second.id, first.id]
+    assert client.put(f'{url}/{first.id}', json={'after_track_id': second.id}).status_code == 200
+    assert client.put(f'{url}/{second.id + 1}', json={}).status_code == 404
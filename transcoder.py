@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Фоновое перекодирование треков в облегченные версии для мобильного интернета
+(пики, громкость и отпечаток считаются отдельной очередью, см. analysis.py)
+
+Задачи хранятся в таблице transcode_jobs, поэтому переживают перезапуск:
+прерванные задачи при старте возвращаются в очередь. Одновременно работает
+не больше TRANSCODE_WORKERS процессов ffmpeg.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import DatabaseManager
+import config
+
+logger = logging.getLogger(__name__)
+
+# Лестница битрейтов: качество -> кодек -> битрейт (кбит/с)
+BITRATE_LADDER = {
+    'low': {'opus': 48, 'aac': 64},
+    'medium': {'opus': 96, 'aac': 128},
+}
+
+CODECS = {
+    'opus': {'encoder': 'libopus', 'extension': '.opus', 'mimetype': 'audio/ogg', 'args': []},
+    'aac': {'encoder': 'aac', 'extension': '.m4a', 'mimetype': 'audio/mp4', 'args': ['-movflags', '+faststart']},
+}
+
+DEFAULT_CODEC = 'aac'
+
+# Сетевые подсказки браузера (Client Hints), при которых отдаем облегченную версию
+SLOW_CONNECTION_TYPES = {'slow-2g', '2g', '3g'}
+LOW_DOWNLINK_MBPS = 1.0
+MEDIUM_DOWNLINK_MBPS = 5.0
+
+POLL_INTERVAL = 5
+
+def variant_path(file_path: str, quality: str, codec: str) -> str:
+    """Путь к версии трека рядом с оригиналом (x.mp3.low.m4a - как и у пиков, чтобы x.mp3 и x.flac не делили файл)"""
+    return f"{file_path}.{quality}{CODECS[codec]['extension']}"
+
+def source_bitrate(file_path: str) -> int:
+    """Битрейт оригинала в кбит/с (0, если определить не удалось)"""
+    # mutagen нужен только воркеру, web_app.py берет отсюда лишь select_quality
+    from mutagen import File as MutagenFile
+
+    try:
+        audio_file = MutagenFile(file_path)
+        return int(audio_file.info.bitrate / 1000) if audio_file and audio_file.info.bitrate else 0
+    except Exception:
+        return 0
+
+def transcode_file(file_path: str) -> list:
+    """Создает все версии трека и возвращает их описания для TrackVariant"""
+    original_bitrate = source_bitrate(file_path)
+    variants = []
+
+    for quality, codecs in BITRATE_LADDER.items():
+        for codec, bitrate in codecs.items():
+            # Нет смысла "улучшать" файл, который и так легче версии
+            if original_bitrate and bitrate >= original_bitrate:
+                continue
+
+            output_path = variant_path(file_path, quality, codec)
+
+            # Готовый файл от прерванного запуска переиспользуем: он появляется только целиком
+            if not os.path.exists(output_path):
+                encode(file_path, output_path, codec, bitrate)
+
+            variants.append({
+                'quality': quality,
+                'codec': codec,
+                'bitrate': bitrate,
+                'mimetype': CODECS[codec]['mimetype'],
+                'file_path': output_path,
+                'file_size': os.path.getsize(output_path)
+            })
+
+    return variants
+
+def encode(source: str, output_path: str, codec: str, bitrate: int):
+    """Один запуск ffmpeg; результат пишется во временный файл и атомарно переименовывается"""
+    codec_info = CODECS[codec]
+    tmp_path = f"{output_path}.part"
+    command = [
+        config.FFMPEG_PATH, '-nostdin', '-y', '-v', 'error',
+        '-i', source,
+        '-vn', '-c:a', codec_info['encoder'], '-b:a', f"{bitrate}k",
+        *codec_info['args'],
+        '-f', 'ogg' if codec == 'opus' else 'mp4',
+        tmp_path
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=3600)
+        os.replace(tmp_path, output_path)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(e.stderr.decode(errors='replace').strip() or str(e))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def select_quality(quality: str, headers) -> str:
+    """Выбор качества по параметру запроса или сетевым подсказкам браузера"""
+    if quality and quality != 'auto':
+        return quality
+
+    if headers.get('Save-Data', '').lower() == 'on':
+        return 'low'
+
+    if headers.get('ECT', '').lower() in SLOW_CONNECTION_TYPES:
+        return 'low'
+
+    try:
+        downlink = float(headers.get('Downlink', ''))
+    except ValueError:
+        downlink = None
+
+    if downlink is not None:
+        if downlink < LOW_DOWNLINK_MBPS:
+            return 'low'
+        if downlink < MEDIUM_DOWNLINK_MBPS:
+            return 'medium'
+
+    return 'original'
+
+class TranscodeWorker:
+    def __init__(self, max_workers: int = None, poll_interval: float = POLL_INTERVAL):
+        self.max_workers = max_workers or config.TRANSCODE_WORKERS
+        self.poll_interval = poll_interval
+        self.executor = None
+        self.thread = None
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.dispatch_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def start(self) -> bool:
+        """Запуск обработки очереди в фоновом потоке"""
+        if not shutil.which(config.FFMPEG_PATH):
+            logger.warning(f"ffmpeg не найден ({config.FFMPEG_PATH}), перекодирование отключено")
+            return False
+
+        db = DatabaseManager()
+        try:
+            resumed = db.reset_running_transcode_jobs()
+        finally:
+            db.close()
+        if resumed:
+            logger.info(f"Возобновлено прерванных задач перекодирования: {resumed}")
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='transcode')
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+    @property
+    def queue_free_slots(self) -> int:
+        with self.lock:
+            return self.max_workers - len(self.in_flight)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.dispatch()
+            except Exception as e:
+                logger.error(f"Ошибка очереди перекодирования: {e}")
+            self.stop_event.wait(self.poll_interval)
+
+    def dispatch(self):
+        """Забирает столько задач, сколько свободных мест в пуле"""
+        with self.dispatch_lock:
+            free = self.queue_free_slots
+            if free <= 0:
+                return
+
+            db = DatabaseManager()
+            try:
+                jobs = [(job.id, job.track.file_path) for job in db.claim_transcode_jobs(free)]
+            finally:
+                db.close()
+
+            for job_id, file_path in jobs:
+                with self.lock:
+                    self.in_flight.add(job_id)
+                self.executor.submit(self.process, job_id, file_path)
+
+    def process(self, job_id: int, file_path: str):
+        db = DatabaseManager()
+        try:
+            variants = transcode_file(file_path)
+            db.complete_transcode_job(job_id, variants)
+            logger.info(f"Трек перекодирован: {file_path} ({len(variants)} версий)")
+        except Exception as e:
+            logger.error(f"Ошибка перекодирования {file_path}: {e}")
+            db.fail_transcode_job(job_id, str(e))
+        finally:
+            db.close()
+            with self.lock:
+                self.in_flight.discard(job_id)
+
+        # Сразу берем следующую задачу, не дожидаясь опроса
+        if not self.stop_event.is_set():
+            self.dispatch()
+
+if __name__ == '__main__':
+    from models import create_tables
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    create_tables()
+
+    worker = TranscodeWorker()
+    if worker.start():
+        try:
+            worker.thread.join()
+        except KeyboardInterrupt:
+            worker.stop()
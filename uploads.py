@@ -0,0 +1,277 @@
+"""
+Возобновляемая загрузка файлов из веб-дашборда по частям
+
+Telegram отдает боту файлы не больше 20 МБ, поэтому большие файлы
+загружаются напрямую: клиент создает загрузку, затем шлет куски
+PATCH-запросами с заголовком Upload-Offset (смещение начала куска).
+Кусок пишется в .part файл в UPLOAD_FOLDER/incoming, SHA-256 файла
+считается по ходу записи. Принятое смещение хранится в БД, поэтому после
+обрыва связи (или перезапуска сервера) клиент узнает его GET-запросом и
+продолжает с того же байта. Когда принят последний байт, файл проходит тот
+же путь, что и файлы из бота (ingest.py): метаданные, отпечаток, обложка
+и add_track.
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from database import DatabaseManager
+import config
+
+logger = logging.getLogger(__name__)
+
+# Расширения, которые принимаются из дашборда
+ALLOWED_EXTENSIONS = {'.mp3', '.m4a', '.aac', '.ogg', '.oga', '.opus', '.flac', '.wav'}
+
+# Кусок запроса пишется на диск порциями такого размера
+WRITE_BUFFER_SIZE = 256 * 1024
+
+# Причины ошибок, после которых клиент повторяет кусок (поле reason ответа)
+REASON_OFFSET_MISMATCH = 'offset_mismatch'
+REASON_BUSY = 'busy'
+REASON_CHUNK_CHECKSUM = 'chunk_checksum_mismatch'
+REASON_FILE_CHECKSUM = 'file_checksum_mismatch'
+
+class UploadError(Exception):
+    """Ошибка загрузки с HTTP-статусом, причиной для клиента и (для конфликтов) текущим смещением"""
+
+    def __init__(self, message: str, status: int = 400, offset: int = None, reason: str = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+        self.reason = reason
+
+# SHA-256 по уже принятым байтам: upload_id -> (смещение, объект хеша).
+# После перезапуска восстанавливается чтением .part файла.
+_hashes = {}
+# Кусок одной загрузки принимает один запрос (повтор после обрыва получит 409)
+_locks = {}
+_registry_lock = threading.Lock()
+
+def incoming_folder() -> str:
+    return os.path.join(config.UPLOAD_FOLDER, 'incoming')
+
+def allowed_file(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+
+def parse_checksum(header: str) -> bytes:
+    """Заголовок Upload-Checksum: "sha256 <base64>" -> байты дайджеста"""
+    algorithm, _, value = header.strip().partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadError('Поддерживается только контрольная сумма sha256')
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        digest = b''
+    if len(digest) != hashlib.sha256().digest_size:
+        raise UploadError('Некорректный заголовок Upload-Checksum')
+    return digest
+
+def upload_lock(upload_id: str) -> threading.Lock:
+    """Блокировка загрузки; вызывать только для загрузок, которые есть в БД"""
+    with _registry_lock:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+def load_upload(upload_id: str):
+    """Строка загрузки без сессии; UploadError 404, если ее нет"""
+    db = DatabaseManager()
+    try:
+        upload = db.get_upload(upload_id)
+        if not upload:
+            raise UploadError('Загрузка не найдена', 404)
+        db.db.expunge(upload)
+        return upload
+    finally:
+        db.close()
+
+def forget_upload(upload_id: str):
+    with _registry_lock:
+        _locks.pop(upload_id, None)
+        _hashes.pop(upload_id, None)
+
+def upload_hash(upload_id: str, file_path: str, received: int):
+    """Хеш первых received байт; из памяти, если он совпадает с БД, иначе с диска"""
+    cached = _hashes.get(upload_id)
+    if cached and cached[0] == received:
+        return cached[1]
+
+    sha256 = hashlib.sha256()
+    remaining = received
+    with open(file_path, 'rb') as part:
+        while remaining:
+            data = part.read(min(WRITE_BUFFER_SIZE, remaining))
+            if not data:
+                raise UploadError('Файл загрузки поврежден, начните заново', 410)
+            sha256.update(data)
+            remaining -= len(data)
+    return sha256
+
+def create_upload(db: DatabaseManager, user_id: int, filename: str, size: int, checksum: str = None,
+                  album_id: int = None, playlist_id: int = None):
+    """Проверяет параметры и создает пустой .part файл и строку загрузки"""
+    filename = os.path.basename(filename or '').strip()
+    if not filename or not allowed_file(filename):
+        raise UploadError('Неподдерживаемый формат файла')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('Некорректный размер файла')
+    if size > config.MAX_UPLOAD_SIZE:
+        raise UploadError(f'Файл больше {config.MAX_UPLOAD_SIZE // (1024 * 1024)} МБ', 413)
+    if checksum is not None:
+        checksum = str(checksum).lower()
+        if len(checksum) != 64 or any(char not in '0123456789abcdef' for char in checksum):
+            raise UploadError('Контрольная сумма должна быть SHA-256 в hex')
+
+    if album_id:
+        album = db.get_album_by_id(album_id)
+        if not album or album.user_id != user_id:
+            raise UploadError('Альбом не найден', 404)
+    if playlist_id:
+        playlist = db.get_playlist_by_id(playlist_id)
+        if not playlist or playlist.user_id != user_id:
+            raise UploadError('Плейлист не найден', 404)
+
+    upload_id = uuid.uuid4().hex
+    file_path = os.path.join(incoming_folder(), f"{upload_id}.part")
+    os.makedirs(incoming_folder(), exist_ok=True)
+    open(file_path, 'wb').close()
+    return db.create_upload(upload_id, user_id, filename, file_path, size, checksum,
+                            album_id or None, playlist_id or None)
+
+def write_chunk(upload_id: str, stream, offset: int, length: int, chunk_digest: bytes = None) -> dict:
+    """
+    Дописывает кусок из stream с позиции offset.
+    Возвращает {'offset', 'size', 'track'}; track - созданный трек после последнего куска.
+    """
+    # Блокировки заводятся только для существующих загрузок, а не для любого id из URL
+    load_upload(upload_id)
+    lock = upload_lock(upload_id)
+    if not lock.acquire(blocking=False):
+        raise UploadError('Кусок этой загрузки уже принимается', 409, reason=REASON_BUSY)
+    try:
+        # Смещение перечитываем под блокировкой; сессию не держим открытой, пока клиент шлет данные
+        try:
+            upload = load_upload(upload_id)
+        except UploadError:
+            # Загрузку успели отменить или удалить по сроку
+            forget_upload(upload_id)
+            raise
+
+        if offset != upload.received:
+            raise UploadError('Смещение не совпадает с принятым', 409, offset=upload.received,
+                              reason=REASON_OFFSET_MISMATCH)
+        if length is None or length > upload.size - offset:
+            raise UploadError('Кусок выходит за размер файла')
+
+        sha256 = upload_hash(upload_id, upload.file_path, offset).copy()
+        chunk_hash = hashlib.sha256() if chunk_digest else None
+        written = 0
+        disconnected = False
+        with open(upload.file_path, 'r+b') as part:
+            # Хвост после подтвержденного смещения (недописанный кусок) отбрасываем
+            part.seek(offset)
+            part.truncate()
+            try:
+                while written < length:
+                    data = stream.read(min(WRITE_BUFFER_SIZE, length - written))
+                    if not data:
+                        break
+                    part.write(data)
+                    sha256.update(data)
+                    if chunk_hash:
+                        chunk_hash.update(data)
+                    written += len(data)
+            except Exception as e:
+                # Обрыв связи: принятые байты сохраняем, клиент продолжит с них
+                logger.info(f"Загрузка {upload_id} прервана на {offset + written} байте: {e}")
+                disconnected = True
+
+            if chunk_hash and (written < length or chunk_hash.digest() != chunk_digest):
+                # Кусок с контрольной суммой принимается только целиком
+                part.seek(offset)
+                part.truncate()
+                if not disconnected:
+                    raise UploadError('Контрольная сумма куска не совпала', 422, offset=offset,
+                                      reason=REASON_CHUNK_CHECKSUM)
+                return {'offset': offset, 'size': upload.size, 'track': None}
+
+        received = offset + written
+        _hashes[upload_id] = (received, sha256)
+        db = DatabaseManager()
+        try:
+            db.set_upload_received(upload_id, received)
+        finally:
+            db.close()
+
+        track = None
+        if received == upload.size and not disconnected:
+            track = finish_upload(upload, sha256.hexdigest())
+        return {'offset': received, 'size': upload.size, 'track': track}
+    finally:
+        lock.release()
+
+def finish_upload(upload, digest: str) -> dict:
+    """Переносит файл в UPLOAD_FOLDER и создает трек тем же путем, что и бот"""
+    # Анализ (numpy, mutagen, PIL) нужен только после последнего куска
+    from ingest import read_metadata, analyze_audio, create_track, title_from_filename
+
+    db = DatabaseManager()
+    try:
+        if upload.checksum and upload.checksum != digest:
+            db.delete_upload(upload.id, remove_file=True)
+            forget_upload(upload.id)
+            raise UploadError('Контрольная сумма файла не совпала, загрузите файл заново', 422,
+                              reason=REASON_FILE_CHECKSUM)
+
+        extension = os.path.splitext(upload.filename)[1].lower()
+        file_path = os.path.join(config.UPLOAD_FOLDER, f"{upload.id}{extension}")
+        os.replace(upload.file_path, file_path)
+        try:
+            audio_data = read_metadata(file_path, default_title=title_from_filename(upload.filename))
+            audio_data.update(analyze_audio(file_path))
+            audio_data['file_path'] = file_path
+
+            track = create_track(db, upload.user_id, audio_data,
+                                 album_id=upload.album_id, playlist_id=upload.playlist_id)
+        except Exception:
+            # Возвращаем файл на место: пустой PATCH с последним смещением повторит завершение
+            os.replace(file_path, upload.file_path)
+            raise
+        db.delete_upload(upload.id)
+        forget_upload(upload.id)
+        logger.info(f"Загрузка {upload.id} завершена: трек {track.id}, sha256 {digest}")
+        return {
+            'id': track.id,
+            'title': track.title,
+            'artist': track.artist,
+            'duration': track.duration,
+            'gain': None,
+            'has_cover': track.cover_hash is not None,
+            'album': track.album.name if track.album else None,
+            'playlists': [playlist.name for playlist in track.playlists],
+            'sha256': digest
+        }
+    finally:
+        db.close()
+
+def cancel_upload(upload_id: str) -> bool:
+    try:
+        load_upload(upload_id)
+    except UploadError:
+        return False
+    lock = upload_lock(upload_id)
+    if not lock.acquire(blocking=False):
+        raise UploadError('Кусок этой загрузки уже принимается', 409, reason=REASON_BUSY)
+    try:
+        db = DatabaseManager()
+        try:
+            deleted = db.delete_upload(upload_id, remove_file=True)
+        finally:
+            db.close()
+        forget_upload(upload_id)
+        return deleted
+    finally:
+        lock.release()
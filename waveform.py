@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Пики формы волны для полосы прогресса плеера
+
+Для каждого трека хранится файл <имя файла>.peaks (x.mp3.peaks - чтобы
+x.mp3 и x.flac не делили один файл): PEAK_BUCKETS пар (min, max) в формате
+int8, всего 2 КБ. Пики считаются потоково: PCM целиком в памяти не
+держится, копятся только min/max блоков фиксированной длины - около
+125 байт на секунду звука (~450 КБ на час), затем блоки сводятся к нужному
+числу корзин.
+
+Досчитать пики для уже загруженных треков (и убрать файлы старого
+формата <имя без расширения>.peaks):  python waveform.py
+"""
+
+import logging
+import os
+import numpy as np
+from pcm import iter_pcm_chunks
+from media import peaks_path, legacy_peaks_path
+
+logger = logging.getLogger(__name__)
+
+# Для формы волны хватает 8 кГц моно
+SAMPLE_RATE = 8000
+
+# Сэмплов на промежуточный пик (~31 блок в секунду)
+BLOCK_SIZE = 256
+
+# Сколько пар (min, max) отдаем плееру
+PEAK_BUCKETS = 1000
+
+class PeakAccumulator:
+    """Потоковое вычисление min/max по блокам сэмплов"""
+
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self.remainder = np.empty(0, dtype=np.int16)
+        self.mins = []
+        self.maxs = []
+
+    def feed(self, samples: np.ndarray):
+        if self.remainder.size:
+            samples = np.concatenate((self.remainder, samples))
+
+        full = samples.size - samples.size % self.block_size
+        if full:
+            blocks = samples[:full].reshape(-1, self.block_size)
+            self.mins.append(blocks.min(axis=1))
+            self.maxs.append(blocks.max(axis=1))
+        self.remainder = samples[full:].copy()
+
+    def finish(self, buckets: int = PEAK_BUCKETS) -> np.ndarray:
+        """Чередующиеся пары (min, max) в int8, ровно buckets штук"""
+        mins = self.mins
+        maxs = self.maxs
+        if self.remainder.size:
+            mins = mins + [self.remainder.min(keepdims=True)]
+            maxs = maxs + [self.remainder.max(keepdims=True)]
+
+        peaks = np.zeros(buckets * 2, dtype=np.int8)
+        if not mins:
+            return peaks
+
+        block_mins = np.concatenate(mins)
+        block_maxs = np.concatenate(maxs)
+
+        # Границы корзин; у короткого трека соседние корзины повторяют один блок
+        starts = np.linspace(0, block_mins.size, buckets, endpoint=False).astype(np.intp)
+        bucket_mins = np.minimum.reduceat(block_mins, starts)
+        bucket_maxs = np.maximum.reduceat(block_maxs, starts)
+
+        # int16 -> int8: старший байт
+        peaks[0::2] = bucket_mins >> 8
+        peaks[1::2] = bucket_maxs >> 8
+        return peaks
+
+def compute_peaks(file_path: str, buckets: int = PEAK_BUCKETS) -> np.ndarray:
+    accumulator = PeakAccumulator()
+    for samples in iter_pcm_chunks(file_path, SAMPLE_RATE):
+        accumulator.feed(samples)
+    return accumulator.finish(buckets)
+
+def generate_peaks(file_path: str) -> str:
+    """Считает и сохраняет пики, если их еще нет; возвращает путь к файлу"""
+    path = peaks_path(file_path)
+    if os.path.exists(path):
+        return path
+
+    peaks = compute_peaks(file_path)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(peaks.tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+if __name__ == '__main__':
+    from database import DatabaseManager
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    db = DatabaseManager()
+    try:
+        file_paths = [track.file_path for track in db.get_all_tracks()]
+    finally:
+        db.close()
+
+    for file_path in file_paths:
+        legacy_path = legacy_peaks_path(file_path)
+        if legacy_path != peaks_path(file_path) and os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        if os.path.exists(peaks_path(file_path)) or not os.path.exists(file_path):
+            continue
+        try:
+            generate_peaks(file_path)
+            logger.info(f"Пики посчитаны: {file_path}")
+        except Exception as e:
+            logger.error(f"Ошибка расчета пиков {file_path}: {e}")
@@ -1,23 +1,75 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_file, send_from_directory, redirect, url_for
 from flask_cors import CORS
 import os
 import json
+from urllib.parse import quote
+from datetime import datetime, timedelta
 from database import DatabaseManager
-from models import create_tables
+import assets
 import config
+import metrics
+import profiler
+import startup
+from transcoder import select_quality, DEFAULT_CODEC
+from media import peaks_path, playback_gain
+from play_events import record_play
+from covers import COVER_SIZES, get_thumbnail
+from export import archive_entries, iter_zip, build_m3u8, safe_filename
+from uploads import UploadError, create_upload, write_chunk, cancel_upload, parse_checksum
 
 app = Flask(__name__)
 app.secret_key = config.FLASK_SECRET_KEY
 CORS(app)
 
-# Создаем таблицы при запуске
-create_tables()
+# Хешированные и сжатые статические файлы (если выполнена сборка assets.py)
+assets.init_app(app)
+
+# Время и число запросов по маршрутам для /metrics
+if config.METRICS_ENABLED:
+    metrics.init_app(app)
+
+# Журнал медленных SQL-запросов и профилирование по запросу администратора
+profiler.init_app(app)
+
+# Схема БД и папки проверяются один раз при первом запросе (run.py делает это заранее)
+@app.before_request
+def initialize_on_first_request():
+    # Проверки живости и готовности не должны падать из-за недоступной БД
+    if request.endpoint not in ('healthz', 'readyz'):
+        startup.initialize()
+
+# Сколько треков можно удалить одним запросом
+MAX_BULK_DELETE = 1000
+
+# Тип оригинала по расширению файла (бот и загрузка из дашборда принимают не только MP3)
+AUDIO_MIMETYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.ogg': 'audio/ogg',
+    '.oga': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.flac': 'audio/flac',
+    '.wav': 'audio/wav',
+}
+
+# Границы параметров истории прослушиваний: days=0 - за все время
+MAX_HISTORY_DAYS = 3650
+MAX_HISTORY_LIMIT = 100
 
 @app.route('/')
 def index():
     """Главная страница"""
     return render_template('index.html')
 
+@app.route('/sw.js')
+def service_worker():
+    """Service worker для оффлайн-воспроизведения (отдается из корня ради scope '/')"""
+    response = send_from_directory(os.path.join(app.static_folder, 'js'), 'sw.js',
+                                   mimetype='application/javascript', max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/web/<int:telegram_id>')
 def user_dashboard(telegram_id):
     """Личный кабинет пользователя"""
@@ -28,15 +80,53 @@ def user_dashboard(telegram_id):
         playlists = db.get_user_playlists(user.id)
         all_tracks = db.get_all_user_tracks(user.id)
         
-        return render_template('dashboard.html', 
+        response = app.make_response(render_template('dashboard.html', 
                              user=user, 
                              albums=albums, 
                              playlists=playlists,
                              all_tracks=all_tracks,
-                             telegram_id=telegram_id)
+                             telegram_id=telegram_id))
+        # Просим браузер присылать сетевые подсказки для выбора качества аудио
+        response.headers['Accept-CH'] = 'ECT, Downlink, Save-Data'
+        return response
     finally:
         db.close()
 
+@app.route('/healthz')
+def healthz():
+    """Процесс жив (без обращения к БД)"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Готовность: схема БД, соединение с БД, папка загрузок и компоненты процесса"""
+    state = startup.readiness()
+    return jsonify(state), 200 if state['ready'] else 503
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    if not config.METRICS_ENABLED:
+        return jsonify({'error': 'Метрики отключены'}), 404
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """Последние профили запросов (нужен заголовок X-Profile-Token)"""
+    if not profiler.is_admin(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Нет доступа'}), 403
+    return jsonify([profile.summary() for profile in reversed(profiler.profiles)])
+
+@app.route('/admin/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Полный профиль: SQL-запросы, шаблоны, JSON и сэмплы стека"""
+    if not profiler.is_admin(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Нет доступа'}), 403
+    profile = profiler.get_profile(profile_id)
+    if not profile:
+        return jsonify({'error': 'Профиль не найден'}), 404
+    return jsonify(profile.report())
+
 @app.route('/api/user/<int:telegram_id>/tracks')
 def get_user_tracks(telegram_id):
     """API для получения всех треков пользователя"""
@@ -52,9 +142,11 @@ def get_user_tracks(telegram_id):
                 'title': track.title,
                 'artist': track.artist,
                 'duration': track.duration,
+                'gain': playback_gain(track.track_gain, track.true_peak),
+                'has_cover': track.cover_hash is not None,
                 'created_at': track.created_at.isoformat() if track.created_at else None,
                 'album': track.album.name if track.album else None,
-                'playlist': track.playlist.name if track.playlist else None
+                'playlists': [playlist.name for playlist in track.playlists]
             }
             tracks_data.append(track_data)
         
@@ -77,12 +169,15 @@ def get_user_albums(telegram_id):
                 'id': album.id,
                 'name': album.name,
                 'description': album.description,
+                'gain': playback_gain(album.album_gain, album.album_peak),
                 'track_count': len(tracks),
                 'tracks': [{
                     'id': track.id,
                     'title': track.title,
                     'artist': track.artist,
-                    'duration': track.duration
+                    'duration': track.duration,
+                    'gain': playback_gain(track.track_gain, track.true_peak),
+                    'has_cover': track.cover_hash is not None
                 } for track in tracks]
             }
             albums_data.append(album_data)
@@ -111,7 +206,9 @@ def get_user_playlists(telegram_id):
                     'id': track.id,
                     'title': track.title,
                     'artist': track.artist,
-                    'duration': track.duration
+                    'duration': track.duration,
+                    'gain': playback_gain(track.track_gain, track.true_peak),
+                    'has_cover': track.cover_hash is not None
                 } for track in tracks]
             }
             playlists_data.append(playlist_data)
@@ -120,6 +217,162 @@ def get_user_playlists(telegram_id):
     finally:
         db.close()
 
+@app.route('/api/album/<int:album_id>/tracks')
+def get_album_tracks(album_id):
+    """API для получения треков альбома"""
+    db = DatabaseManager()
+    try:
+        album = db.get_album_by_id(album_id)
+        if not album:
+            return jsonify({'error': 'Альбом не найден'}), 404
+        
+        tracks = db.get_album_tracks(album_id)
+        return jsonify({
+            'id': album.id,
+            'name': album.name,
+            'gain': playback_gain(album.album_gain, album.album_peak),
+            'tracks': [{
+                'id': track.id,
+                'title': track.title,
+                'artist': track.artist,
+                'duration': track.duration,
+                'gain': playback_gain(track.track_gain, track.true_peak),
+                'has_cover': track.cover_hash is not None
+            } for track in tracks]
+        })
+    finally:
+        db.close()
+
+@app.route('/api/playlist/<int:playlist_id>/tracks')
+def get_playlist_tracks(playlist_id):
+    """API для получения треков плейлиста"""
+    db = DatabaseManager()
+    try:
+        playlist = db.get_playlist_by_id(playlist_id)
+        if not playlist:
+            return jsonify({'error': 'Плейлист не найден'}), 404
+        
+        tracks = db.get_playlist_tracks(playlist_id)
+        return jsonify({
+            'id': playlist.id,
+            'name': playlist.name,
+            'tracks': [{
+                'id': track.id,
+                'title': track.title,
+                'artist': track.artist,
+                'duration': track.duration,
+                'gain': playback_gain(track.track_gain, track.true_peak),
+                'has_cover': track.cover_hash is not None
+            } for track in tracks]
+        })
+    finally:
+        db.close()
+
+@app.route('/api/playlist/<int:playlist_id>/tracks', methods=['POST'])
+def add_playlist_track(playlist_id):
+    """Добавление уже загруженного трека в плейлист"""
+    data = request.get_json(silent=True) or {}
+    track_id = data.get('track_id')
+    if not is_track_id(track_id):
+        return jsonify({'error': 'Ожидается track_id'}), 400
+    
+    db = DatabaseManager()
+    try:
+        playlist = db.get_playlist_by_id(playlist_id)
+        if not playlist:
+            return jsonify({'error': 'Плейлист не найден'}), 404
+        
+        # Трек из тела запроса должен быть в библиотеке владельца плейлиста
+        track = db.get_track_by_id(track_id)
+        if not track or track.user_id != playlist.user_id:
+            return jsonify({'error': 'Трек не найден в библиотеке'}), 400
+        
+        if not db.add_track_to_playlist(playlist_id, track.id):
+            return jsonify({'error': 'Трек уже есть в плейлисте'}), 409
+        return jsonify({'success': True}), 201
+    finally:
+        db.close()
+
+@app.route('/api/playlist/<int:playlist_id>/tracks/<int:track_id>', methods=['PUT'])
+def move_playlist_track(playlist_id, track_id):
+    """Перемещение трека в плейлисте: after_track_id - после какого трека (null - в начало)"""
+    data = request.get_json(silent=True) or {}
+    after_track_id = data.get('after_track_id')
+    if after_track_id is not None and not is_track_id(after_track_id):
+        return jsonify({'error': 'after_track_id должен быть id трека или null'}), 400
+    
+    db = DatabaseManager()
+    try:
+        if not db.get_playlist_item(playlist_id, track_id):
+            return jsonify({'error': 'Трек не найден в плейлисте'}), 404
+        if after_track_id is not None and (after_track_id == track_id or
+                                           not db.get_playlist_item(playlist_id, after_track_id)):
+            return jsonify({'error': 'after_track_id не найден в плейлисте'}), 400
+        
+        db.move_playlist_track(playlist_id, track_id, after_track_id)
+        return jsonify({'success': True})
+    finally:
+        db.close()
+
+@app.route('/api/playlist/<int:playlist_id>/tracks/<int:track_id>', methods=['DELETE'])
+def remove_playlist_track(playlist_id, track_id):
+    """Удаление трека из плейлиста (сам трек остается в библиотеке)"""
+    db = DatabaseManager()
+    try:
+        if not db.remove_track_from_playlist(playlist_id, track_id):
+            return jsonify({'error': 'Трек не найден в плейлисте'}), 404
+        return jsonify({'success': True})
+    finally:
+        db.close()
+
+@app.route('/api/album/<int:album_id>/export.zip')
+def export_album_zip(album_id):
+    """Скачивание альбома одним ZIP-архивом (собирается на лету)"""
+    db = DatabaseManager()
+    try:
+        album = db.get_album_by_id(album_id)
+        if not album:
+            return jsonify({'error': 'Альбом не найден'}), 404
+        return zip_response(album.name, db.get_album_tracks(album_id))
+    finally:
+        db.close()
+
+@app.route('/api/playlist/<int:playlist_id>/export.zip')
+def export_playlist_zip(playlist_id):
+    """Скачивание плейлиста одним ZIP-архивом (собирается на лету)"""
+    db = DatabaseManager()
+    try:
+        playlist = db.get_playlist_by_id(playlist_id)
+        if not playlist:
+            return jsonify({'error': 'Плейлист не найден'}), 404
+        return zip_response(playlist.name, db.get_playlist_tracks(playlist_id))
+    finally:
+        db.close()
+
+@app.route('/api/album/<int:album_id>/export.m3u8')
+def export_album_m3u8(album_id):
+    """Плейлист M3U8 альбома со ссылками на стриминг"""
+    db = DatabaseManager()
+    try:
+        album = db.get_album_by_id(album_id)
+        if not album:
+            return jsonify({'error': 'Альбом не найден'}), 404
+        return m3u8_response(album.name, db.get_album_tracks(album_id))
+    finally:
+        db.close()
+
+@app.route('/api/playlist/<int:playlist_id>/export.m3u8')
+def export_playlist_m3u8(playlist_id):
+    """Плейлист M3U8 со ссылками на стриминг"""
+    db = DatabaseManager()
+    try:
+        playlist = db.get_playlist_by_id(playlist_id)
+        if not playlist:
+            return jsonify({'error': 'Плейлист не найден'}), 404
+        return m3u8_response(playlist.name, db.get_playlist_tracks(playlist_id))
+    finally:
+        db.close()
+
 @app.route('/api/track/<int:track_id>/audio')
 def stream_audio(track_id):
     """Стриминг аудио файла"""
@@ -129,10 +382,54 @@ def stream_audio(track_id):
         if not track or not os.path.exists(track.file_path):
             return jsonify({'error': 'Трек не найден'}), 404
         
-        return send_file(track.file_path, 
+        file_path = track.file_path
+        extension = os.path.splitext(file_path)[1].lower() or '.mp3'
+        mimetype = AUDIO_MIMETYPES.get(extension, 'application/octet-stream')
+        download_name = f"{track.artist} - {track.title}{extension}"
+        
+        # Облегченная версия по параметру quality или сетевым подсказкам браузера
+        requested_quality = request.args.get('quality', 'auto')
+        quality = select_quality(requested_quality, request.headers)
+        if quality != 'original':
+            codec = request.args.get('codec', DEFAULT_CODEC)
+            variant = db.get_track_variant(track.id, quality, codec)
+            if variant and os.path.exists(variant.file_path):
+                file_path = variant.file_path
+                mimetype = variant.mimetype
+                download_name = f"{track.artist} - {track.title}{os.path.splitext(variant.file_path)[1]}"
+        
+        # Файл трека не меняется, поэтому браузер может держать его в кеше
+        response = send_file(file_path, 
                         as_attachment=False,
-                        download_name=f"{track.artist} - {track.title}.mp3",
-                        mimetype="audio/mpeg")
+                        download_name=download_name,
+                        mimetype=mimetype,
+                        conditional=True,
+                        max_age=config.AUDIO_CACHE_MAX_AGE)
+        if requested_quality == 'auto':
+            response.vary.update(['Save-Data', 'ECT', 'Downlink'])
+        if config.METRICS_ENABLED:
+            response.response = metrics.count_streamed_bytes(response.response, quality)
+        return response
+    finally:
+        db.close()
+
+@app.route('/api/track/<int:track_id>/peaks')
+def get_track_peaks(track_id):
+    """Пики формы волны: пары (min, max) в int8"""
+    db = DatabaseManager()
+    try:
+        track = db.get_track_by_id(track_id)
+        if not track:
+            return jsonify({'error': 'Трек не найден'}), 404
+        
+        path = peaks_path(track.file_path)
+        if not os.path.exists(path):
+            return jsonify({'error': 'Пики еще не посчитаны'}), 404
+        
+        return send_file(path,
+                        mimetype='application/octet-stream',
+                        conditional=True,
+                        max_age=config.AUDIO_CACHE_MAX_AGE)
     finally:
         db.close()
 
@@ -145,11 +442,7 @@ def delete_track(track_id):
         if not track:
             return jsonify({'error': 'Трек не найден'}), 404
         
-        # Удаляем файл
-        if os.path.exists(track.file_path):
-            os.remove(track.file_path)
-        
-        # Удаляем из БД
+        # Удаляем из БД, файлы удалит фоновый поток (reaper.py)
         if db.delete_track(track_id):
             return jsonify({'success': True})
         else:
@@ -157,6 +450,24 @@ def delete_track(track_id):
     finally:
         db.close()
 
+@app.route('/api/user/<int:telegram_id>/tracks', methods=['DELETE'])
+def delete_user_tracks(telegram_id):
+    """Удаление нескольких треков одним запросом: {"track_ids": [...]}"""
+    data = request.get_json(silent=True) or {}
+    track_ids = data.get('track_ids')
+    if not isinstance(track_ids, list) or not all(is_track_id(track_id) for track_id in track_ids):
+        return jsonify({'error': 'Ожидается список track_ids'}), 400
+    if len(track_ids) > MAX_BULK_DELETE:
+        return jsonify({'error': f'Не больше {MAX_BULK_DELETE} треков за запрос'}), 400
+    
+    db = DatabaseManager()
+    try:
+        user = db.get_or_create_user(telegram_id=telegram_id)
+        deleted = db.delete_tracks(track_ids, user_id=user.id)
+        return jsonify({'success': True, 'deleted': deleted})
+    finally:
+        db.close()
+
 @app.route('/api/album/<int:album_id>', methods=['DELETE'])
 def delete_album(album_id):
     """Удаление альбома"""
@@ -166,15 +477,11 @@ def delete_album(album_id):
         if not album:
             return jsonify({'error': 'Альбом не найден'}), 404
         
-        # Удаляем файлы треков
-        tracks = db.get_album_tracks(album_id)
-        for track in tracks:
-            if os.path.exists(track.file_path):
-                os.remove(track.file_path)
-        
-        # Удаляем альбом (каскадно удалятся треки)
+        # Удаляем альбом вместе с треками, файлы удалит фоновый поток (reaper.py)
+        track_ids = [track.id for track in db.get_album_tracks(album_id)]
         if db.delete_album(album_id):
-            return jsonify({'success': True})
+            # Плееру - чтобы убрать треки из оффлайн-кеша
+            return jsonify({'success': True, 'track_ids': track_ids})
         else:
             return jsonify({'error': 'Ошибка удаления'}), 500
     finally:
@@ -189,13 +496,7 @@ def delete_playlist(playlist_id):
         if not playlist:
             return jsonify({'error': 'Плейлист не найден'}), 404
         
-        # Удаляем файлы треков
-        tracks = db.get_playlist_tracks(playlist_id)
-        for track in tracks:
-            if os.path.exists(track.file_path):
-                os.remove(track.file_path)
-        
-        # Удаляем плейлист (каскадно удалятся треки)
+        # Удаляем плейлист (каскадно удалятся только позиции, треки остаются в библиотеке)
         if db.delete_playlist(playlist_id):
             return jsonify({'success': True})
         else:
@@ -203,6 +504,146 @@ def delete_playlist(playlist_id):
     finally:
         db.close()
 
+@app.route('/api/user/<int:telegram_id>/uploads', methods=['POST'])
+def start_upload(telegram_id):
+    """Создание загрузки: {"filename", "size", "checksum"?, "album_id"?, "playlist_id"?}"""
+    data = request.get_json(silent=True) or {}
+    db = DatabaseManager()
+    try:
+        user = db.get_or_create_user(telegram_id=telegram_id)
+        upload = create_upload(db, user.id, data.get('filename'), data.get('size'), data.get('checksum'),
+                               data.get('album_id'), data.get('playlist_id'))
+        return jsonify(upload_status(upload)), 201
+    except UploadError as e:
+        return upload_error(e)
+    finally:
+        db.close()
+
+@app.route('/api/uploads/<upload_id>')
+def get_upload(upload_id):
+    """Сколько байт уже принято - с этого смещения клиент продолжает после обрыва"""
+    db = DatabaseManager()
+    try:
+        upload = db.get_upload(upload_id)
+        if not upload:
+            return jsonify({'error': 'Загрузка не найдена'}), 404
+        return jsonify(upload_status(upload))
+    finally:
+        db.close()
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    """Кусок файла в теле запроса; заголовки Upload-Offset и (необязательно) Upload-Checksum"""
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or offset < 0:
+        return jsonify({'error': 'Нужен заголовок Upload-Offset'}), 400
+    
+    try:
+        checksum = request.headers.get('Upload-Checksum')
+        chunk_digest = parse_checksum(checksum) if checksum else None
+        result = write_chunk(upload_id, request.stream, offset, request.content_length or 0, chunk_digest)
+    except UploadError as e:
+        return upload_error(e)
+    
+    response = jsonify({'offset': result['offset'], 'size': result['size'], 'track': result['track']})
+    response.headers['Upload-Offset'] = str(result['offset'])
+    return response, (201 if result['track'] else 200)
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    """Отмена загрузки (.part файл удалит фоновый поток)"""
+    try:
+        if not cancel_upload(upload_id):
+            return jsonify({'error': 'Загрузка не найдена'}), 404
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify({'success': True})
+
+@app.route('/api/track/<int:track_id>/cover/<int:size>')
+def track_cover(track_id, size):
+    """Обложка трека: миниатюра size x size (создается при первом запросе)"""
+    if size not in COVER_SIZES:
+        return jsonify({'error': 'Неподдерживаемый размер обложки'}), 404
+    
+    db = DatabaseManager()
+    try:
+        track = db.get_track_by_id(track_id)
+        if not track or not track.cover_hash:
+            return jsonify({'error': 'Обложка не найдена'}), 404
+        cover_hash = track.cover_hash
+    finally:
+        db.close()
+    
+    try:
+        path = get_thumbnail(cover_hash, size)
+    except TimeoutError:
+        response = jsonify({'error': 'Обложка еще готовится'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except Exception as e:
+        app.logger.error(f"Ошибка создания миниатюры {cover_hash}: {e}")
+        return jsonify({'error': 'Обложка не найдена'}), 404
+    
+    # Содержимое определяется хешем картинки - ETag не зависит от времени файла
+    return send_file(path, mimetype='image/jpeg', conditional=True,
+                     etag=f"{cover_hash}-{size}", max_age=config.COVER_CACHE_MAX_AGE)
+
+@app.route('/api/track/<int:track_id>/play', methods=['POST'])
+def track_played(track_id):
+    """Событие прослушивания (пишется в БД пачкой в фоне)"""
+    db = DatabaseManager()
+    try:
+        track = db.get_track_by_id(track_id)
+        if not track:
+            return jsonify({'error': 'Трек не найден'}), 404
+        
+        record_play(track.user_id, track.id, 'web')
+        return jsonify({'success': True}), 202
+    finally:
+        db.close()
+
+@app.route('/api/user/<int:telegram_id>/top-tracks')
+def get_top_tracks(telegram_id):
+    """Самые прослушиваемые треки за последние days дней"""
+    days = max(0, min(request.args.get('days', 30, type=int), MAX_HISTORY_DAYS))
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_HISTORY_LIMIT))
+    db = DatabaseManager()
+    try:
+        user = db.get_or_create_user(telegram_id=telegram_id)
+        since = datetime.utcnow() - timedelta(days=days) if days > 0 else None
+        rows = db.get_most_played_tracks(user.id, since=since, limit=limit)
+        return jsonify([{
+            'id': track.id,
+            'title': track.title,
+            'artist': track.artist,
+            'duration': track.duration,
+            'gain': playback_gain(track.track_gain, track.true_peak),
+            'has_cover': track.cover_hash is not None,
+            'plays': plays
+        } for track, plays in rows])
+    finally:
+        db.close()
+
+@app.route('/api/user/<int:telegram_id>/recent-tracks')
+def get_recent_tracks(telegram_id):
+    """Недавно прослушанные треки"""
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_HISTORY_LIMIT))
+    db = DatabaseManager()
+    try:
+        user = db.get_or_create_user(telegram_id=telegram_id)
+        rows = db.get_recently_played_tracks(user.id, limit=limit)
+        return jsonify([{
+            'id': track.id,
+            'title': track.title,
+            'artist': track.artist,
+            'duration': track.duration,
+            'gain': playback_gain(track.track_gain, track.true_peak),
+            'has_cover': track.cover_hash is not None,
+            'last_played_at': last_played_at.isoformat()
+        } for track, last_played_at in rows])
+    finally:
+        db.close()
+
 @app.route('/api/user/<int:telegram_id>/stats')
 def get_user_stats(telegram_id):
     """Статистика пользователя"""
@@ -227,6 +668,49 @@ def get_user_stats(telegram_id):
     finally:
         db.close()
 
+def is_track_id(value):
+    """Проверка id трека из JSON (bool - подкласс int, но true/false - не id трека)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def upload_status(upload):
+    return {
+        'id': upload.id,
+        'filename': upload.filename,
+        'offset': upload.received,
+        'size': upload.size,
+        'chunk_size': config.UPLOAD_CHUNK_SIZE
+    }
+
+def upload_error(error):
+    data = {'error': str(error)}
+    if error.reason:
+        data['reason'] = error.reason
+    if error.offset is not None:
+        data['offset'] = error.offset
+    response = jsonify(data)
+    if error.offset is not None:
+        response.headers['Upload-Offset'] = str(error.offset)
+    return response, error.status
+
+def attachment_header(name, extension):
+    """Content-Disposition с ASCII-именем для старых клиентов и UTF-8 именем (RFC 6266)"""
+    name = safe_filename(name)
+    fallback = name.encode('ascii', 'ignore').decode().strip(' _') or 'export'
+    return f"attachment; filename=\"{fallback}{extension}\"; filename*=UTF-8''{quote(name + extension)}"
+
+def zip_response(name, tracks):
+    """Потоковый ответ с ZIP-архивом; список файлов берется до закрытия сессии БД"""
+    entries = archive_entries(tracks)
+    response = Response(iter_zip(entries), mimetype='application/zip')
+    response.headers['Content-Disposition'] = attachment_header(name, '.zip')
+    return response
+
+def m3u8_response(name, tracks):
+    content = build_m3u8(name, tracks, lambda track: url_for('stream_audio', track_id=track.id, _external=True))
+    response = Response(content, mimetype='audio/x-mpegurl')
+    response.headers['Content-Disposition'] = attachment_header(name, '.m3u8')
+    return response
+
 def format_duration(seconds):
     """Форматирование длительности"""
     if not seconds:
@@ -242,4 +726,5 @@ def format_duration(seconds):
         return f"{minutes}:{seconds:02d}"
 
 if __name__ == '__main__':
+    startup.initialize()
     app.run(host=config.FLASK_HOST, port=config.FLASK_PORT, debug=True)
\ No newline at end of file